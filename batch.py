@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from map import create_map, field_to_index
+from engine import GameState
+import pgn
+
+# Stapelprüfung von Partien: eine Partie pro Zeile, Züge in Koordinatenform
+# ("e2e4 e7e5 g1f3 ...", Umwandlung als "e7e8q"). Leere Zeilen und Zeilen mit "#" werden übersprungen.
+# Mit --pgn werden stattdessen PGN-Dateien mit SAN-Zügen gelesen.
+
+def read_games(file):
+    """Liefert (Nummer, Zugliste) für jede Partie, ohne die Datei ganz einzulesen"""
+    number = 0
+    for line in file:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        yield number, line.split()
+        number += 1
+
+def read_pgn_games(file):
+    """Liefert (Nummer, Kopfzeilen, Züge); von den Kopfzeilen nur die, die die Ausgangsstellung bestimmen"""
+    for number, game in enumerate(pgn.read_games(file)):
+        headers = {name: game.headers[name] for name in ("SetUp", "FEN") if name in game.headers}
+        yield number, headers, game.moves
+
+def parse_move(text):
+    # "e2e4", bei Umwandlung mit Figur: "e7e8q"
+    if len(text) not in (4, 5) or (len(text) == 5 and text[4] not in "qrbn"):
+        raise ValueError(f"bad move {text!r}")
+    return field_to_index(text[:2]), field_to_index(text[2:4]), text[4:] or None
+
+def _finish(state, moves, captured):
+    status = state.game_status()
+    winner = None
+    if status == "checkmate":
+        winner = "black" if state.player == "white" else "white"
+    result = {"valid": True, "plies": len(moves), "winner": winner, "captured": "".join(captured)}
+    if status:
+        result["status"] = status
+    return result
+
+def replay_game(moves):
+    """Spielt eine Partie mit den vollständigen Regeln nach und liefert eine Zusammenfassung"""
+    state = GameState(create_map())
+    captured = []
+    for ply, text in enumerate(moves):
+        try:
+            start, goal, promotion = parse_move(text)
+            if not all(0 <= value < 8 for value in start + goal):
+                raise ValueError(f"bad move {text!r}")
+        except ValueError as error:
+            return {"valid": False, "plies": ply, "error": str(error)}
+
+        if not state.is_legal_move(start, goal, promotion):
+            return {"valid": False, "plies": ply, "error": f"illegal move {text} for {state.player}"}
+        undo = state.make_move(start, goal, promotion)
+        if undo.captured != ".":
+            captured.append(undo.captured)
+    return _finish(state, moves, captured)
+
+def replay_chunk(chunk):
+    # Arbeitseinheit eines Worker-Prozesses: eine Liste von (Nummer, Züge)
+    return [dict(game=number, **replay_game(moves)) for number, moves in chunk]
+
+def replay_pgn_game(moves, headers=None):
+    """Wie replay_game, aber mit SAN-Zügen und ab der Stellung aus einem [FEN]-Kopf"""
+    try:
+        state = pgn.start_state(headers)
+    except ValueError as error:
+        return {"valid": False, "plies": 0, "error": str(error)}
+    captured = []
+    for ply, san in enumerate(moves):
+        try:
+            move = pgn.decode_san(state, san)
+        except ValueError as error:
+            return {"valid": False, "plies": ply, "error": str(error)}
+        undo = state.make_move(*move)
+        if undo.captured != ".":
+            captured.append(undo.captured)
+    return _finish(state, moves, captured)
+
+def replay_pgn_chunk(chunk):
+    # SAN wird im Worker aufgelöst, damit auch das Dekodieren parallel läuft
+    return [dict(game=number, **replay_pgn_game(moves, headers)) for number, headers, moves in chunk]
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def run_batch(games, output, workers=None, chunk_size=256, work=replay_chunk):
+    """Verteilt die Partien in Blöcken auf Prozesse und schreibt Ergebnisse, sobald ein Block fertig ist
+
+    Es sind höchstens zwei Blöcke pro Worker unterwegs, daher bleibt der Speicherbedarf
+    unabhängig von der Größe der Eingabe. Die Ausgabe ist nach Fertigstellung sortiert,
+    nicht nach Partienummer; jede Zeile trägt daher ihre Nummer.
+    """
+    workers = workers or os.cpu_count() or 1
+    summary = {"games": 0, "valid": 0, "invalid": 0}
+    chunks = chunked(games, chunk_size)
+
+    def write(results):
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+            summary["games"] += 1
+            summary["valid" if result["valid"] else "invalid"] += 1
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(work, chunk))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future.result())
+        for future in pending:
+            write(future.result())
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partien stapelweise mit mehreren Prozessen prüfen")
+    parser.add_argument("input", help="Partiedatei, eine Partie pro Zeile ('-' für stdin)")
+    parser.add_argument("-o", "--output", help="Ergebnisse als JSON Lines (Standard: stdout)")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--pgn", action="store_true", help="Eingabe ist PGN mit SAN-Zügen")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.pgn:
+            summary = run_batch(read_pgn_games(source), output, args.workers, args.chunk_size, replay_pgn_chunk)
+        else:
+            summary = run_batch(read_games(source), output, args.workers, args.chunk_size)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    print(f"{summary['games']} games, {summary['valid']} valid, {summary['invalid']} invalid", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
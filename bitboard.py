@@ -0,0 +1,272 @@
+from map import create_map
+
+# Bitboard-Darstellung: Feld-Index = row * 8 + column, also a8 = 0 und h1 = 63
+# (gleiche Ausrichtung wie create_map). Weiß zieht zu kleineren Indizes.
+PIECES = "PNBRQKpnbrqk"
+PIECE_INDEX = {piece: index for index, piece in enumerate(PIECES)}
+WHITE_PIECES = range(0, 6)
+BLACK_PIECES = range(6, 12)
+
+FULL = (1 << 64) - 1
+FILE_A = sum(1 << (row * 8) for row in range(8))
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+RANK_3 = 0xFF << 40  # Reihe 5 in create_map, Feld nach dem ersten weißen Bauernschritt
+RANK_6 = 0xFF << 16  # Reihe 2 in create_map, Feld nach dem ersten schwarzen Bauernschritt
+RANK_1 = 0xFF << 56  # Umwandlungsreihe der schwarzen Bauern
+RANK_8 = 0xFF        # Umwandlungsreihe der weißen Bauern
+
+# Strahlrichtungen (row, column); positive Richtungen laufen zu größeren Indizes
+NORTH, SOUTH, WEST, EAST = (-1, 0), (1, 0), (0, -1), (0, 1)
+NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST = (-1, -1), (-1, 1), (1, -1), (1, 1)
+ROOK_DIRECTIONS = (NORTH, SOUTH, WEST, EAST)
+BISHOP_DIRECTIONS = (NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST)
+
+def square_index(square):
+    row, column = square
+    return row * 8 + column
+
+def index_square(index):
+    return divmod(index, 8)
+
+def iter_bits(bitboard):
+    # Liefert die Indizes aller gesetzten Bits, niedrigstes zuerst
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+def _build_jumps(offsets):
+    table = []
+    for square in range(64):
+        row, column = index_square(square)
+        attacks = 0
+        for dr, dc in offsets:
+            r, c = row + dr, column + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                attacks |= 1 << (r * 8 + c)
+        table.append(attacks)
+    return tuple(table)
+
+def _build_rays(direction):
+    dr, dc = direction
+    table = []
+    for square in range(64):
+        row, column = index_square(square)
+        ray = 0
+        r, c = row + dr, column + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            ray |= 1 << (r * 8 + c)
+            r += dr
+            c += dc
+        table.append(ray)
+    return tuple(table)
+
+KNIGHT_ATTACKS = _build_jumps(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = _build_jumps(ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+# Felder, die ein Bauer der jeweiligen Farbe schlagen kann
+WHITE_PAWN_ATTACKS = _build_jumps((NORTH_WEST, NORTH_EAST))
+BLACK_PAWN_ATTACKS = _build_jumps((SOUTH_WEST, SOUTH_EAST))
+
+RAYS = {direction: _build_rays(direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+POSITIVE_DIRECTIONS = (SOUTH, EAST, SOUTH_WEST, SOUTH_EAST)
+
+def _slider_attacks(square, occupied, directions):
+    # Klassischer Strahl-Lookup: den Strahl am ersten Blocker abschneiden
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            if direction in POSITIVE_DIRECTIONS:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[direction][first]
+        attacks |= ray
+    return attacks
+
+def rook_attacks(square, occupied):
+    return _slider_attacks(square, occupied, ROOK_DIRECTIONS)
+
+def bishop_attacks(square, occupied):
+    return _slider_attacks(square, occupied, BISHOP_DIRECTIONS)
+
+def queen_attacks(square, occupied):
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+class Position:
+    """Stellung als zwölf 64-Bit-Bitboards (Reihenfolge wie PIECES)"""
+
+    __slots__ = ("pieces", "white_to_move", "history")
+
+    def __init__(self, pieces=None, white_to_move=True):
+        self.pieces = list(pieces) if pieces else [0] * 12
+        self.white_to_move = white_to_move
+        self.history = []
+
+    @classmethod
+    def from_map(cls, map, player="white"):
+        pieces = [0] * 12
+        for row in range(8):
+            for column in range(8):
+                figure = map[row][column]
+                if figure != ".":
+                    pieces[PIECE_INDEX[figure]] |= 1 << (row * 8 + column)
+        return cls(pieces, player == "white")
+
+    @classmethod
+    def start(cls):
+        return cls.from_map(create_map())
+
+    def to_map(self):
+        map = [["."] * 8 for _ in range(8)]
+        for index, bitboard in enumerate(self.pieces):
+            for square in iter_bits(bitboard):
+                row, column = index_square(square)
+                map[row][column] = PIECES[index]
+        return map
+
+    def occupancy(self, white):
+        p = self.pieces
+        if white:
+            return p[0] | p[1] | p[2] | p[3] | p[4] | p[5]
+        return p[6] | p[7] | p[8] | p[9] | p[10] | p[11]
+
+    def piece_at(self, square):
+        mask = 1 << square
+        for index, bitboard in enumerate(self.pieces):
+            if bitboard & mask:
+                return PIECES[index]
+        return "."
+
+    def is_square_attacked(self, square, by_white):
+        """Prüft, ob das Feld von einer Figur der angegebenen Farbe angegriffen wird"""
+        p = self.pieces
+        base = 0 if by_white else 6
+        occupied = self.occupancy(True) | self.occupancy(False)
+        # Umgekehrte Sicht: Angriffe vom Zielfeld aus mit den eigenen Mustern treffen den Angreifer
+        pawn_attacks = BLACK_PAWN_ATTACKS if by_white else WHITE_PAWN_ATTACKS
+        if pawn_attacks[square] & p[base]:
+            return True
+        if KNIGHT_ATTACKS[square] & p[base + 1]:
+            return True
+        if KING_ATTACKS[square] & p[base + 5]:
+            return True
+        queens = p[base + 4]
+        if bishop_attacks(square, occupied) & (p[base + 2] | queens):
+            return True
+        if rook_attacks(square, occupied) & (p[base + 3] | queens):
+            return True
+        return False
+
+    def attacked_squares(self, white):
+        """Alle Felder, die von der angegebenen Farbe angegriffen werden"""
+        p = self.pieces
+        base = 0 if white else 6
+        occupied = self.occupancy(True) | self.occupancy(False)
+        pawns = p[base]
+        if white:
+            attacks = ((pawns & NOT_FILE_A) >> 9) | ((pawns & NOT_FILE_H) >> 7)
+        else:
+            attacks = ((pawns & NOT_FILE_A) << 7 | (pawns & NOT_FILE_H) << 9) & FULL
+        for square in iter_bits(p[base + 1]):
+            attacks |= KNIGHT_ATTACKS[square]
+        for square in iter_bits(p[base + 2] | p[base + 4]):
+            attacks |= bishop_attacks(square, occupied)
+        for square in iter_bits(p[base + 3] | p[base + 4]):
+            attacks |= rook_attacks(square, occupied)
+        for square in iter_bits(p[base + 5]):
+            attacks |= KING_ATTACKS[square]
+        return attacks
+
+    def generate_moves(self):
+        """Pseudolegale Züge der Seite am Zug als (from, to)-Indexpaare, nach den Regeln von engine.is_valid_move"""
+        p = self.pieces
+        white = self.white_to_move
+        base = 0 if white else 6
+        own = self.occupancy(white)
+        enemy = self.occupancy(not white)
+        empty = FULL ^ (own | enemy)
+        targets = FULL ^ own
+        moves = []
+
+        # Bauern mengenweise: ein Shift erzeugt die Züge aller Bauern gleichzeitig
+        pawns = p[base]
+        if white:
+            single = (pawns >> 8) & empty
+            double = ((single & RANK_3) >> 8) & empty
+            left = ((pawns & NOT_FILE_A) >> 9) & enemy
+            right = ((pawns & NOT_FILE_H) >> 7) & enemy
+            shifts = ((single, 8), (double, 16), (left, 9), (right, 7))
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & RANK_6) << 8) & empty
+            left = ((pawns & NOT_FILE_A) << 7) & enemy
+            right = ((pawns & NOT_FILE_H) << 9) & enemy
+            shifts = ((single, -8), (double, -16), (left, -7), (right, -9))
+        for bitboard, delta in shifts:
+            for to in iter_bits(bitboard):
+                moves.append((to + delta, to))
+
+        occupied = own | enemy
+        for square in iter_bits(p[base + 1]):
+            for to in iter_bits(KNIGHT_ATTACKS[square] & targets):
+                moves.append((square, to))
+        for square in iter_bits(p[base + 2]):
+            for to in iter_bits(bishop_attacks(square, occupied) & targets):
+                moves.append((square, to))
+        for square in iter_bits(p[base + 3]):
+            for to in iter_bits(rook_attacks(square, occupied) & targets):
+                moves.append((square, to))
+        for square in iter_bits(p[base + 4]):
+            for to in iter_bits(queen_attacks(square, occupied) & targets):
+                moves.append((square, to))
+        for square in iter_bits(p[base + 5]):
+            for to in iter_bits(KING_ATTACKS[square] & targets):
+                moves.append((square, to))
+        return moves
+
+    def make_move(self, move):
+        """Führt den Zug aus und legt die Rücknahme-Information auf den Stapel"""
+        start, goal = move
+        p = self.pieces
+        from_mask = 1 << start
+        to_mask = 1 << goal
+        own = WHITE_PIECES if self.white_to_move else BLACK_PIECES
+        enemy = BLACK_PIECES if self.white_to_move else WHITE_PIECES
+
+        moved = None
+        for index in own:
+            if p[index] & from_mask:
+                moved = index
+                break
+        if moved is None:
+            raise ValueError(f"no piece of the side to move on square {start}")
+
+        captured = None
+        for index in enemy:
+            if p[index] & to_mask:
+                captured = index
+                p[index] ^= to_mask
+                break
+
+        placed = moved
+        # Bauer auf der letzten Reihe wird wie in engine.make_move zur Dame
+        if (moved == 0 and to_mask & RANK_8) or (moved == 6 and to_mask & RANK_1):
+            placed = moved + 4
+        p[moved] ^= from_mask
+        p[placed] |= to_mask
+        self.history.append((start, goal, moved, captured, placed))
+        self.white_to_move = not self.white_to_move
+
+    def unmake_move(self):
+        """Nimmt den letzten Zug mit make_move zurück"""
+        start, goal, moved, captured, placed = self.history.pop()
+        p = self.pieces
+        p[placed] ^= 1 << goal
+        p[moved] |= 1 << start
+        if captured is not None:
+            p[captured] |= 1 << goal
+        self.white_to_move = not self.white_to_move
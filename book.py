@@ -0,0 +1,161 @@
+import argparse
+import bisect
+import mmap
+import os
+import random
+import struct
+import sys
+from map import fen_to_map, index_to_field
+from engine import GameState
+from zobrist import encode_move, decode_move
+import pgn
+
+# Eröffnungsbuch: sortierte Binärdatei mit Einträgen (Zobrist-Schlüssel, Zug, Gewicht),
+# je 12 Byte, Big-Endian. Die Datei wird per mmap gelesen und binär durchsucht, daher
+# hängt die Startzeit nicht von der Buchgröße ab, und mehrere Prozesse teilen sich die
+# Seiten im Page-Cache des Betriebssystems.
+#
+# Der Schlüssel ist GameState.key, der das En-passant-Feld nur enthält, wenn dort
+# geschlagen werden kann. So finden Zugumstellungen und FEN-Abfragen dieselben Einträge.
+# Bücher aus älteren Versionen (Feld nach jedem Doppelschritt im Schlüssel) neu bauen.
+
+RECORD = struct.Struct(">QHH")
+MAX_WEIGHT = 0xFFFF
+
+class _Keys:
+    # Sequenzsicht auf die Schlüssel der Datei, damit bisect direkt auf dem mmap sucht
+    def __init__(self, data, count):
+        self.data = data
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return RECORD.unpack_from(self.data, index * RECORD.size)[0]
+
+class OpeningBook:
+    """Liest ein Buch aus build_book, ohne es in den Speicher zu laden"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % RECORD.size:
+            self.file.close()
+            raise ValueError(f"{path}: not an opening book (size {size})")
+        self.count = size // RECORD.size
+        # Eine leere Datei lässt sich nicht abbilden
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.keys = _Keys(self.data, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def entries(self, key):
+        """Alle (Zug, Gewicht) für die Stellung mit dem Schlüssel"""
+        index = bisect.bisect_left(self.keys, key)
+        entries = []
+        while index < self.count:
+            entry_key, code, weight = RECORD.unpack_from(self.data, index * RECORD.size)
+            if entry_key != key:
+                break
+            entries.append((decode_move(code), weight))
+            index += 1
+        return entries
+
+    def choose(self, state, rng=random):
+        """Zufälliger Buchzug nach Gewicht für die Stellung oder None
+
+        Schlüsselkollisionen werden abgefangen, indem nur legale Züge in Frage kommen.
+        """
+        legal = state.generate_legal_moves()
+        moves = [(move, weight) for move, weight in self.entries(state.key) if move in legal and weight > 0]
+        if not moves:
+            return None
+        total = sum(weight for _, weight in moves)
+        pick = rng.uniform(0, total)
+        for move, weight in moves:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return moves[-1][0]
+
+    def close(self):
+        if self.data:
+            self.data.close()
+        self.file.close()
+
+def _game_weight(result, player):
+    # Sieg zählt doppelt, Remis einfach, Niederlage nicht; ohne Ergebnis einfach
+    if result == "1/2-1/2" or result == "*":
+        return 1
+    winner = "white" if result == "1-0" else "black"
+    return 2 if winner == player else 0
+
+def collect_moves(games, max_plies=20, counts=None):
+    """Zählt (Schlüssel, Zugcode) -> Gewicht über die ersten max_plies Halbzüge jeder Partie"""
+    counts = {} if counts is None else counts
+    for game in games:
+        state = pgn.start_state(game.headers)
+        for san in game.moves[:max_plies]:
+            try:
+                move = pgn.decode_san(state, san)
+            except ValueError:
+                break  # Rest der Partie überspringen
+            entry = (state.key, encode_move(move))
+            counts[entry] = counts.get(entry, 0) + _game_weight(game.result, state.player)
+            state.make_move(*move)
+    return counts
+
+def write_book(counts, path, min_weight=1):
+    """Schreibt die Einträge sortiert nach Schlüssel und Zug; liefert die Anzahl"""
+    written = 0
+    with open(path, "wb") as file:
+        for (key, code), weight in sorted(counts.items()):
+            if weight < min_weight:
+                continue
+            file.write(RECORD.pack(key, code, min(weight, MAX_WEIGHT)))
+            written += 1
+    return written
+
+def build_book(pgn_paths, path, max_plies=20, min_weight=1):
+    counts = {}
+    for pgn_path in pgn_paths:
+        with open(pgn_path, encoding="utf-8", errors="replace") as file:
+            collect_moves(pgn.read_games(file), max_plies, counts)
+    return write_book(counts, path, min_weight)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Eröffnungsbuch bauen und abfragen")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Buch aus PGN-Dateien erzeugen")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("-o", "--output", required=True)
+    build.add_argument("--plies", type=int, default=20, help="nur die ersten so viele Halbzüge")
+    build.add_argument("--min-weight", type=int, default=1)
+    probe = commands.add_parser("probe", help="Buchzüge einer Stellung anzeigen")
+    probe.add_argument("book")
+    probe.add_argument("--fen", help="Stellung (Standard: Startstellung)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        written = build_book(args.pgn, args.output, args.plies, args.min_weight)
+        print(f"{written} entries written to {args.output}", file=sys.stderr)
+        return 0
+
+    if args.fen:
+        map, player, castling, en_passant = fen_to_map(args.fen)[:4]
+        state = GameState(map, player, castling, en_passant)
+    else:
+        state = GameState()
+    book = OpeningBook(args.book)
+    try:
+        for move, weight in sorted(book.entries(state.key), key=lambda entry: -entry[1]):
+            print(f"{index_to_field(move[0])}{index_to_field(move[1])}{move[2] if len(move) == 3 else ''} {weight}")
+    finally:
+        book.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
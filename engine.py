@@ -1,4 +1,94 @@
+from array import array
+from collections import namedtuple
 from figures import pawn, knight, bishop, rook, king, queen
+from map import create_map, map_to_fen, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from evaluation import evaluate_map, SQUARE_SCORES
+from zobrist import hash_map, castling_key, en_passant_file, PIECE_KEYS, BLACK_TO_MOVE_KEY, EN_PASSANT_KEYS
+
+# Richtungen der gleitenden Figuren (row, column)
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = QUEEN_DIRECTIONS
+
+def _build_jumps(offsets):
+    # Zielfelder pro Startfeld vorberechnen, damit nichts außerhalb des Bretts geprüft werden muss
+    table = {}
+    for r in range(8):
+        for c in range(8):
+            table[(r, c)] = tuple((r + dr, c + dc) for dr, dc in offsets
+                                  if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+    return table
+
+def _build_rays(directions):
+    # Pro Startfeld eine Liste von Strahlen, jeder Strahl endet am Brettrand
+    table = {}
+    for r in range(8):
+        for c in range(8):
+            rays = []
+            for dr, dc in directions:
+                ray = []
+                rr, cc = r + dr, c + dc
+                while 0 <= rr < 8 and 0 <= cc < 8:
+                    ray.append((rr, cc))
+                    rr += dr
+                    cc += dc
+                if ray:
+                    rays.append(tuple(ray))
+            table[(r, c)] = tuple(rays)
+    return table
+
+KNIGHT_TARGETS = _build_jumps(KNIGHT_OFFSETS)
+KING_TARGETS = _build_jumps(KING_OFFSETS)
+ROOK_RAYS = _build_rays(ROOK_DIRECTIONS)
+BISHOP_RAYS = _build_rays(BISHOP_DIRECTIONS)
+QUEEN_RAYS = _build_rays(QUEEN_DIRECTIONS)
+
+SLIDER_RAYS = {"r": ROOK_RAYS, "b": BISHOP_RAYS, "q": QUEEN_RAYS}
+JUMP_TARGETS = {"n": KNIGHT_TARGETS, "k": KING_TARGETS}
+
+def _build_lines():
+    # Wie QUEEN_RAYS, aber mit der Angabe, ob der Strahl diagonal läuft (für Schach und Fesselungen)
+    table = {}
+    for square, rays in _build_rays(ROOK_DIRECTIONS).items():
+        table[square] = tuple((False, ray) for ray in rays)
+    for square, rays in _build_rays(BISHOP_DIRECTIONS).items():
+        table[square] += tuple((True, ray) for ray in rays)
+    return table
+
+KING_LINES = _build_lines()
+
+# Umwandlungsfiguren in der Reihenfolge, in der sie erzeugt werden
+PROMOTIONS = ("q", "r", "b", "n")
+
+# Rochade: Königsstart, Königsziel, Turmstart, Turmziel, freie Felder, nicht angegriffene Felder
+CASTLING_RULES = {
+    "K": ((7, 4), (7, 6), (7, 7), (7, 5), ((7, 5), (7, 6)), ((7, 5), (7, 6))),
+    "Q": ((7, 4), (7, 2), (7, 0), (7, 3), ((7, 1), (7, 2), (7, 3)), ((7, 3), (7, 2))),
+    "k": ((0, 4), (0, 6), (0, 7), (0, 5), ((0, 5), (0, 6)), ((0, 5), (0, 6))),
+    "q": ((0, 4), (0, 2), (0, 0), (0, 3), ((0, 1), (0, 2), (0, 3)), ((0, 3), (0, 2))),
+}
+# Welche Rochaderechte verloren gehen, wenn ein Zug dieses Feld verlässt oder betritt
+CASTLING_LOST = {(7, 4): "KQ", (7, 7): "K", (7, 0): "Q", (0, 4): "kq", (0, 7): "k", (0, 0): "q"}
+
+# Schrittweiten auf dem 0x88-Brett (eine Reihe = 16 Indizes)
+ROOK_STEPS = (-16, 16, -1, 1)
+BISHOP_STEPS = (-17, -15, 15, 17)
+QUEEN_STEPS = ROOK_STEPS + BISHOP_STEPS
+KNIGHT_STEPS = (-33, -31, -18, -14, 14, 18, 31, 33)
+
+BOARD_SLIDER_STEPS = {BISHOP: BISHOP_STEPS, ROOK: ROOK_STEPS, QUEEN: QUEEN_STEPS}
+BOARD_JUMP_STEPS = {KNIGHT: KNIGHT_STEPS, KING: QUEEN_STEPS}
+BOARD_INDICES = tuple(row * 16 + column for row in range(8) for column in range(8))
+
+# Rücknahme-Information eines Zuges: alles, was make_move überschreibt
+# promotion ist die eingesetzte Figur (oder None), capture_square das Feld der geschlagenen
+# Figur (bei en passant nicht das Zielfeld)
+Undo = namedtuple("Undo", ("start", "goal", "figure", "captured", "castling", "en_passant", "key",
+                           "promotion", "capture_square", "score"))
+
 def is_valid_move(map, start, goal, figure):
     s_r, s_c = start  # start = (row, column)
     g_r, g_c = goal   # goal = (row, column)
@@ -32,10 +122,598 @@ def is_valid_move(map, start, goal, figure):
 
     return False
 
-def make_move(map, start, goal):
+def generate_piece_moves(map, start):
+    """Liefert alle Zielfelder, die is_valid_move für die Figur auf start akzeptiert"""
+    s_r, s_c = start  # start = (row, column)
+    figure = map[s_r][s_c]
+    if figure == ".":
+        return []
+
+    white = figure.isupper()
+    kind = figure.lower()
+    moves = []
+
+    if kind == "p":
+        direction = -1 if white else 1
+        r = s_r + direction
+        if 0 <= r < 8:
+            if map[r][s_c] == ".":
+                moves.append((r, s_c))
+            for c in (s_c - 1, s_c + 1):
+                if 0 <= c < 8:
+                    target = map[r][c]
+                    if target != "." and target.isupper() != white:
+                        moves.append((r, c))
+        # Doppelschritt vom Startfeld, beide Felder müssen frei sein
+        if white and s_r == 6 and map[5][s_c] == "." and map[4][s_c] == ".":
+            moves.append((4, s_c))
+        elif not white and s_r == 1 and map[2][s_c] == "." and map[3][s_c] == ".":
+            moves.append((3, s_c))
+        return moves
+
+    if kind in JUMP_TARGETS:
+        for r, c in JUMP_TARGETS[kind][start]:
+            target = map[r][c]
+            if target == "." or target.isupper() != white:
+                moves.append((r, c))
+        return moves
+
+    if kind in SLIDER_RAYS:
+        for ray in SLIDER_RAYS[kind][start]:
+            for r, c in ray:
+                target = map[r][c]
+                if target == ".":
+                    moves.append((r, c))
+                    continue
+                # Gegnerische Figur kann geschlagen werden, danach ist der Strahl blockiert
+                if target.isupper() != white:
+                    moves.append((r, c))
+                break
+    return moves
+
+def generate_moves(map, player):
+    """Liefert alle (start, goal)-Paare für den Spieler ("white" oder "black")"""
+    white = player == "white"
+    moves = []
+    for r in range(8):
+        row = map[r]
+        for c in range(8):
+            figure = row[c]
+            if figure != "." and figure.isupper() == white:
+                start = (r, c)
+                for goal in generate_piece_moves(map, start):
+                    moves.append((start, goal))
+    return moves
+
+def generate_board_moves(board, white):
+    """Wie generate_moves, aber auf dem 0x88-Brett aus map.map_to_board; liefert (start, goal)-Indexpaare"""
+    sign = 1 if white else -1
+    moves = []
+    for start in BOARD_INDICES:
+        piece = board[start] * sign
+        if piece <= 0:
+            continue
+
+        if piece == PAWN:
+            step = -16 if white else 16
+            goal = start + step
+            # Ein Test gegen 0x88 ersetzt die Bereichsprüfung von Reihe und Spalte
+            if not goal & 0x88:
+                if board[goal] == EMPTY:
+                    moves.append((start, goal))
+                for capture in (goal - 1, goal + 1):
+                    if not capture & 0x88 and board[capture] * sign < 0:
+                        moves.append((start, capture))
+            row = start >> 4
+            if white and row == 6 and board[start - 16] == EMPTY and board[start - 32] == EMPTY:
+                moves.append((start, start - 32))
+            elif not white and row == 1 and board[start + 16] == EMPTY and board[start + 32] == EMPTY:
+                moves.append((start, start + 32))
+
+        elif piece in BOARD_JUMP_STEPS:
+            for step in BOARD_JUMP_STEPS[piece]:
+                goal = start + step
+                if not goal & 0x88 and board[goal] * sign <= 0:
+                    moves.append((start, goal))
+
+        else:
+            for step in BOARD_SLIDER_STEPS[piece]:
+                goal = start + step
+                while not goal & 0x88:
+                    target = board[goal] * sign
+                    if target > 0:
+                        break
+                    moves.append((start, goal))
+                    if target < 0:
+                        break
+                    goal += step
+    return moves
+
+def promotion_piece(figure, promotion=None):
+    # Ohne Angabe wird in eine Dame umgewandelt; die Farbe folgt dem Bauern
+    piece = promotion or "q"
+    return piece.upper() if figure.isupper() else piece.lower()
+
+def make_move(map, start, goal, promotion=None):
     s_r, s_c = start  # start = (row, column)
     g_r, g_c = goal   # goal = (row, column)
     figure = map[s_r][s_c]
+    # Bauer auf der letzten Reihe wird umgewandelt
+    if (figure == "P" and g_r == 0) or (figure == "p" and g_r == 7):
+        figure = promotion_piece(figure, promotion)
     map[g_r][g_c] = figure
     map[s_r][s_c] = "."
-    return map
\ No newline at end of file
+    return map
+
+def unmake_move(map, undo):
+    s_r, s_c = undo.start  # start = (row, column)
+    g_r, g_c = undo.goal   # goal = (row, column)
+    map[g_r][g_c] = "."
+    map[undo.capture_square[0]][undo.capture_square[1]] = undo.captured
+    map[s_r][s_c] = undo.figure
+    # Rochade: Turm zurückstellen
+    if undo.figure.lower() == "k" and abs(g_c - s_c) == 2:
+        rook_start, rook_goal = (s_r, 7), (s_r, 5)
+        if g_c < s_c:
+            rook_start, rook_goal = (s_r, 0), (s_r, 3)
+        map[rook_start[0]][rook_start[1]] = map[rook_goal[0]][rook_goal[1]]
+        map[rook_goal[0]][rook_goal[1]] = "."
+    return map
+
+def color_of(figure):
+    return "white" if figure.isupper() else "black"
+
+def attack_map(map, squares, ignore=None):
+    """Alle Felder, die von den Figuren auf squares angegriffen werden
+
+    Das Feld ignore gilt als leer, damit der König nicht entlang eines
+    Schachstrahls "hinter sich" ausweichen kann.
+    """
+    attacked = set()
+    for r, c in squares:
+        figure = map[r][c]
+        kind = figure.lower()
+        if kind == "p":
+            row = r - 1 if figure.isupper() else r + 1
+            if 0 <= row < 8:
+                if c > 0:
+                    attacked.add((row, c - 1))
+                if c < 7:
+                    attacked.add((row, c + 1))
+        elif kind in JUMP_TARGETS:
+            attacked.update(JUMP_TARGETS[kind][(r, c)])
+        else:
+            for ray in SLIDER_RAYS[kind][(r, c)]:
+                for square in ray:
+                    attacked.add(square)
+                    if square != ignore and map[square[0]][square[1]] != ".":
+                        break
+    return attacked
+
+def square_attacked(map, square, by_white):
+    """Prüft vom Feld aus rückwärts, ob eine Figur der Farbe es angreift"""
+    r, c = square
+    knight, king, pawn = ("N", "K", "P") if by_white else ("n", "k", "p")
+    for t_r, t_c in KNIGHT_TARGETS[square]:
+        if map[t_r][t_c] == knight:
+            return True
+    for t_r, t_c in KING_TARGETS[square]:
+        if map[t_r][t_c] == king:
+            return True
+    # Weiße Bauern greifen nach oben an, stehen also eine Reihe tiefer
+    pawn_row = r + 1 if by_white else r - 1
+    if 0 <= pawn_row < 8:
+        if c > 0 and map[pawn_row][c - 1] == pawn:
+            return True
+        if c < 7 and map[pawn_row][c + 1] == pawn:
+            return True
+    for diagonal, ray in KING_LINES[square]:
+        for t_r, t_c in ray:
+            target = map[t_r][t_c]
+            if target == ".":
+                continue
+            if target.isupper() == by_white and target.lower() in ("qb" if diagonal else "qr"):
+                return True
+            break
+    return False
+
+def infer_castling(map):
+    # Rochaderechte für Stellungen ohne Vorgeschichte: König und Turm auf ihren Ausgangsfeldern
+    rights = ""
+    for right, (king, _, rook, _, _, _) in CASTLING_RULES.items():
+        king_figure, rook_figure = ("K", "R") if right.isupper() else ("k", "r")
+        if map[king[0]][king[1]] == king_figure and map[rook[0]][rook[1]] == rook_figure:
+            rights += right
+    return rights
+
+class GameState:
+    """Brett mit Spieler am Zug, Figurenlisten, Königsfeldern und Rücknahme-Stapel"""
+
+    def __init__(self, map=None, player="white", castling=None, en_passant=None):
+        self.board = map if map is not None else create_map()
+        self.player = player
+        self.castling = infer_castling(self.board) if castling is None else castling
+        self.en_passant = en_passant  # Feld, auf das en passant geschlagen werden kann
+        self.history = []
+        # Felder aller Figuren je Farbe und die Königsfelder, werden inkrementell gepflegt
+        self.pieces = {"white": set(), "black": set()}
+        self.kings = {"white": None, "black": None}
+        for row in range(8):
+            for col in range(8):
+                figure = self.board[row][col]
+                if figure != ".":
+                    color = color_of(figure)
+                    self.pieces[color].add((row, col))
+                    if figure.lower() == "k":
+                        self.kings[color] = (row, col)
+        # Zobrist-Schlüssel und Häufigkeit jeder bisher aufgetretenen Stellung
+        self.key = hash_map(self.board, self.player, self.castling, self.en_passant)
+        self.key_counts = {self.key: 1}
+        # Material und Figur-Feld-Tabellen aus Sicht von Weiß, wird in make_move mitgeführt
+        self.score = evaluate_map(self.board)
+
+    def repetitions(self):
+        """Wie oft die aktuelle Stellung bereits aufgetreten ist (einschließlich jetzt)"""
+        return self.key_counts.get(self.key, 0)
+
+    def en_passant_square(self):
+        """En-passant-Feld, wenn ein eigener Bauer daneben steht, sonst None
+
+        self.en_passant ist nach jedem Doppelschritt gesetzt, auch wenn niemand schlagen kann;
+        im Schlüssel steht es nur in diesem Fall.
+        """
+        if en_passant_file(self.board, self.player, self.en_passant) is None:
+            return None
+        return self.en_passant
+
+    def en_passant_legal(self):
+        """Ob das Schlagen en passant in dieser Stellung ein legaler Zug ist"""
+        square = self.en_passant_square()
+        return square is not None and any(move[1] == square and self.board[move[0][0]][move[0][1]] in "Pp"
+                                          for move in self.generate_legal_moves())
+
+    def to_fen(self):
+        return map_to_fen(self.board, self.player, self.castling, self.en_passant, fullmove=len(self.history) // 2 + 1)
+
+    def generate_moves(self):
+        """Alle pseudolegalen Züge des Spielers am Zug, nur über die Figurenliste statt über alle 64 Felder"""
+        moves = []
+        for start in self.pieces[self.player]:
+            for goal in generate_piece_moves(self.board, start):
+                moves.append((start, goal))
+        return moves
+
+    def is_in_check(self, player=None):
+        player = player or self.player
+        king = self.kings[player]
+        return king is not None and square_attacked(self.board, king, player != "white")
+
+    def checks_and_pins(self, king, white):
+        """Schachgeber, Felder zum Abwehren eines Schachs und gefesselte Figuren
+
+        Einmal pro Stellung vom König aus berechnet: gefesselte Figuren dürfen nur
+        auf ihrer Fessellinie ziehen, bei Schach nur auf die Abwehrfelder.
+        """
+        board = self.board
+        checkers = []
+        block = set()
+        pins = {}
+        k_r, k_c = king
+
+        knight, pawn = ("n", "p") if white else ("N", "P")
+        for r, c in KNIGHT_TARGETS[king]:
+            if board[r][c] == knight:
+                checkers.append((r, c))
+                block.add((r, c))
+        pawn_row = k_r - 1 if white else k_r + 1
+        if 0 <= pawn_row < 8:
+            for c in (k_c - 1, k_c + 1):
+                if 0 <= c < 8 and board[pawn_row][c] == pawn:
+                    checkers.append((pawn_row, c))
+                    block.add((pawn_row, c))
+
+        for diagonal, ray in KING_LINES[king]:
+            own = None
+            for index, (r, c) in enumerate(ray):
+                target = board[r][c]
+                if target == ".":
+                    continue
+                if target.isupper() == white:
+                    if own is not None:
+                        break
+                    own = (r, c)
+                    continue
+                if target.lower() in ("qb" if diagonal else "qr"):
+                    line = ray[:index + 1]
+                    if own is None:
+                        checkers.append((r, c))
+                        block.update(line)
+                    else:
+                        pins[own] = set(line)
+                break
+        return checkers, block, pins
+
+    def generate_legal_moves(self):
+        """Alle legalen Züge einschließlich Rochade, en passant und Umwandlung
+
+        Umwandlungen haben die Form (start, goal, figur), alle anderen Züge (start, goal).
+        Angriffe und Fesselungen werden einmal pro Stellung bestimmt, nicht pro Zug.
+        """
+        board = self.board
+        color = self.player
+        white = color == "white"
+        opponent = "black" if white else "white"
+        king = self.kings[color]
+        moves = []
+
+        if king is None:
+            # Stellungen ohne König (Aufgaben, Tests): nur pseudolegal prüfen
+            for start, goal in self.generate_moves():
+                self._add_move(moves, start, goal)
+            return moves
+
+        attacked = attack_map(board, self.pieces[opponent], ignore=king)
+        checkers, block, pins = self.checks_and_pins(king, white)
+
+        for goal in KING_TARGETS[king]:
+            target = board[goal[0]][goal[1]]
+            if (target == "." or target.isupper() != white) and goal not in attacked:
+                moves.append((king, goal))
+        if len(checkers) > 1:
+            return moves  # Doppelschach: nur der König darf ziehen
+
+        in_check = bool(checkers)
+        if not in_check:
+            for right in self.castling:
+                if right.isupper() != white:
+                    continue
+                king_start, king_goal, rook_start, _, empty, safe = CASTLING_RULES[right]
+                rook = "R" if white else "r"
+                if king != king_start or board[rook_start[0]][rook_start[1]] != rook:
+                    continue
+                if any(board[r][c] != "." for r, c in empty) or any(square in attacked for square in safe):
+                    continue
+                moves.append((king, king_goal))
+
+        for start in self.pieces[color]:
+            if start == king:
+                continue
+            pin = pins.get(start)
+            for goal in generate_piece_moves(board, start):
+                if in_check and goal not in block:
+                    continue
+                if pin is not None and goal not in pin:
+                    continue
+                self._add_move(moves, start, goal)
+
+        if self.en_passant is not None:
+            self._add_en_passant(moves, king, white)
+        return moves
+
+    def _add_move(self, moves, start, goal):
+        figure = self.board[start[0]][start[1]]
+        if (figure == "P" and goal[0] == 0) or (figure == "p" and goal[0] == 7):
+            for piece in PROMOTIONS:
+                moves.append((start, goal, piece))
+        else:
+            moves.append((start, goal))
+
+    def _add_en_passant(self, moves, king, white):
+        # En passant ist selten; hier wird der Zug ausgeführt und der König geprüft, weil
+        # zwei Bauern gleichzeitig die Reihe verlassen (waagerechte Fesselung)
+        board = self.board
+        ep_r, ep_c = self.en_passant
+        pawn = "P" if white else "p"
+        row = ep_r + 1 if white else ep_r - 1
+        for c in (ep_c - 1, ep_c + 1):
+            if 0 <= c < 8 and board[row][c] == pawn:
+                self.make_move((row, c), (ep_r, ep_c))
+                legal = not square_attacked(board, king, not white)
+                self.unmake_move()
+                if legal:
+                    moves.append(((row, c), (ep_r, ep_c)))
+
+    def is_legal_move(self, start, goal, promotion=None):
+        for move in self.generate_legal_moves():
+            if move[0] == start and move[1] == goal:
+                if len(move) == 2 or (promotion or "q").lower() == move[2]:
+                    return True
+        return False
+
+    def game_status(self):
+        """None während der Partie, sonst "checkmate", "stalemate" oder "repetition" """
+        if not self.generate_legal_moves():
+            return "checkmate" if self.is_in_check() else "stalemate"
+        if self.repetitions() >= 3:
+            return "repetition"
+        return None
+
+    def make_move(self, start, goal, promotion=None):
+        """Führt einen Zug ohne Kopie des Bretts aus und liefert den Rücknahme-Datensatz"""
+        board = self.board
+        figure = board[start[0]][start[1]]
+        kind = figure.lower()
+        captured = board[goal[0]][goal[1]]
+        capture_square = goal
+        color = color_of(figure)
+        opponent = "black" if color == "white" else "white"
+
+        # En passant: der geschlagene Bauer steht neben dem Startfeld, nicht auf dem Ziel
+        if kind == "p" and goal == self.en_passant and captured == "." and start[1] != goal[1]:
+            capture_square = (start[0], goal[1])
+            captured = board[capture_square[0]][capture_square[1]]
+        # Das alte En-passant-Feld steht nur im Schlüssel, wenn es schlagbar war (vor dem Umstellen prüfen)
+        hashed_file = en_passant_file(board, color, self.en_passant) if self.en_passant is not None else None
+
+        placed = figure
+        if (figure == "P" and goal[0] == 0) or (figure == "p" and goal[0] == 7):
+            placed = promotion_piece(figure, promotion)
+
+        undo = Undo(start, goal, figure, captured, self.castling, self.en_passant, self.key,
+                    placed if placed != figure else None, capture_square, self.score)
+        self.history.append(undo)
+
+        # Schlüssel inkrementell: Figur vom Start entfernen, geschlagene Figur entfernen,
+        # (umgewandelte) Figur aufs Ziel setzen, Seite am Zug wechseln
+        key = self.key ^ PIECE_KEYS[figure][start[0]][start[1]] ^ PIECE_KEYS[placed][goal[0]][goal[1]]
+        # Bewertung ebenso: nur die Differenz der betroffenen Felder
+        score = self.score - SQUARE_SCORES[figure][start[0]][start[1]] + SQUARE_SCORES[placed][goal[0]][goal[1]]
+        if captured != ".":
+            key ^= PIECE_KEYS[captured][capture_square[0]][capture_square[1]]
+            score -= SQUARE_SCORES[captured][capture_square[0]][capture_square[1]]
+            self.pieces[opponent].discard(capture_square)
+            if captured.lower() == "k":
+                self.kings[opponent] = None
+            board[capture_square[0]][capture_square[1]] = "."
+        self.pieces[color].discard(start)
+        self.pieces[color].add(goal)
+        board[goal[0]][goal[1]] = placed
+        board[start[0]][start[1]] = "."
+
+        if kind == "k":
+            self.kings[color] = goal
+            # Rochade: Turm mitziehen
+            if abs(goal[1] - start[1]) == 2:
+                row = start[0]
+                rook_start, rook_goal = ((row, 7), (row, 5)) if goal[1] > start[1] else ((row, 0), (row, 3))
+                rook = board[rook_start[0]][rook_start[1]]
+                board[rook_goal[0]][rook_goal[1]] = rook
+                board[rook_start[0]][rook_start[1]] = "."
+                self.pieces[color].discard(rook_start)
+                self.pieces[color].add(rook_goal)
+                key ^= PIECE_KEYS[rook][rook_start[0]][rook_start[1]] ^ PIECE_KEYS[rook][rook_goal[0]][rook_goal[1]]
+                score += SQUARE_SCORES[rook][rook_goal[0]][rook_goal[1]] - SQUARE_SCORES[rook][rook_start[0]][rook_start[1]]
+
+        # Rochaderechte und En-passant-Feld fortschreiben
+        lost = CASTLING_LOST.get(start, "") + CASTLING_LOST.get(goal, "")
+        if lost and self.castling:
+            castling = "".join(right for right in self.castling if right not in lost)
+            key ^= castling_key(self.castling) ^ castling_key(castling)
+            self.castling = castling
+        if hashed_file is not None:
+            key ^= EN_PASSANT_KEYS[hashed_file]
+        self.en_passant = None
+        if kind == "p" and abs(goal[0] - start[0]) == 2:
+            self.en_passant = ((start[0] + goal[0]) // 2, start[1])
+            if en_passant_file(board, opponent, self.en_passant) is not None:
+                key ^= EN_PASSANT_KEYS[start[1]]
+
+        self.key = key ^ BLACK_TO_MOVE_KEY
+        self.score = score
+        self.key_counts[self.key] = self.key_counts.get(self.key, 0) + 1
+        self.player = opponent
+        return undo
+
+    def unmake_move(self):
+        """Nimmt den letzten Zug zurück und liefert dessen Rücknahme-Datensatz"""
+        undo = self.history.pop()
+        unmake_move(self.board, undo)
+
+        count = self.key_counts[self.key] - 1
+        if count:
+            self.key_counts[self.key] = count
+        else:
+            del self.key_counts[self.key]
+        self.key = undo.key
+        self.score = undo.score
+
+        color = color_of(undo.figure)
+        self.pieces[color].discard(undo.goal)
+        self.pieces[color].add(undo.start)
+        if undo.figure.lower() == "k":
+            self.kings[color] = undo.start
+            if abs(undo.goal[1] - undo.start[1]) == 2:
+                row = undo.start[0]
+                rook_start, rook_goal = ((row, 7), (row, 5)) if undo.goal[1] > undo.start[1] else ((row, 0), (row, 3))
+                self.pieces[color].discard(rook_goal)
+                self.pieces[color].add(rook_start)
+        if undo.captured != ".":
+            opponent = color_of(undo.captured)
+            self.pieces[opponent].add(undo.capture_square)
+            if undo.captured.lower() == "k":
+                self.kings[opponent] = undo.capture_square
+
+        self.castling = undo.castling
+        self.en_passant = undo.en_passant
+        self.player = color
+        return undo
+
+def _on_board(square):
+    return 0 <= square[0] < 8 and 0 <= square[1] < 8
+
+class _BoardTargets(dict):
+    """Startfeld -> Zielfelder, die is_valid_move auf dem Brett annimmt
+
+    Die Zielfelder eines Startfelds werden beim ersten Zug von dort einmal erzeugt,
+    jeder weitere Zug ist ein Nachschlagen. Leere Felder und Felder außerhalb des
+    Bretts haben keine Ziele.
+    """
+
+    def __init__(self, board):
+        super().__init__()
+        self.board = board
+
+    def __missing__(self, start):
+        board = self.board
+        goals = ()
+        if _on_board(start) and board[start[0]][start[1]] != ".":
+            goals = frozenset(generate_piece_moves(board, start))
+        self[start] = goals
+        return goals
+
+def _state_legal(state, legal_moves):
+    # Legale Züge eines GameState; gleiche Stellungen in verschiedenen Objekten teilen sie
+    key = (state.key, state.player, state.castling, state.en_passant)
+    legal = legal_moves.get(key)
+    if legal is None:
+        legal = legal_moves[key] = set(state.generate_legal_moves())
+    return legal
+
+def _check_move(position, move, legal_moves):
+    """Einzelprüfung wie is_valid_move (Brett) bzw. is_legal_move (GameState)"""
+    start, goal = move[0], move[1]
+    if isinstance(position, GameState):
+        legal = _state_legal(position, legal_moves)
+        if len(move) == 3 and move[2]:
+            return (start, goal, move[2].lower()) in legal
+        # Ohne Angabe gilt eine Umwandlung als Dame
+        return (start, goal) in legal or (start, goal, "q") in legal
+    if not (_on_board(start) and _on_board(goal)):
+        return False
+    figure = position[start[0]][start[1]]
+    return figure != "." and is_valid_move(position, start, goal, figure)
+
+def validate_moves(positions, moves):
+    """Prüft viele Züge auf einmal und liefert ein array("B") mit 1 für gültig, 0 sonst
+
+    positions[i] ist ein Brett aus create_map oder ein GameState, moves[i] der Zug
+    (start, goal) oder (start, goal, Umwandlung). Bretter werden wie mit is_valid_move
+    für die Figur auf start geprüft (ohne Zugrecht und Schach), GameStates gegen ihre
+    legalen Züge wie mit is_legal_move. Für jedes Brett werden die Zielfelder eines
+    Startfelds nur einmal erzeugt, jeder weitere Zug von dort ist ein Nachschlagen;
+    bei GameStates die legalen Züge je Stellung. Schneller als eine Schleife über
+    is_valid_move ist das nur, wenn auf demselben Brett viele Züge geprüft werden;
+    bei im Schnitt weniger als zwei Zügen pro Brett wird einzeln geprüft, ungefähr
+    so schnell wie die Schleife. Die Bretter werden beim Aufruf gelesen.
+    """
+    positions = list(positions)  # hält alle Objekte am Leben, ihre id bleibt eindeutig
+    moves = list(moves)
+    ids = list(map(id, positions))
+    objects = dict(zip(ids, positions))
+    legal_moves = {}
+    if len(objects) * 2 > len(ids):
+        # Im Schnitt weniger als zwei Züge pro Brett: die Aufbereitung lohnt nicht
+        return array("B", [_check_move(position, move, legal_moves) for position, move in zip(positions, moves)])
+
+    # Zielfelder je Brett, erzeugt beim ersten Zug von einem Startfeld; None heißt einzeln prüfen
+    lookup = {position_id: None if isinstance(position, GameState) else _BoardTargets(position)
+              for position_id, position in objects.items()}
+    setups = list(map(lookup.__getitem__, ids))
+    if None not in lookup.values():
+        return array("B", [move[1] in targets[move[0]] for targets, move in zip(setups, moves)])
+    results = array("B", [targets is not None and move[1] in targets[move[0]]
+                          for targets, move in zip(setups, moves)])
+    for index, targets in enumerate(setups):
+        if targets is None and _check_move(positions[index], moves[index], legal_moves):
+            results[index] = 1
+    return results
@@ -0,0 +1,98 @@
+import multiprocessing
+import queue
+import time
+from engine import GameState
+from search import Searcher
+from book import OpeningBook
+from tablebase import Tablebases
+
+# Suche in einem eigenen Prozess: Aufträge gehen über eine Warteschlange hinein,
+# Zwischenstände ("info") und das Ergebnis ("bestmove") über eine zweite zurück.
+# Der Abbruch läuft über einen gemeinsamen Zähler, damit die laufende Suche ihn
+# sieht, ohne die Auftrags-Warteschlange lesen zu müssen.
+
+def _worker_main(requests, responses, active, tt_size_mb, book_path, tablebase_dir):
+    # Buch und Endspieldatenbanken werden im Worker per mmap geöffnet; die Seiten teilt er
+    # sich mit anderen Prozessen
+    book = OpeningBook(book_path) if book_path else None
+    tablebases = Tablebases(tablebase_dir) if tablebase_dir else None
+    searcher = Searcher(tt_size_mb=tt_size_mb, book=book, tablebases=tablebases)
+    while True:
+        message = requests.get()
+        if message[0] == "stop":
+            return
+        if message[0] != "search":
+            continue
+        _, request_id, board, player, castling, en_passant, key_counts, budget, node_limit = message
+        if active.value != request_id:
+            continue  # schon vor dem Start abgebrochen
+
+        state = GameState(board, player, castling, en_passant)
+        # Bisherige Stellungen der Partie, damit die Suche Wiederholungen erkennt
+        state.key_counts = key_counts
+        deadline = time.monotonic() + budget if budget is not None else None
+
+        def report(result):
+            responses.put(("info", request_id, result))
+
+        result = searcher.search(state, node_limit=node_limit, deadline=deadline, on_iteration=report,
+                                 should_stop=lambda: active.value != request_id)
+        if active.value == request_id:
+            responses.put(("bestmove", request_id, result))
+
+class EngineWorker:
+    """Startet die Suche in einem Hintergrundprozess und liefert Ergebnisse über poll()"""
+
+    def __init__(self, tt_size_mb=16, book_path=None, tablebase_dir=None):
+        self.requests = multiprocessing.Queue()
+        self.responses = multiprocessing.Queue()
+        self.active = multiprocessing.Value("l", 0, lock=False)
+        self.next_id = 0
+        self.request_id = None   # laufender Auftrag oder None
+        self.request_key = None  # Zobrist-Schlüssel der Stellung des laufenden Auftrags
+        self.process = multiprocessing.Process(target=_worker_main, daemon=True,
+                                               args=(self.requests, self.responses, self.active, tt_size_mb,
+                                                     book_path, tablebase_dir))
+        self.process.start()
+
+    @property
+    def thinking(self):
+        return self.request_id is not None
+
+    def start(self, state, budget=None, node_limit=None):
+        """Startet eine Suche für die Stellung; ein laufender Auftrag wird abgebrochen"""
+        self.next_id += 1
+        self.request_id = self.next_id
+        self.request_key = state.key
+        self.active.value = self.request_id
+        board = [row[:] for row in state.board]
+        self.requests.put(("search", self.request_id, board, state.player, state.castling, state.en_passant,
+                           dict(state.key_counts), budget, node_limit))
+        return self.request_id
+
+    def cancel(self):
+        """Bricht den laufenden Auftrag ab, z.B. weil sich die Stellung geändert hat"""
+        self.active.value = -1
+        self.request_id = None
+        self.request_key = None
+
+    def poll(self):
+        """Liefert alle eingetroffenen Nachrichten des laufenden Auftrags, ohne zu blockieren"""
+        messages = []
+        while True:
+            try:
+                kind, request_id, result = self.responses.get_nowait()
+            except queue.Empty:
+                return messages
+            if request_id != self.request_id:
+                continue  # Antwort auf einen abgebrochenen Auftrag
+            if kind == "bestmove":
+                self.request_id = None
+            messages.append((kind, result))
+
+    def close(self):
+        self.cancel()
+        self.requests.put(("stop",))
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
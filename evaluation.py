@@ -0,0 +1,130 @@
+from map import PIECE_CODES
+
+np = None  # numpy wird erst für die Stapelbewertung geladen, der Import kostet sonst jeden Start
+
+# Bewertung aus Material und Figur-Feld-Tabellen (PST) in Centipawns, immer aus Sicht
+# von Weiß. Die Tabellen sind aus Sicht von Weiß geschrieben, Reihe 0 = achte Reihe
+# wie in create_map; für Schwarz wird senkrecht gespiegelt.
+
+PIECE_VALUES = {"p": 100, "n": 320, "b": 330, "r": 500, "q": 900, "k": 20000}
+
+PIECE_SQUARE_TABLES = {
+    "p": (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    "n": (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    "b": (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    "r": (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    "q": (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    "k": (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+}
+
+def _build_square_scores():
+    # SQUARE_SCORES[figur][row][col]: Beitrag der Figur auf dem Feld, positiv für Weiß
+    scores = {".": tuple((0,) * 8 for _ in range(8))}
+    for kind, table in PIECE_SQUARE_TABLES.items():
+        value = PIECE_VALUES[kind]
+        scores[kind.upper()] = tuple(tuple(value + table[row * 8 + col] for col in range(8)) for row in range(8))
+        scores[kind] = tuple(tuple(-(value + table[(7 - row) * 8 + col]) for col in range(8)) for row in range(8))
+    return scores
+
+SQUARE_SCORES = _build_square_scores()
+
+def evaluate_map(map):
+    """Vollständige Bewertung eines Bretts aus Sicht von Weiß"""
+    score = 0
+    for row in range(8):
+        board_row = map[row]
+        for col in range(8):
+            score += SQUARE_SCORES[board_row[col]][row][col]
+    return score
+
+# Stapelbewertung: Stellungen als (N, 64) int8-Array mit den Figurencodes aus map.PIECE_CODES
+# (Weiß positiv, Schwarz negativ, 0 leer), Feldindex row * 8 + col.
+
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("batched evaluation needs numpy") from None
+        np = numpy
+
+_lookup = None
+
+def score_lookup():
+    """(13, 64)-Tabelle: Beitrag von Code + 6 auf jedem Feld"""
+    global _lookup
+    if _lookup is None:
+        _require_numpy()
+        table = np.zeros((13, 64), dtype=np.int32)
+        for figure, code in PIECE_CODES.items():
+            table[code + 6] = np.array(SQUARE_SCORES[figure], dtype=np.int32).reshape(64)
+        _lookup = table
+    return _lookup
+
+def maps_to_array(maps):
+    """Wandelt eine Folge von create_map-Brettern in ein (N, 64) int8-Array um"""
+    _require_numpy()
+    codes = [PIECE_CODES[figure] for map in maps for row in map for figure in row]
+    return np.array(codes, dtype=np.int8).reshape(-1, 64)
+
+def evaluate_batch(boards):
+    """Bewertet N Stellungen auf einmal; liefert ein int32-Array der Länge N aus Sicht von Weiß"""
+    _require_numpy()
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 64)
+    indices = boards.astype(np.intp) + 6
+    return score_lookup()[indices, np.arange(64)].sum(axis=1, dtype=np.int32)
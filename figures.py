@@ -10,10 +10,10 @@ def pawn(map, start, goal, figure):
         if g_r - s_r == direction:
             return True
         
-        # first move (2steps)
-        if figure.isupper() and s_r == 6 and g_r == 4 and goal_field == ".":
+        # first move (2steps), das übersprungene Feld muss ebenfalls frei sein
+        if figure.isupper() and s_r == 6 and g_r == 4 and goal_field == "." and map[5][s_c] == ".":
             return True
-        if figure.islower() and s_r == 1 and g_r == 3 and goal_field == ".":
+        if figure.islower() and s_r == 1 and g_r == 3 and goal_field == "." and map[2][s_c] == ".":
             return True
     
     # hit (diagonal attack)
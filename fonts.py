@@ -0,0 +1,99 @@
+import json
+import os
+import sys
+import pygame
+
+# Schriftsuche mit Cache auf der Platte. pygame.font.SysFont durchsucht beim ersten
+# Aufruf alle Systemschriften (unter Linux per fc-list), das dominiert den Kaltstart.
+# Gefundene Pfade und das Ergebnis des Unicode-Tests werden daher gespeichert und
+# bleiben gültig, solange sich die Schriftverzeichnisse nicht ändern (mtime).
+
+FONT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "schach_fonts.json")
+
+def font_dirs():
+    if sys.platform == "win32":
+        return [os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts")]
+    if sys.platform == "darwin":
+        return ["/Library/Fonts", "/System/Library/Fonts", os.path.expanduser("~/Library/Fonts")]
+    return ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.local/share/fonts"),
+            os.path.expanduser("~/.fonts")]
+
+def cache_key():
+    """Jüngste mtime je Schriftverzeichnis und seiner direkten Unterverzeichnisse"""
+    key = [pygame.version.ver]
+    for directory in font_dirs():
+        try:
+            newest = os.stat(directory).st_mtime
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        newest = max(newest, entry.stat().st_mtime)
+        except OSError:
+            continue
+        key.append([directory, newest])
+    return key
+
+class FontCache:
+    """Löst Schriftnamen zu Dateien auf; SysFont wird nur bei einem Cache-Fehlschlag gebraucht"""
+
+    def __init__(self, path=FONT_CACHE):
+        self.path = path
+        self.key = cache_key()
+        self.fonts = {}    # "Name|fett" -> [Pfad oder None, Fettdruck nachbilden]
+        self.unicode = {}  # "Pfad|Größe" -> Unicode-Symbole darstellbar
+        self.dirty = False
+        try:
+            with open(path) as file:
+                data = json.load(file)
+            if data.get("key") == self.key:
+                self.fonts = data["fonts"]
+                self.unicode = data["unicode"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def resolve(self, name, bold=False):
+        entry_key = f"{name}|{int(bold)}"
+        entry = self.fonts.get(entry_key)
+        if entry is None:
+            path = pygame.font.match_font(name, bold)
+            # Ohne eigene Fettschrift liefert match_font die normale Datei, dann wie SysFont nachbilden
+            emulate = bool(bold and path and path == pygame.font.match_font(name))
+            entry = self.fonts[entry_key] = [path, emulate]
+            self.dirty = True
+        return entry
+
+    def font(self, names, size, bold=False):
+        """Erste vorhandene Schrift aus names, sonst die eingebaute von pygame"""
+        if isinstance(names, str):
+            names = (names,)
+        for name in names:
+            path, emulate = self.resolve(name, bold)
+            if path:
+                font = pygame.font.Font(path, size)
+                font.set_bold(emulate)
+                return font
+        font = pygame.font.Font(None, size)
+        font.set_bold(bold)
+        return font
+
+    def supports_unicode(self, font, names, size, symbol="♔"):
+        """Prüft einmal, ob font das Symbol wirklich zeichnet (zu schmal = Ersatzzeichen)"""
+        entry_key = f"{','.join(names)}|{size}"
+        if entry_key not in self.unicode:
+            try:
+                self.unicode[entry_key] = font.render(symbol, True, (0, 0, 0)).get_width() > 10
+            except pygame.error:
+                self.unicode[entry_key] = False
+            self.dirty = True
+        return self.unicode[entry_key]
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w") as file:
+                json.dump({"key": self.key, "fonts": self.fonts, "unicode": self.unicode}, file)
+            self.dirty = False
+        except OSError:
+            pass  # ohne Cache startet es nur langsamer
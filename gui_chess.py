@@ -1,10 +1,18 @@
+import math
+import os
 import pygame
 import sys
+import time
+from collections import namedtuple
 from map import create_map, field_to_index
-from engine import is_valid_move, make_move
-
-# Pygame initialisieren
-pygame.init()
+from engine import GameState, attack_map
+from search import time_for_move
+from engine_worker import EngineWorker
+from book import OpeningBook
+from record import RecordWriter, GameRecord, exists as record_exists
+from profiling import profiler
+from fonts import FontCache
+from pgn import history_to_san, write_game
 
 # Konstanten
 BOARD_SIZE = 640
@@ -18,6 +26,36 @@ SELECTED = (0, 255, 0, 128)     # Grün mit Transparenz
 WHITE_PIECE = (255, 255, 255)   # Weiße Figuren
 BLACK_PIECE = (0, 0, 0)         # Schwarze Figuren
 PIECE_OUTLINE = (50, 50, 50)    # Umrandung für bessere Sichtbarkeit
+BACKGROUND = (60, 60, 60)
+WINNER_HIGHLIGHT = (255, 215, 0, 100)  # Gold mit Transparenz
+CHECK_HIGHLIGHT = (255, 0, 0, 110)     # Rot mit Transparenz für den König im Schach
+HOVER_HIGHLIGHT = (255, 255, 0, 60)    # Blasses Gelb: Züge der Figur unter der Maus
+ATTACKED_HIGHLIGHT = (255, 120, 0, 50) # Orange: vom Gegner angegriffene Felder (Taste A)
+DANGER_HIGHLIGHT = (255, 0, 160, 90)   # Magenta: angegriffene eigene Figuren (Taste G)
+
+# Bildschirmbereiche: Timer oben, Brett, Infozeilen unten
+TIMER_AREA = pygame.Rect(0, 0, BOARD_SIZE, 80)
+UI_AREA = pygame.Rect(0, BOARD_SIZE + 80, BOARD_SIZE, 120)
+
+# Ereignisgesteuerte Schleife: eigenes Timer-Ereignis für fällige Neuzeichnungen
+REDRAW_EVENT = pygame.USEREVENT + 1
+MAX_IDLE_WAIT = 1000  # ms, Sicherheitsnetz falls kein Timer-Ereignis kommt
+
+# Jede Partie wird Zug für Zug mitgeschrieben und kann nach einem Absturz fortgesetzt werden.
+# Die Datei liegt im Datenverzeichnis des Benutzers, nicht im Arbeitsverzeichnis.
+RECORD_FILE = os.path.join(os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"),
+                           "schach", "letzte_partie.cgr")
+
+# Messanzeige (F3) und Export der Messwerte (F4)
+PROFILE_OVERLAY = pygame.Rect(0, 80, 430, 250)
+PROFILE_JSON = "profil.json"
+PROFILE_TRACE = "profil_trace.json"
+ENGINE_POLL_INTERVAL = 50  # ms, so oft wird der Suchprozess abgefragt, während er rechnet
+
+# Züge und Angriffe einer Stellung, einmal pro Stellung berechnet:
+# moves: Startfeld -> Zielfelder, attacked: vom Gegner angegriffene Felder,
+# danger: eigene Figuren darauf, check_king: König im Schach oder None
+PositionInfo = namedtuple("PositionInfo", ("state", "key", "moves", "attacked", "danger", "check_king"))
 
 # Figuren-Symbole - Text-basiert für bessere Kompatibilität
 PIECE_SYMBOLS = {
@@ -27,6 +65,9 @@ PIECE_SYMBOLS = {
     'k': 'k', 'q': 'q', 'r': 'r', 'b': 'b', 'n': 'n', 'p': 'p'
 }
 
+# Schriften für Unicode-Figuren, die erste vorhandene wird genommen
+UNICODE_FONTS = ('Apple Symbols', 'Arial Unicode MS', 'DejaVu Sans', 'Segoe UI Symbol')
+
 # Alternative Unicode-Symbole (falls verfügbar)
 UNICODE_SYMBOLS = {
     'K': '♔', 'Q': '♕', 'R': '♖', 'B': '♗', 'N': '♘', 'P': '♙',
@@ -34,34 +75,39 @@ UNICODE_SYMBOLS = {
 }
 
 class ChessGUI:
-    def __init__(self):
+    def __init__(self, engine_player=None, event_driven=True, book_path=None, tablebase_dir=None,
+                 record_path=RECORD_FILE, resume=True, replay_path=None, profile=False):
+        # Nur Anzeige und Schrift starten; pygame.init() würde auch Ton und Joysticks öffnen
+        pygame.display.init()
+        pygame.font.init()
         self.screen = pygame.display.set_mode((BOARD_SIZE, BOARD_SIZE + 200))  # Mehr Platz für Timer
         pygame.display.set_caption("♕ Schach mit Timer ♛")
         
         self.clock = pygame.time.Clock()
         
-        # Schriftarten für Figuren
-        self.piece_font = pygame.font.SysFont('Arial', 48, bold=True)  # Für Text-Figuren
-        self.unicode_font = None
-        
-        # Versuche Unicode-Schrift zu laden
-        try:
-            self.unicode_font = pygame.font.SysFont('Apple Symbols', 60)  # macOS Unicode Font
-            if not self.unicode_font:
-                self.unicode_font = pygame.font.SysFont('Arial Unicode MS', 60)
-        except:
-            pass
-            
-        self.text_font = pygame.font.SysFont('Arial', 28)  # Für Text
-        self.timer_font = pygame.font.SysFont('Arial', 36, bold=True)  # Für Timer
+        # Schriftarten für Figuren; die Pfade kommen aus dem Cache statt aus der Systemsuche
+        self.fonts = FontCache()
+        self.piece_font = self.fonts.font('Arial', 48, bold=True)  # Für Text-Figuren
+        self.unicode_font = self.fonts.font(UNICODE_FONTS, 60)
+        self.text_font = self.fonts.font('Arial', 28)  # Für Text
+        self.timer_font = self.fonts.font('Arial', 36, bold=True)  # Für Timer
         self.use_unicode = self.test_unicode_support()
+        self.fonts.save()
         
-        self.board = create_map()
+        self.state = GameState(create_map())
+        self.board = self.state.board
         self.current_player = "white"
         self.selected_square = None
         self.valid_moves = []
         self.game_over = False
         self.winner = None
+        self.draw = False  # Remis: "stalemate" oder "repetition"
+        
+        # Zug- und Angriffs-Cache der aktuellen Stellung, Vorschau unter der Maus, Overlays
+        self.position_cache = None
+        self.hover_square = None
+        self.show_attacked = False
+        self.show_danger = False
         
         # Timer-System (in Sekunden)
         self.initial_time = 600  # 10 Minuten pro Spieler
@@ -69,44 +115,74 @@ class ChessGUI:
         self.black_time = self.initial_time
         self.last_time = pygame.time.get_ticks()
         self.timer_running = True
+        
+        # Computergegner ("white", "black" oder None für zwei menschliche Spieler)
+        # Die Suche läuft in einem eigenen Prozess, damit das Fenster nie hängt
+        self.engine_player = engine_player
+        self.engine_worker = EngineWorker(book_path=book_path, tablebase_dir=tablebase_dir) if engine_player else None
+        # Eröffnungsbuch: Buchzüge werden ohne Suche sofort gespielt
+        self.book = OpeningBook(book_path) if book_path and engine_player else None
+        self.last_search = None
+        
+        # Render-Cache: vorgezeichnetes Brett, Figuren-Atlas und Overlays
+        self.build_render_cache()
+        self.needs_full_redraw = True
+        self.drawn_squares = {}   # Feld -> zuletzt gezeichneter Zustand
+        self.drawn_timers = None
+        self.drawn_ui = None
+        
+        # Partieprotokoll: Wiederherstellung nach Absturz bzw. Wiedergabe einer Datei
+        # Eine unfertige Partie im Protokoll wird fortgesetzt; sonst bleibt die Datei
+        # unangetastet, bis in der neuen Partie der erste Zug fällt
+        self.record_path = record_path
+        self.record = None
+        self.record_pending = False
+        self.replay = None
+        self.replay_ply = 0
+        if replay_path:
+            self.open_replay(replay_path)
+        elif not (resume and record_path and record_exists(record_path) and self.resume_record()):
+            self.start_record()
+        
+        # Messung: eingeschaltet werden Phasen und Aufrufe gezählt, F3 zeigt sie an
+        self.show_profile = False
+        self.profile_font = None
+        if profile:
+            profiler.enable(self)
+        
+        # Ereignisgesteuert warten statt mit festen 60 FPS abzufragen
+        self.event_driven = event_driven
     
     def test_unicode_support(self):
         """Teste ob Unicode-Schachsymbole unterstützt werden"""
         if not self.unicode_font:
             return False
-        
-        try:
-            # Teste ob das Unicode-Symbol korrekt gerendert wird
-            test_surface = self.unicode_font.render('♔', True, (0, 0, 0))
-            return test_surface.get_width() > 10  # Wenn zu schmal, wahrscheinlich kein Symbol
-        except:
-            return False
+        # Das Ergebnis wird mit den Schriftpfaden gespeichert
+        return self.fonts.supports_unicode(self.unicode_font, UNICODE_FONTS, 60)
     
-    def check_king_captured(self, target_piece):
-        """Prüft ob ein König geschlagen wurde"""
-        if target_piece.lower() == 'k':
-            if target_piece == 'K':  # Weißer König geschlagen
-                self.winner = "Schwarz"
-            else:  # Schwarzer König geschlagen
-                self.winner = "Weiß"
+    def check_game_end(self):
+        """Prüft nach einem Zug auf Matt, Patt und dreifache Wiederholung"""
+        status = self.state.game_status()
+        if status == "checkmate":
+            # Der Spieler am Zug ist matt
+            self.winner = "Schwarz" if self.state.player == "white" else "Weiß"
             self.game_over = True
-            return True
-        return False
+        elif status in ("stalemate", "repetition"):
+            self.winner = None
+            self.draw = status
+            self.game_over = True
+        return self.game_over
     
     def find_kings(self):
-        """Findet beide Könige auf dem Brett"""
-        white_king = None
-        black_king = None
-        
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece == 'K':
-                    white_king = (row, col)
-                elif piece == 'k':
-                    black_king = (row, col)
-        
-        return white_king, black_king
+        """Findet beide Könige auf dem Brett (aus den mitgeführten Königsfeldern)"""
+        return self.state.kings["white"], self.state.kings["black"]
+    
+    def winner_king(self):
+        """Feld des Gewinner-Königs oder None (Remis)"""
+        if self.winner not in ("Weiß", "Schwarz"):
+            return None
+        white_king, black_king = self.find_kings()
+        return white_king if self.winner == "Weiß" else black_king
     
     def update_timers(self):
         """Aktualisiert die Timer"""
@@ -172,124 +248,213 @@ class ChessGUI:
         y = row * SQUARE_SIZE + 80  # Berücksichtige den Timer-Bereich
         return (x, y)
     
+    def position_info(self):
+        """Züge und Angriffe der aktuellen Stellung; neu berechnet nur, wenn sich die Stellung ändert"""
+        state = self.state
+        info = self.position_cache
+        if info is not None and info.state is state and info.key == state.key:
+            return info
+        moves = {}
+        for move in state.generate_legal_moves():
+            goals = moves.setdefault(move[0], [])
+            if move[1] not in goals:  # Umwandlungen nur einmal
+                goals.append(move[1])
+        opponent = "black" if state.player == "white" else "white"
+        attacked = frozenset(attack_map(state.board, state.pieces[opponent]))
+        danger = frozenset(square for square in state.pieces[state.player] if square in attacked)
+        king = state.kings[state.player]
+        info = self.position_cache = PositionInfo(state, state.key, moves, attacked, danger,
+                                                  king if king in attacked else None)
+        return info
+    
     def get_valid_moves_for_piece(self, square):
-        """Findet alle gültigen Züge für eine Figur"""
-        valid_moves = []
-        piece = self.board[square[0]][square[1]]
-        
-        # Überprüfe alle möglichen Zielfelder
-        for row in range(8):
-            for col in range(8):
-                target = (row, col)
-                if target != square:
-                    if is_valid_move(self.board, square, target, piece):
-                        valid_moves.append(target)
-        
-        return valid_moves
+        """Alle legalen Zielfelder für eine Figur (aus dem Stellungs-Cache)"""
+        return self.position_info().moves.get(square, [])
     
-    def draw_board(self):
-        """Zeichnet das Schachbrett mit Koordinaten"""
+    def hover_moves(self):
+        """Zielfelder der eigenen Figur unter der Maus, solange nichts ausgewählt ist"""
+        if (self.hover_square is None or self.selected_square or self.game_over or self.replay
+                or self.current_player == self.engine_player):
+            return ()
+        return self.position_info().moves.get(self.hover_square, ())
+    
+    def build_render_cache(self):
+        """Zeichnet alles, was sich nie ändert, einmal vor"""
+        # Brett mit Koordinaten
+        self.board_surface = pygame.Surface((BOARD_SIZE, BOARD_SIZE))
+        coord_font = pygame.font.Font(None, 24)
         for row in range(8):
             for col in range(8):
                 color = WHITE_SQUARE if (row + col) % 2 == 0 else BLACK_SQUARE
-                rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE + 80, SQUARE_SIZE, SQUARE_SIZE)
-                pygame.draw.rect(self.screen, color, rect)
+                rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+                pygame.draw.rect(self.board_surface, color, rect)
                 
                 # Zeichne Koordinaten in die Ecke der Felder
+                coord_color = BLACK_SQUARE if (row + col) % 2 == 0 else WHITE_SQUARE
                 if col == 0:  # Zahlen links
-                    number = str(8 - row)
-                    coord_color = BLACK_SQUARE if (row + col) % 2 == 0 else WHITE_SQUARE
-                    coord_text = pygame.font.Font(None, 24).render(number, True, coord_color)
-                    self.screen.blit(coord_text, (col * SQUARE_SIZE + 5, row * SQUARE_SIZE + 85))
+                    coord_text = coord_font.render(str(8 - row), True, coord_color)
+                    self.board_surface.blit(coord_text, (col * SQUARE_SIZE + 5, row * SQUARE_SIZE + 5))
                 
                 if row == 7:  # Buchstaben unten
-                    letter = chr(ord('a') + col)
-                    coord_color = BLACK_SQUARE if (row + col) % 2 == 0 else WHITE_SQUARE
-                    coord_text = pygame.font.Font(None, 24).render(letter, True, coord_color)
+                    coord_text = coord_font.render(chr(ord('a') + col), True, coord_color)
                     text_rect = coord_text.get_rect()
-                    self.screen.blit(coord_text, (col * SQUARE_SIZE + SQUARE_SIZE - text_rect.width - 5, 
-                                                row * SQUARE_SIZE + 80 + SQUARE_SIZE - text_rect.height - 5))
-    
-    def draw_highlights(self):
-        """Zeichnet Hervorhebungen für ausgewähltes Feld und mögliche Züge"""
-        # Hervorhebung für ausgewähltes Feld
-        if self.selected_square and not self.game_over:
-            x, y = self.square_to_pos(self.selected_square)
-            highlight_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-            highlight_surface.fill(SELECTED)
-            self.screen.blit(highlight_surface, (x, y))
-        
-        # Hervorhebung für mögliche Züge
-        if not self.game_over:
-            for move in self.valid_moves:
-                x, y = self.square_to_pos(move)
-                highlight_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                highlight_surface.fill(HIGHLIGHT)
-                self.screen.blit(highlight_surface, (x, y))
-                
-                # Kleiner Kreis in der Mitte für leere Felder
-                if self.board[move[0]][move[1]] == ".":
-                    center_x = x + SQUARE_SIZE // 2
-                    center_y = y + SQUARE_SIZE // 2
-                    pygame.draw.circle(self.screen, (0, 0, 0), (center_x, center_y), 10)
+                    self.board_surface.blit(coord_text, (col * SQUARE_SIZE + SQUARE_SIZE - text_rect.width - 5,
+                                                         row * SQUARE_SIZE + SQUARE_SIZE - text_rect.height - 5))
+        
+        # Overlays für Auswahl, mögliche Züge und den Gewinner-König
+        self.selected_overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.selected_overlay.fill(SELECTED)
+        self.move_overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.move_overlay.fill(HIGHLIGHT)
+        # Kleiner Kreis in der Mitte für leere Felder
+        self.empty_move_overlay = self.move_overlay.copy()
+        pygame.draw.circle(self.empty_move_overlay, (0, 0, 0), (SQUARE_SIZE // 2, SQUARE_SIZE // 2), 10)
+        self.winner_overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.winner_overlay.fill(WINNER_HIGHLIGHT)
+        self.winner_blink_overlay = self.winner_overlay.copy()
+        pygame.draw.rect(self.winner_blink_overlay, (255, 215, 0), (0, 0, SQUARE_SIZE, SQUARE_SIZE), 5)
+        self.check_overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.check_overlay.fill(CHECK_HIGHLIGHT)
+        self.hover_overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.hover_overlay.fill(HOVER_HIGHLIGHT)
+        self.attacked_overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.attacked_overlay.fill(ATTACKED_HIGHLIGHT)
+        self.danger_overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        self.danger_overlay.fill(DANGER_HIGHLIGHT)
+        
+        # Figuren-Atlas: eine fertige Grafik pro Figur und Farbe
+        self.piece_glyphs = {}
+        for piece in PIECE_SYMBOLS:
+            self.piece_glyphs[piece] = self.render_piece(piece)
+    
+    def render_piece(self, piece):
+        """Zeichnet eine Figur auf eine transparente Fläche in Feldgröße"""
+        # Wähle Symbol und Schrift
+        if self.use_unicode and self.unicode_font:
+            symbol = UNICODE_SYMBOLS.get(piece, piece)
+            font = self.unicode_font
+        else:
+            symbol = PIECE_SYMBOLS.get(piece, piece)
+            font = self.piece_font
+        
+        # Bestimme Farben basierend auf Figur
+        if piece.isupper():  # Weiße Figuren
+            piece_color = WHITE_PIECE
+            bg_color = (220, 220, 220)  # Hellgrauer Hintergrund
+            border_color = BLACK_PIECE
+        else:  # Schwarze Figuren
+            piece_color = BLACK_PIECE
+            bg_color = (60, 60, 60)  # Dunkelgrauer Hintergrund
+            border_color = WHITE_PIECE
+        
+        glyph = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        center = (SQUARE_SIZE // 2, SQUARE_SIZE // 2)
+        
+        # Wenn Unicode nicht funktioniert, zeichne einen farbigen Kreis mit Buchstaben
+        if not self.use_unicode:
+            pygame.draw.circle(glyph, bg_color, center, 30)
+            pygame.draw.circle(glyph, border_color, center, 30, 3)
         
-        # Spezielle Hervorhebung wenn das Spiel vorbei ist
+        text = font.render(symbol, True, piece_color)
+        text_rect = text.get_rect()
+        text_rect.center = center
+        glyph.blit(text, text_rect)
+        return glyph
+    
+    def square_marker(self, square, winner_king, blink, check_king=None, hover=(), info=None):
+        """Welche Hervorhebung ein Feld gerade trägt (None oder "selected", "move", "hover", "check", ...)"""
         if self.game_over:
-            # Finde die Position des verbliebenen Königs und markiere ihn als Gewinner
-            white_king, black_king = self.find_kings()
-            
-            winner_king = white_king if self.winner == "Weiß" else black_king
-            if winner_king:
-                x, y = self.square_to_pos(winner_king)
-                # Goldene Hervorhebung für den Gewinner-König
-                highlight_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                highlight_surface.fill((255, 215, 0, 100))  # Gold mit Transparenz
-                self.screen.blit(highlight_surface, (x, y))
-                
-                # Blinkender Rand
-                import time
-                if int(time.time() * 3) % 2:  # Blinkt 3x pro Sekunde
-                    pygame.draw.rect(self.screen, (255, 215, 0), 
-                                   (x, y, SQUARE_SIZE, SQUARE_SIZE), 5)
-    
-    def draw_pieces(self):
-        """Zeichnet die Schachfiguren mit unterschiedlichen Darstellungen"""
+            if square == winner_king:
+                return "winner_blink" if blink else "winner"
+            return None
+        if square == self.selected_square:
+            return "selected"
+        if square in self.valid_moves:
+            return "move"
+        if square in hover:
+            return "hover"
+        if square == check_king:
+            return "check"
+        if info is not None:
+            if self.show_danger and square in info.danger:
+                return "danger"
+            if self.show_attacked and square in info.attacked:
+                return "attacked"
+        return None
+    
+    def square_states(self):
+        """Aktueller Zustand aller Felder als (Figur, Hervorhebung)"""
+        winner_king = None
+        check_king = None
+        blink = False
+        hover = ()
+        info = None
+        if self.game_over:
+            # Markiere den König des Gewinners
+            winner_king = self.winner_king()
+            blink = int(time.time() * 3) % 2 == 1  # Blinkt 3x pro Sekunde
+        else:
+            info = self.position_info()
+            check_king = info.check_king
+            hover = self.hover_moves()
+        states = {}
         for row in range(8):
+            board_row = self.board[row]
             for col in range(8):
-                piece = self.board[row][col]
-                if piece != ".":
-                    # Wähle Symbol und Schrift
-                    if self.use_unicode and self.unicode_font:
-                        symbol = UNICODE_SYMBOLS.get(piece, piece)
-                        font = self.unicode_font
-                    else:
-                        symbol = PIECE_SYMBOLS.get(piece, piece)
-                        font = self.piece_font
-                    
-                    # Bestimme Farben basierend auf Figur
-                    if piece.isupper():  # Weiße Figuren
-                        piece_color = WHITE_PIECE
-                        bg_color = (220, 220, 220)  # Hellgrauer Hintergrund
-                        border_color = BLACK_PIECE
-                    else:  # Schwarze Figuren
-                        piece_color = BLACK_PIECE
-                        bg_color = (60, 60, 60)  # Dunkelgrauer Hintergrund
-                        border_color = WHITE_PIECE
-                    
-                    center_x = col * SQUARE_SIZE + SQUARE_SIZE // 2
-                    center_y = row * SQUARE_SIZE + SQUARE_SIZE // 2 + 80  # +80 für Timer-Bereich
-                    
-                    # Wenn Unicode nicht funktioniert, zeichne einen farbigen Kreis mit Buchstaben
-                    if not self.use_unicode:
-                        # Zeichne Hintergrund-Kreis
-                        pygame.draw.circle(self.screen, bg_color, (center_x, center_y), 30)
-                        pygame.draw.circle(self.screen, border_color, (center_x, center_y), 30, 3)
-                    
-                    # Zeichne das Symbol/den Buchstaben
-                    text = font.render(symbol, True, piece_color)
-                    text_rect = text.get_rect()
-                    text_rect.center = (center_x, center_y)
-                    self.screen.blit(text, text_rect)
+                square = (row, col)
+                states[square] = (board_row[col], self.square_marker(square, winner_king, blink, check_king, hover,
+                                                                     info))
+        return states
+    
+    def square_rect(self, square):
+        x, y = self.square_to_pos(square)
+        return pygame.Rect(x, y, SQUARE_SIZE, SQUARE_SIZE)
+    
+    def draw_board(self, squares=None):
+        """Zeichnet das Schachbrett mit Koordinaten (nur die angegebenen Felder, sonst alle)"""
+        if squares is None:
+            self.screen.blit(self.board_surface, (0, 80))
+            return
+        for square in squares:
+            rect = self.square_rect(square)
+            self.screen.blit(self.board_surface, rect, rect.move(0, -80))
+    
+    def draw_highlights(self, squares=None, states=None):
+        """Zeichnet Hervorhebungen für ausgewähltes Feld, mögliche Züge und den Gewinner"""
+        if states is None:
+            states = self.square_states()
+        if squares is None:
+            squares = states
+        for square in squares:
+            piece, marker = states[square]
+            if marker is None:
+                continue
+            if marker == "selected":
+                overlay = self.selected_overlay
+            elif marker == "move":
+                overlay = self.empty_move_overlay if piece == "." else self.move_overlay
+            elif marker == "hover":
+                overlay = self.hover_overlay
+            elif marker == "check":
+                overlay = self.check_overlay
+            elif marker == "danger":
+                overlay = self.danger_overlay
+            elif marker == "attacked":
+                overlay = self.attacked_overlay
+            elif marker == "winner_blink":
+                overlay = self.winner_blink_overlay
+            else:
+                overlay = self.winner_overlay
+            self.screen.blit(overlay, self.square_to_pos(square))
+    
+    def draw_pieces(self, squares=None):
+        """Zeichnet die Schachfiguren aus dem Figuren-Atlas"""
+        if squares is None:
+            squares = [(row, col) for row in range(8) for col in range(8)]
+        for row, col in squares:
+            piece = self.board[row][col]
+            if piece != ".":
+                self.screen.blit(self.piece_glyphs[piece], self.square_to_pos((row, col)))
     
     def draw_timers(self):
         """Zeichnet die Timer oben auf dem Bildschirm"""
@@ -334,10 +499,14 @@ class ChessGUI:
         
         if self.game_over:
             # Game Over Anzeige
-            if "Zeit" in str(self.winner):  # Zeitablauf
+            if self.draw == "repetition":
+                winner_text = "Dreifache Wiederholung – Remis!"
+            elif self.draw:
+                winner_text = "Patt – Remis!"
+            elif "Zeit" in str(self.winner):  # Zeitablauf
                 winner_text = f"⏰ Zeit abgelaufen! {self.winner} gewinnt! ⏰"
-            else:  # König geschlagen
-                winner_text = f"🏆 {self.winner} gewinnt! 🏆"
+            else:  # Schachmatt
+                winner_text = f"🏆 Schachmatt! {self.winner} gewinnt! 🏆"
             
             winner_surface = self.text_font.render(winner_text, True, (255, 215, 0))  # Gold
             winner_rect = winner_surface.get_rect()
@@ -363,7 +532,9 @@ class ChessGUI:
             self.screen.blit(mode_text, (350, BOARD_SIZE + 95))
             
             # Anweisungen
-            if self.selected_square:
+            if self.replay:
+                instruction = f"Wiedergabe: Halbzug {self.replay_ply}/{len(self.replay)} (← → ↑ ↓ Pos1 Ende)"
+            elif self.selected_square:
                 instruction = "Klicke auf ein Zielfeld oder klicke die Figur erneut ab"
             else:
                 instruction = "Klicke auf eine Figur zum Auswählen"
@@ -375,11 +546,22 @@ class ChessGUI:
             timer_info = "⏰ 10 Min pro Spieler"
             timer_info_text = self.text_font.render(timer_info, True, (150, 150, 150))
             self.screen.blit(timer_info_text, (10, BOARD_SIZE + 155))
+            
+            # Suche des Computers: Denk-Anzeige, Tiefe und Knoten pro Sekunde
+            thinking = self.engine_worker is not None and self.engine_worker.thinking
+            if self.last_search or thinking:
+                if thinking:
+                    depth = self.last_search.depth if self.last_search else 0
+                    search_info = f"Denkt nach… Tiefe {depth}"
+                else:
+                    search_info = f"Tiefe {self.last_search.depth}, {self.last_search.nps // 1000} kN/s"
+                search_text = self.text_font.render(search_info, True, (150, 150, 150))
+                self.screen.blit(search_text, (350, BOARD_SIZE + 155))
     
     def handle_click(self, pos):
         """Behandelt Mausklicks"""
-        # Wenn das Spiel vorbei ist, ignoriere Klicks (außer Neustart)
-        if self.game_over:
+        # Wenn das Spiel vorbei ist, der Computer am Zug ist oder eine Partie wiedergegeben wird, ignoriere Klicks
+        if self.game_over or self.current_player == self.engine_player or self.replay:
             return
             
         square = self.pos_to_square(pos)
@@ -408,24 +590,9 @@ class ChessGUI:
                 self.selected_square = None
                 self.valid_moves = []
             
-            # Wenn ein gültiger Zug geklickt wird
+            # Wenn ein gültiger Zug geklickt wird (valid_moves enthält nur legale Ziele)
             elif square in self.valid_moves:
-                # Zug ausführen
-                selected_piece = self.board[self.selected_square[0]][self.selected_square[1]]
-                if is_valid_move(self.board, self.selected_square, square, selected_piece):
-                    # Prüfe ob ein König geschlagen wird
-                    target_piece = self.board[square[0]][square[1]]
-                    if target_piece != ".":
-                        self.check_king_captured(target_piece)
-                    
-                    # Führe den Zug aus
-                    self.board = make_move(self.board, self.selected_square, square)
-                    
-                    # Spieler wechseln (nur wenn das Spiel nicht vorbei ist)
-                    if not self.game_over:
-                        self.current_player = "black" if self.current_player == "white" else "white"
-                        # Timer-Zeit für den Wechsel aktualisieren
-                        self.last_time = pygame.time.get_ticks()
+                self.execute_move(self.selected_square, square)
                 
                 # Auswahl zurücksetzen
                 self.selected_square = None
@@ -444,54 +611,370 @@ class ChessGUI:
                     self.selected_square = None
                     self.valid_moves = []
     
+    def execute_move(self, start, goal, promotion=None):
+        """Führt einen bereits geprüften Zug aus und wechselt den Spieler"""
+        # Führe den Zug aus (Umwandlung ohne Angabe zur Dame)
+        undo = self.state.make_move(start, goal, promotion)
+        
+        # Zug mit der Restzeit des Ziehenden ins Protokoll schreiben
+        if self.record_pending:
+            self.open_record()
+        if self.record:
+            move = (start, goal, undo.promotion.lower()) if undo.promotion else (start, goal)
+            remaining = self.white_time if self.current_player == "white" else self.black_time
+            self.record.add_move(move, int(remaining * 1000), self.state,
+                                 int(self.white_time * 1000), int(self.black_time * 1000))
+        
+        # Prüfe auf Matt, Patt und Wiederholung
+        self.check_game_end()
+        
+        # Spieler wechseln (nur wenn das Spiel nicht vorbei ist)
+        if not self.game_over:
+            self.current_player = "black" if self.current_player == "white" else "white"
+            # Timer-Zeit für den Wechsel aktualisieren
+            self.last_time = pygame.time.get_ticks()
+            # Züge der neuen Stellung gleich berechnen, damit der nächste Klick nur nachschlägt
+            self.position_info()
+    
+    def start_engine_search(self):
+        """Startet die Suche im Hintergrund; das Zeitbudget kommt aus der eigenen Restzeit"""
+        remaining = self.white_time if self.current_player == "white" else self.black_time
+        self.last_search = None
+        if self.book is not None:
+            move = self.book.choose(self.state)
+            if move is not None:
+                self.update_timers()
+                if not self.game_over:
+                    self.execute_move(*move)
+                return
+        self.engine_worker.start(self.state, time_for_move(remaining))
+    
+    def poll_engine(self):
+        """Übernimmt Zwischenstände und führt den Zug aus, sobald die Suche fertig ist"""
+        for kind, result in self.engine_worker.poll():
+            self.last_search = result
+            if kind != "bestmove" or not result.move:
+                continue
+            # Nur ziehen, wenn die Stellung noch die gesuchte ist
+            if self.state.key != self.engine_worker.request_key or self.game_over:
+                continue
+            # Die Suchzeit läuft auf der Uhr des Computers weiter wie bei einem Menschen
+            self.update_timers()
+            if not self.game_over:
+                self.execute_move(*result.move)
+    
+    def update_engine(self):
+        """Startet oder beobachtet die Suche, wenn der Computer am Zug ist"""
+        if not self.engine_worker or self.replay:
+            return
+        if self.game_over or self.current_player != self.engine_player:
+            if self.engine_worker.thinking:
+                self.engine_worker.cancel()
+            return
+        if self.engine_worker.thinking:
+            self.poll_engine()
+        else:
+            self.start_engine_search()
+    
+    def save_pgn(self, path=None):
+        """Speichert die bisherige Partie als PGN und liefert den Dateinamen"""
+        if path is None:
+            path = time.strftime("partie_%Y%m%d_%H%M%S.pgn")
+        if self.winner == "Weiß":
+            result = "1-0"
+        elif self.winner == "Schwarz":
+            result = "0-1"
+        elif self.draw:
+            result = "1/2-1/2"
+        else:
+            result = "*"
+        headers = {
+            "Event": "Tempo-Schach",
+            "Date": time.strftime("%Y.%m.%d"),
+            "White": "Computer" if self.engine_player == "white" else "Spieler",
+            "Black": "Computer" if self.engine_player == "black" else "Spieler",
+            "TimeControl": str(self.initial_time),
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            write_game(file, headers, history_to_san(self.state), result)
+        return path
+    
+    def timer_state(self):
+        return (self.format_time(self.white_time), self.get_timer_color(self.white_time),
+                self.format_time(self.black_time), self.get_timer_color(self.black_time),
+                self.current_player)
+    
+    def ui_state(self):
+        search = (self.last_search.depth, self.last_search.nps // 1000) if self.last_search else None
+        thinking = self.engine_worker is not None and self.engine_worker.thinking
+        return (self.game_over, self.winner, self.current_player, self.selected_square is not None, search, thinking,
+                self.replay_ply)
+    
+    def render(self):
+        """Zeichnet nur geänderte Bereiche neu und liefert die Rechtecke für display.update"""
+        full = self.needs_full_redraw
+        if full:
+            self.screen.fill(BACKGROUND)
+            self.drawn_squares = {}
+            self.drawn_timers = None
+            self.drawn_ui = None
+            self.needs_full_redraw = False
+        dirty_rects = []
+        
+        timers = self.timer_state()
+        if timers != self.drawn_timers:
+            self.screen.fill(BACKGROUND, TIMER_AREA)
+            self.draw_timers()
+            self.drawn_timers = timers
+            dirty_rects.append(TIMER_AREA)
+        
+        states = self.square_states()
+        changed = [square for square, state in states.items() if self.drawn_squares.get(square) != state]
+        if changed:
+            self.draw_board(changed)
+            self.draw_highlights(changed, states)
+            self.draw_pieces(changed)
+            for square in changed:
+                self.drawn_squares[square] = states[square]
+                dirty_rects.append(self.square_rect(square))
+        
+        ui = self.ui_state()
+        if ui != self.drawn_ui:
+            self.screen.fill(BACKGROUND, UI_AREA)
+            self.draw_ui()
+            self.drawn_ui = ui
+            dirty_rects.append(UI_AREA)
+        
+        if full:
+            return [self.screen.get_rect()]
+        return dirty_rects
+    
+    def next_redraw_delay(self):
+        """Millisekunden, bis sich ohne Eingabe etwas Sichtbares ändert (None: nie)"""
+        now = time.time()
+        delays = []
+        if self.game_over:
+            # Blinkender Rand um den Gewinner-König, 3 Phasen pro Sekunde
+            if self.winner_king():
+                delays.append((math.floor(now * 3) + 1) / 3 - now)
+        elif self.timer_running:
+            # Die angezeigte Sekunde der laufenden Uhr springt beim Unterschreiten einer ganzen Zahl
+            remaining = self.white_time if self.current_player == "white" else self.black_time
+            delays.append(remaining - math.floor(remaining))
+            # Blinken in den letzten 30 Sekunden, 4 Phasen pro Sekunde
+            if min(self.white_time, self.black_time) <= 30:
+                delays.append((math.floor(now * 4) + 1) / 4 - now)
+        if not delays:
+            return None
+        return max(1, int(min(delays) * 1000) + 1)
+    
+    def wait_for_events(self):
+        """Blockiert bis zur nächsten Eingabe oder bis Uhr bzw. Blinken neu gezeichnet werden müssen"""
+        delay = self.next_redraw_delay()
+        if self.engine_worker and self.engine_worker.thinking:
+            # Während der Suche regelmäßig aufwachen, um Ergebnisse abzuholen
+            delay = min(delay or ENGINE_POLL_INTERVAL, ENGINE_POLL_INTERVAL)
+        elif not self.game_over and self.current_player == self.engine_player:
+            return pygame.event.get()
+        if delay is not None:
+            pygame.time.set_timer(REDRAW_EVENT, delay, 1)
+        events = [pygame.event.wait(MAX_IDLE_WAIT)]
+        return events + pygame.event.get()
+    
+    def start_record(self):
+        """Beginnt ein neues Partieprotokoll; die Datei wird erst beim ersten Zug überschrieben"""
+        if self.record:
+            self.record.close()
+        self.record = None
+        self.record_pending = bool(self.record_path)
+    
+    def open_record(self):
+        self.record_pending = False
+        try:
+            os.makedirs(os.path.dirname(self.record_path) or ".", exist_ok=True)
+            initial = int(self.initial_time * 1000)
+            self.record = RecordWriter(self.record_path, initial, initial)
+        except OSError:
+            self.record = None  # ohne Protokoll lässt sich nur nicht wiederherstellen
+    
+    def resume_record(self):
+        """Setzt die im Protokoll gesicherte Partie mit Stellung und Uhren fort
+        
+        Liefert False, wenn dort keine unfertige Partie steht (beendet, Zeit abgelaufen
+        oder unlesbar); dann bleibt alles beim Alten.
+        """
+        try:
+            record = GameRecord(self.record_path)
+            state = record.full_state()
+        except (OSError, ValueError):
+            return False
+        white_ms, black_ms = record.clocks_at(len(record))
+        if state.game_status() is not None or white_ms <= 0 or black_ms <= 0:
+            return False
+        self.state = state
+        self.board = self.state.board
+        self.current_player = self.state.player
+        self.white_time = white_ms / 1000
+        self.black_time = black_ms / 1000
+        self.record = RecordWriter.append_to(self.record_path)
+        return True
+    
+    def open_replay(self, path):
+        """Wiedergabe: Partie aus einer Protokolldatei ansehen, ohne zu spielen"""
+        self.replay = GameRecord(path)
+        self.timer_running = False
+        self.show_replay_ply(len(self.replay))
+    
+    def show_replay_ply(self, ply):
+        """Springt zur Stellung nach ply Halbzügen (höchstens K Züge nachspielen)"""
+        self.replay_ply = max(0, min(ply, len(self.replay)))
+        self.state = self.replay.state_at(self.replay_ply)
+        self.board = self.state.board
+        self.current_player = self.state.player
+        white_ms, black_ms = self.replay.clocks_at(self.replay_ply)
+        self.white_time = white_ms / 1000
+        self.black_time = black_ms / 1000
+        self.selected_square = None
+        self.valid_moves = []
+    
+    def handle_replay_key(self, key):
+        steps = {pygame.K_LEFT: -1, pygame.K_RIGHT: 1, pygame.K_DOWN: -10, pygame.K_UP: 10}
+        if key in steps:
+            self.show_replay_ply(self.replay_ply + steps[key])
+        elif key == pygame.K_HOME:
+            self.show_replay_ply(0)
+        elif key == pygame.K_END:
+            self.show_replay_ply(len(self.replay))
+    
     def restart_game(self):
         """Startet das Spiel neu"""
-        self.board = create_map()
+        self.state = GameState(create_map())
+        self.board = self.state.board
         self.current_player = "white"
         self.selected_square = None
         self.valid_moves = []
         self.game_over = False
         self.winner = None
+        self.draw = False
         # Timer zurücksetzen
         self.white_time = self.initial_time
         self.black_time = self.initial_time
         self.last_time = pygame.time.get_ticks()
         self.timer_running = True
+        self.last_search = None
+        if self.engine_worker:
+            self.engine_worker.cancel()
+        self.start_record()
+    
+    def toggle_profile(self):
+        """F3: Messanzeige ein/aus; schaltet die Messung beim ersten Mal ein"""
+        if not profiler.enabled:
+            profiler.enable(self)
+        self.show_profile = not self.show_profile
+        self.needs_full_redraw = True  # Brett unter der Anzeige wiederherstellen
+    
+    def draw_profile(self):
+        """Zeichnet die Messwerte über das Brett und liefert das geänderte Rechteck"""
+        if self.profile_font is None:
+            self.profile_font = self.fonts.font('Courier', 14)
+            self.fonts.save()
+        self.screen.fill((20, 20, 20), PROFILE_OVERLAY)
+        y = PROFILE_OVERLAY.y + 6
+        for line in profiler.overlay_lines():
+            if y > PROFILE_OVERLAY.bottom - 16:
+                break
+            self.screen.blit(self.profile_font.render(line, True, (0, 255, 0)), (PROFILE_OVERLAY.x + 6, y))
+            y += 16
+        return PROFILE_OVERLAY
+    
+    def handle_events(self, events):
+        """Verarbeitet Eingaben; liefert False, wenn das Fenster geschlossen wurde"""
+        running = True
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    self.toggle_profile()
+                elif event.key == pygame.K_F4 and profiler.enabled:
+                    profiler.dump_json(PROFILE_JSON)
+                    profiler.dump_chrome_trace(PROFILE_TRACE)
+                elif self.replay:  # Wiedergabe: Pfeiltasten, Pos1 und Ende springen durch die Partie
+                    self.handle_replay_key(event.key)
+                elif event.key == pygame.K_ESCAPE:  # ESC für Neustart
+                    self.restart_game()
+                elif event.key == pygame.K_s:  # S speichert die Partie als PGN
+                    self.save_pgn()
+                elif event.key == pygame.K_a:  # A zeigt die vom Gegner angegriffenen Felder
+                    self.show_attacked = not self.show_attacked
+                elif event.key == pygame.K_g:  # G zeigt angegriffene eigene Figuren
+                    self.show_danger = not self.show_danger
+            
+            elif event.type == pygame.MOUSEMOTION:
+                # Vorschau der Züge; neu gezeichnet werden nur Felder, deren Markierung wechselt
+                self.hover_square = self.pos_to_square(event.pos)
+            
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:  # Linke Maustaste
+                    self.handle_click(event.pos)
+            
+            elif event.type == pygame.VIDEOEXPOSE:
+                # Fenster wurde überdeckt: alles neu zeichnen
+                self.needs_full_redraw = True
+        return running
+    
+    def present(self, dirty_rects):
+        """Gibt die geänderten Bereiche an den Bildschirm (entspricht display.flip)"""
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
     
     def run(self):
         """Hauptspiel-Schleife"""
         running = True
         
         while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:  # ESC für Neustart
-                        self.restart_game()
-                
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:  # Linke Maustaste
-                        self.handle_click(event.pos)
+            events = self.wait_for_events() if self.event_driven else pygame.event.get()
+            running = self.handle_events(events)
             
             # Timer aktualisieren
             self.update_timers()
             
-            # Zeichnen
-            self.screen.fill((60, 60, 60))
-            self.draw_timers()  # Timer zuerst zeichnen
-            self.draw_board()
-            self.draw_highlights()
-            self.draw_pieces()
-            self.draw_ui()
+            # Nur geänderte Bereiche zeichnen und an den Bildschirm geben
+            dirty_rects = self.render()
+            if self.show_profile:
+                dirty_rects.append(self.draw_profile())
+            self.present(dirty_rects)
+            
+            # Suche des Computers starten oder Ergebnisse abholen (blockiert nie)
+            self.update_engine()
             
-            pygame.display.flip()
-            self.clock.tick(60)
+            if not self.event_driven:
+                self.clock.tick(60)
         
+        if self.engine_worker:
+            self.engine_worker.close()
+        if self.book:
+            self.book.close()
+        if self.record:
+            self.record.close()
+        if profiler.enabled:
+            profiler.disable()
         pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = ChessGUI()
+    # "--engine black" (oder white) spielt gegen den Computer, "--poll" zeichnet wie früher mit 60 FPS
+    # "--book datei.bin" lässt den Computer in der Eröffnung aus dem Buch spielen,
+    # "--tablebases verzeichnis" Endspiele mit wenigen Steinen exakt
+    # Eine unfertige mitgeschriebene Partie wird fortgesetzt, "--new" beginnt stattdessen eine neue;
+    # "--replay datei.cgr" spielt eine Partie ab
+    # "--profile" misst von Anfang an (sonst erst nach F3)
+    engine_player = sys.argv[sys.argv.index("--engine") + 1] if "--engine" in sys.argv[:-1] else None
+    replay_path = sys.argv[sys.argv.index("--replay") + 1] if "--replay" in sys.argv[:-1] else None
+    book_path = sys.argv[sys.argv.index("--book") + 1] if "--book" in sys.argv[:-1] else None
+    tablebase_dir = sys.argv[sys.argv.index("--tablebases") + 1] if "--tablebases" in sys.argv[:-1] else None
+    game = ChessGUI(engine_player, event_driven="--poll" not in sys.argv, book_path=book_path,
+                    tablebase_dir=tablebase_dir, resume="--new" not in sys.argv, replay_path=replay_path,
+                    profile="--profile" in sys.argv)
     game.run()
\ No newline at end of file
@@ -1,29 +1,53 @@
 from map import create_map,print_map,field_to_index
-from engine import is_valid_move, make_move
+from engine import GameState
+from pgn import decode_san
 
 def chess():
     map = create_map()  # Funktion aufrufen mit ()
-    player = "white"
+    state = GameState(map)  # für SAN-Eingaben wie "Nf3" und die Zugprüfung
 
     while True:
         print_map(map)
+        player = state.player
         turn = input(f"{player}'s turn: ")
         if turn.lower() == "exit":
             break
         try:
-            start_field, goal_field = turn.split()
-            start = field_to_index(start_field)
-            goal = field_to_index(goal_field)
-            figure = map[start[0]][start[1]]
-            if is_valid_move(map, start, goal, figure):
-                map = make_move(map, start, goal)
-                player = "black" if player == "white" else "white"
+            fields = turn.split()
+            promotion = None
+            if len(fields) == 1:
+                move = decode_san(state, fields[0])
+                start, goal = move[0], move[1]
+                promotion = move[2] if len(move) == 3 else None
+            else:
+                start_field, goal_field = fields[:2]
+                start = field_to_index(start_field)
+                goal = field_to_index(goal_field)
+                if len(fields) == 3:
+                    promotion = fields[2].lower()  # z.B. "e7 e8 n"
+            if state.is_legal_move(start, goal, promotion):
+                state.make_move(start, goal, promotion)
             else:
                 print("Invalid move. Try again.")
+                continue
         except ValueError:
-            print("Invalid input. Please enter your move in the format 'e2 e4'.")
+            print("Invalid input. Please enter your move in the format 'e2 e4' or 'Nf3'.")
+            continue
         except IndexError:
             print("Invalid field. Please use fields from a1 to h8.")
+            continue
+
+        status = state.game_status()
+        if status == "checkmate":
+            print_map(map)
+            print(f"Checkmate! {player} wins.")
+            break
+        if status in ("stalemate", "repetition"):
+            print_map(map)
+            print(f"Draw by {status}.")
+            break
+        if state.is_in_check():
+            print("Check!")
 
 if __name__ == "__main__":
     chess()
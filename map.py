@@ -1,3 +1,5 @@
+from array import array
+
 def create_map():
     map = [
         ["r","n","b","q","k","b","n","r"],  
@@ -21,3 +23,91 @@ def field_to_index(field):
     column = ord(field[0])-ord("a")
     row = 8 - int(field[1])
     return row, column
+
+def index_to_field(index):
+    row, column = index
+    return chr(ord("a") + column) + str(8 - row)
+
+def map_to_fen(map, player="white", castling="", en_passant=None, halfmove=0, fullmove=1):
+    rows = []
+    for row in map:
+        text = ""
+        empty = 0
+        for figure in row:
+            if figure == ".":
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += figure
+        if empty:
+            text += str(empty)
+        rows.append(text)
+    side = "w" if player == "white" else "b"
+    target = index_to_field(en_passant) if en_passant else "-"
+    return f"{'/'.join(rows)} {side} {castling or '-'} {target} {halfmove} {fullmove}"
+
+def fen_to_map(fen):
+    """Liest eine FEN und liefert (map, player, castling, en_passant, halfmove, fullmove)"""
+    fields = fen.split()
+    if not fields:
+        raise ValueError("empty FEN")
+    rows = fields[0].split("/")
+    if len(rows) != 8:
+        raise ValueError(f"FEN needs 8 rows: {fen!r}")
+    map = []
+    for text in rows:
+        row = []
+        for char in text:
+            if char.isdigit():
+                row.extend("." * int(char))
+            elif char in "PNBRQKpnbrqk":
+                row.append(char)
+            else:
+                raise ValueError(f"bad piece {char!r} in FEN")
+        if len(row) != 8:
+            raise ValueError(f"FEN row {text!r} does not have 8 squares")
+        map.append(row)
+    player = "black" if len(fields) > 1 and fields[1] == "b" else "white"
+    castling = fields[2] if len(fields) > 2 and fields[2] != "-" else ""
+    en_passant = field_to_index(fields[3]) if len(fields) > 3 and fields[3] != "-" else None
+    halfmove = int(fields[4]) if len(fields) > 4 else 0
+    fullmove = int(fields[5]) if len(fields) > 5 else 1
+    return map, player, castling, en_passant, halfmove, fullmove
+
+
+# Kompaktes 0x88-Brett: 128 Bytes, Index = row * 16 + column.
+# Weiße Figuren sind positiv, schwarze negativ, leere Felder 0.
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+
+PIECE_CODES = {
+    ".": EMPTY,
+    "P": PAWN, "N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING,
+    "p": -PAWN, "n": -KNIGHT, "b": -BISHOP, "r": -ROOK, "q": -QUEEN, "k": -KING,
+}
+PIECE_CHARS = {code: char for char, code in PIECE_CODES.items()}
+
+def on_board(index):
+    # Ein einziger Bitmasken-Test statt zwei Bereichsprüfungen
+    return not index & 0x88
+
+def square_to_index(square):
+    row, column = square
+    return row * 16 + column
+
+def index_to_square(index):
+    return index >> 4, index & 7
+
+def create_board():
+    return map_to_board(create_map())
+
+def map_to_board(map):
+    board = array("b", bytes(128))
+    for row in range(8):
+        for column in range(8):
+            board[row * 16 + column] = PIECE_CODES[map[row][column]]
+    return board
+
+def board_to_map(board):
+    return [[PIECE_CHARS[board[row * 16 + column]] for column in range(8)] for row in range(8)]
@@ -0,0 +1,259 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from map import create_map, fen_to_map
+from engine import GameState
+from search import Searcher, time_for_move
+from book import OpeningBook
+from tablebase import Tablebases
+
+# Selbstspiel zwischen zwei Engine-Einstellungen A und B ohne pygame. Jede Startstellung
+# wird zweimal gespielt, einmal mit A als Weiß und einmal mit B als Weiß. Die Uhr folgt
+# dem Modell von ChessGUI: jede Seite hat eine feste Bedenkzeit ohne Zuschlag, das Budget
+# pro Zug kommt aus time_for_move, und wer die Zeit überschreitet, verliert.
+#
+# Einstellungen als "depth=6,nodes=50000,tt=8,book=buch.bin,tablebases=tb"; alle Angaben
+# sind optional.
+
+ENGINE_OPTIONS = {"depth": int, "nodes": int, "tt": float, "book": str, "tablebases": str}
+MAX_PLIES = 300  # danach Remis, damit keine Partie endlos läuft
+
+def parse_engine(text):
+    """Liest eine Engine-Einstellung "name=wert,..." in ein Dict"""
+    options = {}
+    for item in filter(None, text.split(",")):
+        name, _, value = item.partition("=")
+        if name not in ENGINE_OPTIONS or not value:
+            raise ValueError(f"bad engine option {item!r}")
+        options[name] = ENGINE_OPTIONS[name](value)
+    return options
+
+def read_openings(file):
+    """Eine FEN pro Zeile; leere Zeilen und Zeilen mit "#" werden übersprungen"""
+    return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+# Buch und Endspieldatenbanken werden pro Prozess nur einmal geöffnet
+_shared = {}
+
+def _open_shared(kind, path):
+    if not path:
+        return None
+    if (kind, path) not in _shared:
+        _shared[kind, path] = OpeningBook(path) if kind == "book" else Tablebases(path)
+    return _shared[kind, path]
+
+def _searcher(options):
+    # Pro Partie eine neue Tabelle, damit keine Partie von der vorigen profitiert
+    return Searcher(tt_size_mb=options.get("tt", 4), book=_open_shared("book", options.get("book")),
+                    tablebases=_open_shared("tablebases", options.get("tablebases")))
+
+def _start_state(fen, random_plies, seed):
+    if fen:
+        map, player, castling, en_passant = fen_to_map(fen)[:4]
+        state = GameState(map, player, castling, en_passant)
+    else:
+        state = GameState(create_map())
+    # Zufällige Eröffnungszüge; beide Partien eines Paares bekommen dieselben
+    rng = random.Random(seed)
+    for _ in range(random_plies):
+        moves = state.generate_legal_moves()
+        if not moves:
+            break
+        state.make_move(*rng.choice(moves))
+    return state
+
+def play_game(task):
+    """Spielt eine Partie; liefert das Ergebnis aus Sicht von A (1, 0.5 oder 0)"""
+    number, pair, fen, a_white, engine_a, engine_b, seconds, random_plies, seed, max_plies = task
+    state = _start_state(fen, random_plies, seed)
+    white, black = (engine_a, engine_b) if a_white else (engine_b, engine_a)
+    searchers = {"white": _searcher(white), "black": _searcher(black)}
+    options = {"white": white, "black": black}
+    clocks = {"white": float(seconds), "black": float(seconds)}
+    plies = 0
+    winner = None
+    reason = "max plies"
+    started = time.monotonic()
+
+    while plies < max_plies:
+        status = state.game_status()
+        if status is not None:
+            reason = status
+            if status == "checkmate":
+                winner = "black" if state.player == "white" else "white"
+            break
+        player = state.player
+        begin = time.monotonic()
+        result = searchers[player].search(state, max_depth=options[player].get("depth", 64),
+                                          node_limit=options[player].get("nodes"),
+                                          deadline=begin + time_for_move(clocks[player]))
+        clocks[player] -= time.monotonic() - begin
+        if clocks[player] <= 0:
+            winner = "black" if player == "white" else "white"
+            reason = "time"
+            break
+        # Der Zug läuft durch dieselbe Prüfung wie in der GUI
+        if result.move is None or not state.is_legal_move(*result.move):
+            winner = "black" if player == "white" else "white"
+            reason = "illegal move"
+            break
+        state.make_move(*result.move)
+        plies += 1
+
+    if winner is None:
+        score = 0.5
+    else:
+        score = 1.0 if (winner == "white") == a_white else 0.0
+    return {"game": number, "pair": pair, "a_white": a_white, "score": score, "winner": winner, "reason": reason,
+            "plies": plies, "seconds": round(time.monotonic() - started, 3)}
+
+def elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def elo_estimate(wins, draws, losses):
+    """Elo-Differenz von A gegenüber B mit 95-%-Intervall (untere, obere Grenze)"""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, -math.inf, math.inf
+    mean = (wins + draws / 2) / games
+    variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + losses * mean ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return elo(mean), elo(mean - margin), elo(mean + margin)
+
+def sprt(wins, draws, losses, elo0=0.0, elo1=10.0, alpha=0.05, beta=0.05):
+    """Sequentieller Test H0: elo0 gegen H1: elo1 (Normal-Näherung des Trinomialmodells)
+
+    Liefert (LLR, untere Grenze, obere Grenze, Entscheidung); die Entscheidung ist
+    "H1" (A ist mindestens elo1 besser), "H0" oder None, solange weitergespielt wird.
+    """
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    if not games:
+        return 0.0, lower, upper, None
+    mean = (wins + draws / 2) / games
+    variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + losses * mean ** 2) / games
+    if variance <= 0:
+        return 0.0, lower, upper, None
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    llr = games * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+    decision = "H1" if llr >= upper else "H0" if llr <= lower else None
+    return llr, lower, upper, decision
+
+def make_tasks(openings, pairs, engine_a, engine_b, seconds, random_plies, seed, max_plies):
+    """Zwei Partien pro Paar mit vertauschten Farben; die Startstellungen wiederholen sich reihum"""
+    openings = openings or [""]
+    number = 0
+    for pair in range(pairs):
+        fen = openings[pair % len(openings)]
+        for a_white in (True, False):
+            yield (number, pair, fen, a_white, engine_a, engine_b, seconds, random_plies, seed + pair, max_plies)
+            number += 1
+
+def run_match(tasks, workers=None, sprt_bounds=None, output=None, progress=None):
+    """Verteilt die Partien auf Prozesse; bricht ab, sobald der SPRT entschieden hat
+
+    Wie batch.run_batch sind höchstens zwei Partien pro Worker unterwegs.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = {"wins": 0, "draws": 0, "losses": 0, "plies": 0, "decision": None}
+    started = time.monotonic()
+
+    def add(result):
+        stats["plies"] += result["plies"]
+        stats["wins" if result["score"] == 1 else "losses" if result["score"] == 0 else "draws"] += 1
+        if output:
+            output.write(json.dumps(result) + "\n")
+        if sprt_bounds is not None:
+            stats["decision"] = sprt(stats["wins"], stats["draws"], stats["losses"], *sprt_bounds)[3]
+        if progress:
+            progress(stats)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for task in tasks:
+            if stats["decision"]:
+                break
+            pending.add(executor.submit(play_game, task))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    add(future.result())
+        for future in pending:
+            if stats["decision"]:
+                future.cancel()
+            elif not future.cancelled():
+                add(future.result())
+    stats["seconds"] = time.monotonic() - started
+    return stats
+
+def format_report(stats, sprt_bounds=None):
+    wins, draws, losses = stats["wins"], stats["draws"], stats["losses"]
+    games = wins + draws + losses
+    difference, low, high = elo_estimate(wins, draws, losses)
+    lines = [f"{games} games: +{wins} ={draws} -{losses}",
+             f"Elo A-B: {difference:+.1f} (95% {low:+.1f} .. {high:+.1f})"]
+    if sprt_bounds is not None:
+        llr, lower, upper, decision = sprt(wins, draws, losses, *sprt_bounds)
+        lines.append(f"SPRT elo0={sprt_bounds[0]:g} elo1={sprt_bounds[1]:g}: LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]"
+                     f" -> {decision or 'continue'}")
+    seconds = stats.get("seconds", 0)
+    if seconds:
+        lines.append(f"{stats['plies']} plies in {seconds:.1f}s ({stats['plies'] / seconds:.0f} plies/s)")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Selbstspiel zweier Engine-Einstellungen mit Elo und SPRT")
+    parser.add_argument("-a", "--engine-a", default="", help="Einstellung A, z. B. depth=4,tt=8")
+    parser.add_argument("-b", "--engine-b", default="", help="Einstellung B")
+    parser.add_argument("-n", "--games", type=int, default=1000, help="Anzahl Partien (gerundet auf Paare)")
+    parser.add_argument("-t", "--time", type=float, default=10.0, help="Bedenkzeit pro Seite in Sekunden")
+    parser.add_argument("--openings", help="Datei mit Startstellungen, eine FEN pro Zeile")
+    parser.add_argument("--random-plies", type=int, default=0, help="zufällige Eröffnungszüge pro Paar")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"), help="SPRT mit frühem Abbruch")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("-o", "--output", help="Ergebnisse pro Partie als JSON Lines")
+    args = parser.parse_args(argv)
+
+    try:
+        engine_a = parse_engine(args.engine_a)
+        engine_b = parse_engine(args.engine_b)
+    except ValueError as error:
+        parser.error(str(error))
+    openings = []
+    if args.openings:
+        with open(args.openings) as file:
+            openings = read_openings(file)
+    sprt_bounds = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+
+    def progress(stats):
+        games = stats["wins"] + stats["draws"] + stats["losses"]
+        if games % 10 == 0 or stats["decision"]:
+            difference, low, high = elo_estimate(stats["wins"], stats["draws"], stats["losses"])
+            print(f"{games}: +{stats['wins']} ={stats['draws']} -{stats['losses']} Elo {difference:+.1f}"
+                  f" ({low:+.1f} .. {high:+.1f})", file=sys.stderr)
+
+    tasks = make_tasks(openings, (args.games + 1) // 2, engine_a, engine_b, args.time, args.random_plies,
+                       args.seed, args.max_plies)
+    output = open(args.output, "w") if args.output else None
+    try:
+        stats = run_match(tasks, args.workers, sprt_bounds, output, progress)
+    finally:
+        if output:
+            output.close()
+    print(format_report(stats, sprt_bounds))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
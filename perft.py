@@ -0,0 +1,312 @@
+import argparse
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from map import create_map, fen_to_map, map_to_board, index_to_field, index_to_square, PAWN, QUEEN
+from engine import is_valid_move, make_move, generate_board_moves, validate_moves, GameState
+from bitboard import Position, index_square
+
+# Perft: zählt die Blattknoten des Zugbaums bis zur Tiefe N. Das Backend "legal"
+# spielt nach den vollständigen Regeln (Schach, Rochade, en passant, Umwandlung)
+# und muss die bekannten Referenzzahlen liefern. Die übrigen Backends erzeugen
+# pseudolegale Züge (ohne Rochade und en passant, Umwandlung nur zur Dame) und
+# müssen untereinander übereinstimmen.
+
+def parse_board(text):
+    """Stellung als acht Reihen mit "/" getrennt, z.B. "rnbqkbnr/pppppppp/......../..." """
+    rows = text.split("/")
+    if len(rows) != 8 or any(len(row) != 8 for row in rows):
+        raise ValueError(f"expected 8 rows of 8 squares: {text!r}")
+    return [list(row) for row in rows]
+
+def format_move(start, goal, promotion=None):
+    return index_to_field(start) + index_to_field(goal) + (promotion or "")
+
+def _reference_moves(map, player):
+    # Der bisherige Weg: jedes Zielfeld einzeln über is_valid_move prüfen
+    white = player == "white"
+    moves = []
+    for s_r in range(8):
+        for s_c in range(8):
+            figure = map[s_r][s_c]
+            if figure == "." or figure.isupper() != white:
+                continue
+            for g_r in range(8):
+                for g_c in range(8):
+                    if (g_r, g_c) != (s_r, s_c) and is_valid_move(map, (s_r, s_c), (g_r, g_c), figure):
+                        moves.append(((s_r, s_c), (g_r, g_c)))
+    return moves
+
+def _perft_reference(map, player, depth):
+    if depth == 0:
+        return 1
+    other = "black" if player == "white" else "white"
+    nodes = 0
+    for start, goal in _reference_moves(map, player):
+        figure = map[start[0]][start[1]]
+        captured = map[goal[0]][goal[1]]
+        make_move(map, start, goal)
+        nodes += _perft_reference(map, other, depth - 1)
+        map[start[0]][start[1]] = figure
+        map[goal[0]][goal[1]] = captured
+    return nodes
+
+def _perft_movegen(state, depth):
+    if depth == 0:
+        return 1
+    moves = state.generate_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for start, goal in moves:
+        state.make_move(start, goal)
+        nodes += _perft_movegen(state, depth - 1)
+        state.unmake_move()
+    return nodes
+
+def _perft_legal(state, depth):
+    if depth == 0:
+        return 1
+    moves = state.generate_legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        state.make_move(*move)
+        nodes += _perft_legal(state, depth - 1)
+        state.unmake_move()
+    return nodes
+
+def _make_0x88(board, start, goal):
+    # Wie engine.make_move: ein Bauer auf der letzten Reihe wird zur Dame
+    figure = board[start]
+    if (figure == PAWN and goal < 16) or (figure == -PAWN and goal >= 112):
+        figure = QUEEN if figure > 0 else -QUEEN
+    board[goal] = figure
+    board[start] = 0
+
+def _perft_0x88(board, white, depth):
+    if depth == 0:
+        return 1
+    moves = generate_board_moves(board, white)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for start, goal in moves:
+        figure = board[start]
+        captured = board[goal]
+        _make_0x88(board, start, goal)
+        nodes += _perft_0x88(board, not white, depth - 1)
+        board[start] = figure
+        board[goal] = captured
+    return nodes
+
+def _perft_bitboard(position, depth):
+    if depth == 0:
+        return 1
+    moves = position.generate_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += _perft_bitboard(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+def _root_moves(backend, map, player, castling="", en_passant=None):
+    """Wurzelzüge als ((row, col), (row, col)) plus Funktion, die den Teilbaum zählt"""
+    if backend == "legal":
+        state = GameState([row[:] for row in map], player, castling, en_passant)
+        def count(move, depth):
+            state.make_move(*move)
+            nodes = _perft_legal(state, depth)
+            state.unmake_move()
+            return nodes
+        return state.generate_legal_moves(), count
+    if backend == "reference":
+        def count(move, depth):
+            child = [row[:] for row in map]
+            make_move(child, *move)
+            return _perft_reference(child, "black" if player == "white" else "white", depth)
+        return _reference_moves(map, player), count
+    if backend == "movegen":
+        state = GameState([row[:] for row in map], player)
+        def count(move, depth):
+            state.make_move(*move)
+            nodes = _perft_movegen(state, depth)
+            state.unmake_move()
+            return nodes
+        return state.generate_moves(), count
+    if backend == "0x88":
+        board = map_to_board(map)
+        white = player == "white"
+        def count(move, depth):
+            start, goal = move[0][0] * 16 + move[0][1], move[1][0] * 16 + move[1][1]
+            figure = board[start]
+            captured = board[goal]
+            _make_0x88(board, start, goal)
+            nodes = _perft_0x88(board, not white, depth)
+            board[start] = figure
+            board[goal] = captured
+            return nodes
+        moves = [(index_to_square(start), index_to_square(goal)) for start, goal in generate_board_moves(board, white)]
+        return moves, count
+    if backend == "bitboard":
+        position = Position.from_map(map, player)
+        def count(move, depth):
+            position.make_move((move[0][0] * 8 + move[0][1], move[1][0] * 8 + move[1][1]))
+            nodes = _perft_bitboard(position, depth)
+            position.unmake_move()
+            return nodes
+        moves = [(index_square(start), index_square(goal)) for start, goal in position.generate_moves()]
+        return moves, count
+    raise ValueError(f"unknown backend: {backend}")
+
+PSEUDO_LEGAL_BACKENDS = ("reference", "movegen", "0x88", "bitboard")
+BACKENDS = ("legal",) + PSEUDO_LEGAL_BACKENDS
+
+def divide(map, player, depth, backend="legal", castling="", en_passant=None):
+    """Knotenzahl je Wurzelzug, sortiert nach Zugtext"""
+    if depth < 1:
+        raise ValueError("divide needs depth >= 1")
+    moves, count = _root_moves(backend, map, player, castling, en_passant)
+    return dict(sorted((format_move(*move), count(move, depth - 1)) for move in moves))
+
+def perft(map, player, depth, backend="legal", castling="", en_passant=None):
+    if depth == 0:
+        return 1
+    return sum(divide(map, player, depth, backend, castling, en_passant).values())
+
+def benchmark(map, player, depth, backends=BACKENDS, castling="", en_passant=None):
+    """Misst Knoten pro Sekunde je Backend und prüft, dass die pseudolegalen Backends übereinstimmen"""
+    results = {}
+    for backend in backends:
+        started = time.perf_counter()
+        nodes = perft(map, player, depth, backend, castling, en_passant)
+        elapsed = time.perf_counter() - started
+        results[backend] = {
+            "nodes": nodes,
+            "seconds": round(elapsed, 6),
+            "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+        }
+    counts = {result["nodes"] for backend, result in results.items() if backend in PSEUDO_LEGAL_BACKENDS}
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "player": player,
+        "depth": depth,
+        "consistent": len(counts) <= 1,
+        "backends": results,
+    }
+
+def _validation_batch(map, player, depth, castling="", en_passant=None):
+    # Jede Stellung bis depth - 1 Halbzüge: jede eigene Figur zu allen 64 Feldern
+    state = GameState([row[:] for row in map], player, castling, en_passant)
+    positions, moves = [], []
+
+    def visit(depth):
+        board = [row[:] for row in state.board]
+        for start in state.pieces[state.player]:
+            for goal in ((r, c) for r in range(8) for c in range(8)):
+                positions.append(board)
+                moves.append((start, goal))
+        if depth > 1:
+            for move in state.generate_legal_moves():
+                state.make_move(*move)
+                visit(depth - 1)
+                state.unmake_move()
+
+    visit(depth)
+    return positions, moves
+
+def benchmark_validation(map, player, depth, castling="", en_passant=None, repeat=3):
+    """Vergleicht validate_moves mit einer Schleife über is_valid_move (beste von repeat Messungen)"""
+    positions, moves = _validation_batch(map, player, depth, castling, en_passant)
+
+    def loop():
+        results = []
+        for board, (start, goal) in zip(positions, moves):
+            figure = board[start[0]][start[1]]
+            results.append(int(figure != "." and is_valid_move(board, start, goal, figure)))
+        return results
+
+    timings = {}
+    outputs = {}
+    for name, function in (("loop", loop), ("validate_moves", lambda: validate_moves(positions, moves))):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            outputs[name] = list(function())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = round(best, 6)
+    return {"positions": len({id(board) for board in positions}), "moves": len(moves), "seconds": timings,
+            "consistent": outputs["loop"] == outputs["validate_moves"]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft-Zählung und Zuggenerator-Benchmark")
+    parser.add_argument("depth", type=int)
+    parser.add_argument("--board", help='Stellung als 8 Reihen mit "/" getrennt (Standard: Startstellung)')
+    parser.add_argument("--fen", help="Stellung als FEN (mit Rochaderechten und En-passant-Feld)")
+    parser.add_argument("--player", choices=("white", "black"), default="white")
+    parser.add_argument("--backend", choices=BACKENDS, default="legal")
+    parser.add_argument("--divide", action="store_true", help="Knoten je Wurzelzug ausgeben")
+    parser.add_argument("--bench", action="store_true", help="alle Backends messen")
+    parser.add_argument("--bench-validate", action="store_true",
+                        help="validate_moves gegen eine Schleife über is_valid_move messen (Stellungen bis depth - 1)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--output", help="Benchmark-Ergebnis als JSON in diese Datei schreiben")
+    args = parser.parse_args(argv)
+
+    castling, en_passant = "KQkq", None
+    player = args.player
+    if args.fen:
+        map, player, castling, en_passant = fen_to_map(args.fen)[:4]
+    elif args.board:
+        map = parse_board(args.board)
+        castling = ""
+    else:
+        map = create_map()
+
+    if args.bench_validate:
+        report = benchmark_validation(map, player, args.depth, castling, en_passant)
+        seconds = report["seconds"]
+        print(f"{report['moves']} moves in {report['positions']} positions")
+        for name, elapsed in seconds.items():
+            print(f"{name:15} {elapsed:>10.3f} s {int(report['moves'] / elapsed) if elapsed > 0 else 0:>10} moves/s")
+        if not report["consistent"]:
+            print("WARNING: validate_moves disagrees with is_valid_move")
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+        return 0 if report["consistent"] else 1
+
+    if args.bench:
+        report = benchmark(map, player, args.depth, args.backends, castling, en_passant)
+        for backend, result in report["backends"].items():
+            print(f"{backend:10} {result['nodes']:>12} nodes {result['seconds']:>10.3f} s {result['nps']:>10} nodes/s")
+        if not report["consistent"]:
+            print("WARNING: backends disagree on the node count")
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+        return 0 if report["consistent"] else 1
+
+    started = time.perf_counter()
+    if args.divide:
+        counts = divide(map, player, args.depth, args.backend, castling, en_passant)
+        for move, nodes in counts.items():
+            print(f"{move}: {nodes}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(map, player, args.depth, args.backend, castling, en_passant)
+    elapsed = time.perf_counter() - started
+    print(f"Nodes: {nodes}")
+    print(f"Time: {elapsed:.3f} s ({int(nodes / elapsed) if elapsed > 0 else 0} nodes/s)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
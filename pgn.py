@@ -0,0 +1,257 @@
+import re
+from collections import namedtuple
+from datetime import date
+from map import create_map, fen_to_map, index_to_field, field_to_index
+from engine import GameState
+
+# Eine Partie aus einer PGN-Datei: Kopfzeilen, Züge in SAN und Ergebnis
+Game = namedtuple("Game", ("headers", "moves", "result"))
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+
+_HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_MOVE_NUMBER = re.compile(r"^\d+\.+")
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(=[NBRQ])?$")
+
+def _tokens(text, depth):
+    """Zerlegt Zugtext in Tokens; Kommentare und Varianten werden übersprungen
+
+    depth ist eine Liste [Kommentar offen, Variantentiefe], damit Kommentare
+    und Varianten über mehrere Zeilen reichen können.
+    """
+    tokens = []
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if depth[0]:
+            end = text.find("}", i)
+            if end < 0:
+                return tokens
+            depth[0] = False
+            i = end + 1
+            continue
+        if char == "{":
+            depth[0] = True
+            i += 1
+            continue
+        if char == ";":
+            return tokens
+        if char == "(":
+            depth[1] += 1
+            i += 1
+            continue
+        if char == ")":
+            depth[1] = max(0, depth[1] - 1)
+            i += 1
+            continue
+        if char.isspace():
+            i += 1
+            continue
+        start = i
+        while i < length and not text[i].isspace() and text[i] not in "{}();":
+            i += 1
+        if not depth[1]:
+            tokens.append(text[start:i])
+    return tokens
+
+def read_games(file):
+    """Liest Partien zeilenweise aus einer PGN-Datei und liefert sie einzeln
+
+    Es wird immer nur die aktuelle Partie im Speicher gehalten, daher funktioniert
+    das auch mit sehr großen Dateien.
+    """
+    headers = {}
+    moves = []
+    result = "*"
+    depth = [False, 0]
+    in_moves = False
+
+    for line in file:
+        stripped = line.strip()
+        if not depth[0] and not depth[1] and stripped.startswith("[") and not stripped.startswith("[%"):
+            if in_moves:
+                # Neue Kopfzeile ohne Ergebnis-Token: vorherige Partie abschließen
+                yield Game(headers, moves, headers.get("Result", result))
+                headers, moves, result, in_moves = {}, [], "*", False
+            match = _HEADER.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+            continue
+        if stripped.startswith("%"):
+            continue
+
+        for token in _tokens(line, depth):
+            in_moves = True
+            if token in RESULTS:
+                yield Game(headers, moves, token)
+                headers, moves, result, in_moves = {}, [], "*", False
+                depth = [False, 0]
+                continue
+            if token.startswith("$"):
+                continue
+            token = _MOVE_NUMBER.sub("", token)
+            if token:
+                moves.append(token)
+
+    if in_moves or headers:
+        yield Game(headers, moves, headers.get("Result", result))
+
+def start_state(headers=None):
+    """Ausgangsstellung einer Partie, auch aus einem FEN-Kopf"""
+    if headers and "FEN" in headers:
+        map, player, castling, en_passant = fen_to_map(headers["FEN"])[:4]
+        return GameState(map, player, castling, en_passant)
+    return GameState(create_map())
+
+def decode_san(state, san):
+    """Wandelt einen SAN-Zug in (start, goal) oder (start, goal, figur) für die Stellung um
+
+    Es werden nur legale Züge betrachtet, Mehrdeutigkeiten werden darüber aufgelöst.
+    """
+    text = san.rstrip("+#!?")
+    moves = state.generate_legal_moves()
+    king = state.kings[state.player]
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        column = 6 if len(text) == 3 else 2
+        for move in moves:
+            if move[0] == king and move[1] == (king[0], column) and king[1] == 4:
+                return move
+        raise ValueError(f"castling is not possible: {san!r}")
+    match = _SAN.match(text)
+    if not match:
+        raise ValueError(f"cannot parse SAN move {san!r}")
+    piece, from_file, from_rank, capture, target, promotion = match.groups()
+
+    goal = field_to_index(target)
+    figure = piece or "P"
+    if state.player == "black":
+        figure = figure.lower()
+    promotion = promotion[1].lower() if promotion else None
+    board = state.board
+
+    candidates = []
+    for move in moves:
+        start = move[0]
+        if move[1] != goal or board[start[0]][start[1]] != figure:
+            continue
+        if from_file and start[1] != ord(from_file) - ord("a"):
+            continue
+        if from_rank and start[0] != 8 - int(from_rank):
+            continue
+        if len(move) == 3 and move[2] != (promotion or "q"):
+            continue
+        if len(move) == 2 and promotion:
+            continue
+        candidates.append(move)
+
+    if not candidates:
+        raise ValueError(f"no move matches {san!r}")
+    if len(candidates) > 1:
+        raise ValueError(f"ambiguous move {san!r}")
+    move = candidates[0]
+    if capture and board[goal[0]][goal[1]] == "." and goal != state.en_passant:
+        raise ValueError(f"{san!r} captures on an empty square")
+    return move
+
+def encode_san(state, move):
+    """Schreibt einen legalen Zug der aktuellen Stellung in SAN, mit "+" bzw. "#" """
+    start, goal = move[0], move[1]
+    board = state.board
+    figure = board[start[0]][start[1]]
+    target = index_to_field(goal)
+
+    if figure.lower() == "k" and abs(goal[1] - start[1]) == 2:
+        text = "O-O" if goal[1] > start[1] else "O-O-O"
+    elif figure.lower() == "p":
+        text = target
+        if start[1] != goal[1]:
+            text = index_to_field(start)[0] + "x" + target
+        if len(move) == 3:
+            text += "=" + move[2].upper()
+    else:
+        capture = board[goal[0]][goal[1]] != "."
+        # Andere Figuren derselben Art, die dasselbe Ziel legal erreichen
+        others = [other[0] for other in state.generate_legal_moves()
+                  if other[1] == goal and other[0] != start and board[other[0][0]][other[0][1]] == figure]
+        text = figure.upper()
+        if others:
+            if all(other[1] != start[1] for other in others):
+                text += index_to_field(start)[0]
+            elif all(other[0] != start[0] for other in others):
+                text += index_to_field(start)[1]
+            else:
+                text += index_to_field(start)
+        text += ("x" if capture else "") + target
+
+    state.make_move(*move)
+    if state.is_in_check():
+        text += "#" if not state.generate_legal_moves() else "+"
+    state.unmake_move()
+    return text
+
+def replay(game):
+    """Spielt die SAN-Züge einer Partie nach und liefert die Züge in Koordinatenform"""
+    state = start_state(game.headers)
+    moves = []
+    for san in game.moves:
+        move = decode_san(state, san)
+        state.make_move(*move)
+        moves.append(move)
+    return moves
+
+def history_to_san(state, headers=None):
+    """SAN-Liste der in state.history gespeicherten Züge, ab der Ausgangsstellung"""
+    replay_state = start_state(headers)
+    moves = []
+    for undo in state.history:
+        move = (undo.start, undo.goal) + ((undo.promotion.lower(),) if undo.promotion else ())
+        moves.append(encode_san(replay_state, move))
+        replay_state.make_move(*move)
+    return moves
+
+def format_game(headers, moves, result="*", first_player="white", first_move=1):
+    """Erzeugt PGN-Text; die Sieben-Tag-Kopfzeilen stehen zuerst"""
+    headers = dict(headers)
+    headers["Result"] = result
+    defaults = {"Event": "?", "Site": "?", "Date": date.today().strftime("%Y.%m.%d"),
+                "Round": "?", "White": "?", "Black": "?"}
+    lines = []
+    for tag in SEVEN_TAG_ROSTER:
+        value = headers.pop(tag, defaults.get(tag, "?"))
+        lines.append(f'[{tag} "{_escape(value)}"]')
+    for tag, value in headers.items():
+        lines.append(f'[{tag} "{_escape(value)}"]')
+    lines.append("")
+
+    tokens = []
+    number = first_move
+    white = first_player == "white"
+    for index, san in enumerate(moves):
+        if white:
+            tokens.append(f"{number}.")
+        elif index == 0:
+            tokens.append(f"{number}...")
+        tokens.append(san)
+        if not white:
+            number += 1
+        white = not white
+    tokens.append(result)
+
+    # Zugtext auf höchstens 80 Zeichen pro Zeile umbrechen
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 80:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def write_game(file, headers, moves, result="*", first_player="white", first_move=1):
+    file.write(format_game(headers, moves, result, first_player, first_move))
@@ -0,0 +1,179 @@
+import argparse
+import os
+import sqlite3
+import sys
+from itertools import islice
+from map import fen_to_map, index_to_field
+from engine import GameState
+from zobrist import encode_move, decode_move
+import pgn
+
+# Stellungsindex für große Partiesammlungen: für jede Stellung (Zobrist-Schlüssel des
+# Bretts samt Zugrecht, Rochaden und schlagbarem En-passant-Feld) und jeden Folgezug zählt eine
+# SQLite-Tabelle, wie oft er gespielt wurde und wie die Partien ausgingen. Zugcode 0
+# steht für "Partie endete hier". Neue Partien werden blockweise eingefügt und zu den
+# vorhandenen Zählern addiert; für jede Quelldatei wird gespeichert, wie viele Partien
+# schon eingelesen sind, sodass ein erneuter Aufruf nur die neu angehängten liest.
+
+BATCH_GAMES = 5000
+END = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moves (
+    key INTEGER NOT NULL,
+    move INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    white INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    black INTEGER NOT NULL,
+    PRIMARY KEY (key, move)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    games INTEGER NOT NULL
+);
+"""
+
+UPSERT = """
+INSERT INTO moves (key, move, count, white, draws, black) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (key, move) DO UPDATE SET
+    count = count + excluded.count,
+    white = white + excluded.white,
+    draws = draws + excluded.draws,
+    black = black + excluded.black
+"""
+
+RESULT_COLUMNS = {"1-0": 1, "1/2-1/2": 2, "0-1": 3}  # Index in [count, white, draws, black]
+
+def _signed(key):
+    # SQLite speichert nur vorzeichenbehaftete 64-Bit-Zahlen
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+def collect_positions(games, max_plies=None, counts=None):
+    """Zählt (Schlüssel, Zugcode) -> [Anzahl, 1-0, Remis, 0-1] über die Partien
+
+    Die Züge werden wie beim Nachspielen mit GameState.make_move ausgeführt; eine
+    Partie mit unlesbarem Zug wird ab dort abgebrochen.
+    """
+    counts = {} if counts is None else counts
+    for game in games:
+        column = RESULT_COLUMNS.get(game.result)
+        state = pgn.start_state(game.headers)
+        moves = game.moves if max_plies is None else game.moves[:max_plies]
+        complete = len(moves) == len(game.moves)
+        for san in moves:
+            try:
+                move = pgn.decode_san(state, san)
+            except ValueError:
+                complete = False
+                break
+            entry = counts.setdefault((state.key, encode_move(move)), [0, 0, 0, 0])
+            entry[0] += 1
+            if column:
+                entry[column] += 1
+            state.make_move(*move)
+        # Endstellung nur bei vollständig gelesenen Partien
+        if complete:
+            entry = counts.setdefault((state.key, END), [0, 0, 0, 0])
+            entry[0] += 1
+            if column:
+                entry[column] += 1
+    return counts
+
+class PositionIndex:
+    """Stellungsindex in einer SQLite-Datei"""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def indexed_games(self, source):
+        row = self.db.execute("SELECT games FROM sources WHERE path = ?", (source,)).fetchone()
+        return row[0] if row else 0
+
+    def add_games(self, games, source=None, max_plies=None, batch_games=BATCH_GAMES, progress=None):
+        """Liest Partien blockweise ein; mit source werden bereits eingelesene übersprungen
+
+        Zähler und Fortschritt der Quelle werden in derselben Transaktion geschrieben,
+        ein Abbruch verliert also höchstens den laufenden Block.
+        """
+        done = self.indexed_games(source) if source else 0
+        games = islice(games, done, None)
+        added = 0
+        while True:
+            batch = list(islice(games, batch_games))
+            if not batch:
+                return added
+            counts = collect_positions(batch, max_plies)
+            added += len(batch)
+            with self.db:
+                self.db.executemany(UPSERT, ((_signed(key), code, *entry) for (key, code), entry in counts.items()))
+                if source:
+                    self.db.execute("INSERT OR REPLACE INTO sources (path, games) VALUES (?, ?)",
+                                    (source, done + added))
+            if progress:
+                progress(done + added)
+
+    def add_pgn(self, path, max_plies=None, batch_games=BATCH_GAMES, progress=None):
+        """Liest eine PGN-Datei ein; beim nächsten Aufruf nur die inzwischen angehängten Partien"""
+        with open(path, encoding="utf-8", errors="replace") as file:
+            return self.add_games(pgn.read_games(file), os.path.abspath(path), max_plies, batch_games, progress)
+
+    def moves(self, key):
+        """Folgezüge einer Stellung als (Zug oder None für Partieende, Anzahl, 1-0, Remis, 0-1), häufigste zuerst"""
+        rows = self.db.execute("SELECT move, count, white, draws, black FROM moves WHERE key = ? ORDER BY count DESC",
+                               (_signed(key),)).fetchall()
+        return [(decode_move(code) if code != END else None, count, white, draws, black)
+                for code, count, white, draws, black in rows]
+
+    def probe(self, state):
+        """(Häufigkeit der Stellung, Folgezüge) für einen GameState"""
+        moves = self.moves(state.key)
+        return sum(entry[1] for entry in moves), moves
+
+def _format_move(move):
+    if move is None:
+        return "(end)"
+    return f"{index_to_field(move[0])}{index_to_field(move[1])}{move[2] if len(move) == 3 else ''}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stellungsindex aus PGN-Dateien aufbauen und abfragen")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="PGN-Dateien einlesen (bereits gelesene Partien werden übersprungen)")
+    add.add_argument("index")
+    add.add_argument("pgn", nargs="+")
+    add.add_argument("--plies", type=int, default=None, help="nur die ersten so viele Halbzüge")
+    add.add_argument("--batch", type=int, default=BATCH_GAMES, help="Partien pro Transaktion")
+    probe = commands.add_parser("probe", help="Häufigkeit und Folgezüge einer Stellung")
+    probe.add_argument("index")
+    probe.add_argument("--fen", help="Stellung (Standard: Startstellung)")
+    args = parser.parse_args(argv)
+
+    index = PositionIndex(args.index)
+    try:
+        if args.command == "add":
+            for path in args.pgn:
+                added = index.add_pgn(path, args.plies, args.batch,
+                                      progress=lambda games: print(f"{path}: {games} games", file=sys.stderr))
+                print(f"{path}: {added} new games", file=sys.stderr)
+            return 0
+
+        if args.fen:
+            map, player, castling, en_passant = fen_to_map(args.fen)[:4]
+            state = GameState(map, player, castling, en_passant)
+        else:
+            state = GameState()
+        total, moves = index.probe(state)
+        print(f"{total} occurrences")
+        for move, count, white, draws, black in moves:
+            print(f"{_format_move(move):6} {count:>8}  +{white} ={draws} -{black}")
+    finally:
+        index.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+import json
+import sys
+import time
+from collections import deque
+import engine
+import figures
+
+# Zuschaltbare Messung: zählt Aufrufe der Zugprüfung und misst die Phasen der
+# GUI-Schleife. Ausgeschaltet ist nichts umgehängt, die Messung kostet dann nichts;
+# enable() ersetzt die Funktionen und Methoden durch zählende bzw. messende Hüllen,
+# disable() stellt die Originale wieder her.
+#
+# Eine Funktion wird in jedem bereits geladenen Modul ersetzt, das sie per
+# "from engine import ..." unter demselben Namen übernommen hat (perft, server, gui_chess).
+# Module, die erst nach enable() geladen werden, behalten das Original und zählen nicht.
+
+COUNTED_FUNCTIONS = ("is_valid_move", "make_move", "generate_piece_moves", "attack_map")
+COUNTED_METHODS = ("make_move", "generate_legal_moves", "is_legal_move")  # von GameState, die nutzt die GUI
+COUNTED_FIGURES = ("pawn", "knight", "bishop", "rook", "king", "queen")
+GUI_PHASES = ("handle_events", "update_timers", "draw_timers", "draw_board", "draw_highlights", "draw_pieces",
+              "draw_ui", "present")
+WINDOW = 1000          # so viele letzte Messungen je Phase für die Perzentile
+TRACE_EVENTS = 100000  # Obergrenze für den Chrome-Trace
+
+class Profiler:
+    def __init__(self, window=WINDOW):
+        self.enabled = False
+        self.window = window
+        self.counts = {}
+        self.samples = {}
+        self.trace = deque(maxlen=TRACE_EVENTS)
+        self.started = time.perf_counter()
+        self._patches = []  # (Objekt, Attribut, Original oder None für Instanzattribute)
+
+    def reset(self):
+        self.counts = {}
+        self.samples = {}
+        self.trace.clear()
+        self.started = time.perf_counter()
+
+    def enable(self, gui=None):
+        """Hängt die Zähler ein; mit gui werden zusätzlich deren Phasen gemessen"""
+        if self.enabled:
+            return
+        self.enabled = True
+        for name in COUNTED_FUNCTIONS:
+            self._count_function(engine, name, f"engine.{name}")
+        for name in COUNTED_METHODS:
+            self._count(engine.GameState, name, f"GameState.{name}")
+        for name in COUNTED_FIGURES:
+            # queen ruft rook/bishop im Modul figures auf, engine hat sie per import übernommen
+            self._count_function(figures, name, f"figures.{name}")
+        if gui is not None:
+            for name in GUI_PHASES:
+                self._patches.append((gui, name, None))
+                setattr(gui, name, self._timer(getattr(gui, name), name))
+
+    def disable(self):
+        for owner, name, original in reversed(self._patches):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patches = []
+        self.enabled = False
+
+    def _counter(self, function, name):
+        counts = self.counts
+
+        def wrapper(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return function(*args, **kwargs)
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def _count(self, owner, attribute, name):
+        original = getattr(owner, attribute)
+        self._patches.append((owner, attribute, original))
+        setattr(owner, attribute, self._counter(original, name))
+
+    def _count_function(self, module, attribute, name):
+        # Auch in allen Modulen ersetzen, die die Funktion unter ihrem Namen importiert haben
+        original = getattr(module, attribute)
+        wrapper = self._counter(original, name)
+        for owner in list(sys.modules.values()):
+            if getattr(owner, attribute, None) is original:
+                self._patches.append((owner, attribute, original))
+                setattr(owner, attribute, wrapper)
+
+    def _timer(self, function, name):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, start, time.perf_counter())
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def record(self, name, start, end):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(end - start)
+        self.trace.append((name, start, end))
+
+    def percentiles(self, name):
+        """p50/p95/p99/max in Millisekunden über die letzten WINDOW Messungen"""
+        samples = sorted(self.samples.get(name, ()))
+        if not samples:
+            return None
+        def at(fraction):
+            return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 3)
+        return {"count": len(samples), "p50": at(0.5), "p95": at(0.95), "p99": at(0.99), "max": at(1.0)}
+
+    def report(self):
+        return {
+            "seconds": round(time.perf_counter() - self.started, 3),
+            "calls": dict(sorted(self.counts.items())),
+            "phases": {name: self.percentiles(name) for name in self.samples},
+        }
+
+    def dump_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def dump_chrome_trace(self, path):
+        """Trace im Chrome-Format (chrome://tracing, Perfetto), Zeiten in Mikrosekunden"""
+        events = [{"name": name, "ph": "X", "pid": 0, "tid": 0,
+                   "ts": round((start - self.started) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+                  for name, start, end in self.trace]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def overlay_lines(self):
+        """Textzeilen für die Bildschirmanzeige"""
+        lines = []
+        for name in GUI_PHASES:
+            stats = self.percentiles(name)
+            if stats:
+                lines.append(f"{name:16} p50 {stats['p50']:7.2f}  p99 {stats['p99']:7.2f} ms")
+        for name, count in sorted(self.counts.items()):
+            lines.append(f"{name:24} {count:>10}")
+        return lines
+
+# Gemeinsame Instanz für die GUI und Skripte
+profiler = Profiler()
@@ -0,0 +1,173 @@
+import bisect
+import os
+from map import fen_to_map
+from engine import GameState
+from zobrist import encode_move, decode_move
+
+# Binäres Partieprotokoll zum Sichern und Wiederherstellen. Die Datei wird nur
+# angehängt: nach dem Kopf folgt pro Zug ein Eintrag, alle K Züge zusätzlich ein
+# Schnappschuss der Stellung. Alle Zahlen sind Varints (7 Bit pro Byte, niedrigste
+# Bits zuerst, gesetztes Hochbit = es folgt ein weiteres Byte).
+#
+#   Kopf:          "CGR1", Startzeit Weiß (ms), Startzeit Schwarz (ms), K, Länge + FEN
+#                  der Ausgangsstellung (Länge 0 = Grundstellung)
+#   Zug:           Zugcode * 2 (zobrist.encode_move), Restzeit des Ziehenden (ms)
+#   Schnappschuss: 1, Halbzug, Restzeit Weiß (ms), Restzeit Schwarz (ms), Länge + FEN
+#
+# Ein abgeschnittener letzter Eintrag (Absturz beim Schreiben) wird beim Lesen ignoriert.
+
+MAGIC = b"CGR1"
+SNAPSHOT = 1
+SNAPSHOT_INTERVAL = 16
+
+def encode_varint(value):
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+def decode_varint(data, offset):
+    """Liefert (Wert, neuer Offset); IndexError bei abgeschnittenen Daten"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def _encode_text(text):
+    raw = text.encode("ascii")
+    return encode_varint(len(raw)) + raw
+
+def _decode_text(data, offset):
+    length, offset = decode_varint(data, offset)
+    if offset + length > len(data):
+        raise IndexError("truncated record")
+    return data[offset:offset + length].decode("ascii"), offset + length
+
+def _state_from_fen(fen):
+    if not fen:
+        return GameState()
+    map, player, castling, en_passant = fen_to_map(fen)[:4]
+    return GameState(map, player, castling, en_passant)
+
+class RecordWriter:
+    """Hängt Züge an eine Protokolldatei an; jeder Zug ist sofort auf der Platte"""
+
+    def __init__(self, path, white_ms, black_ms, fen="", snapshot_interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.plies = 0
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + encode_varint(white_ms) + encode_varint(black_ms) +
+                        encode_varint(snapshot_interval) + _encode_text(fen))
+        self.file.flush()
+
+    @classmethod
+    def append_to(cls, path):
+        """Schreibt ein bestehendes Protokoll fort (nach dem Wiederherstellen)"""
+        record = GameRecord(path)
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer.snapshot_interval = record.snapshot_interval
+        writer.plies = len(record)
+        writer.file = open(path, "r+b")
+        writer.file.truncate(record.end)  # abgeschnittenen Rest verwerfen
+        writer.file.seek(record.end)
+        return writer
+
+    def add_move(self, move, remaining_ms, state=None, white_ms=None, black_ms=None):
+        """Schreibt einen Zug; mit state (nach dem Zug) und beiden Uhren alle K Züge einen Schnappschuss"""
+        data = encode_varint(encode_move(move) << 1) + encode_varint(max(0, remaining_ms))
+        self.plies += 1
+        if state is not None and self.plies % self.snapshot_interval == 0:
+            data += (encode_varint(SNAPSHOT) + encode_varint(self.plies) + encode_varint(max(0, white_ms)) +
+                     encode_varint(max(0, black_ms)) + _encode_text(state.to_fen()))
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class GameRecord:
+    """Liest ein Protokoll; state_at(n) spielt höchstens K Züge nach"""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            data = file.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path}: not a game record")
+        offset = 4
+        self.white_ms, offset = decode_varint(data, offset)
+        self.black_ms, offset = decode_varint(data, offset)
+        self.snapshot_interval, offset = decode_varint(data, offset)
+        self.fen, offset = _decode_text(data, offset)
+        self.moves = []      # (Zug, Restzeit des Ziehenden in ms)
+        self.snapshots = []  # (Halbzug, FEN, Restzeit Weiß, Restzeit Schwarz)
+        self.end = offset    # Ende des letzten vollständigen Eintrags
+
+        # Nur Varints lesen, keine Züge ausführen
+        while offset < len(data):
+            try:
+                value, offset = decode_varint(data, offset)
+                if value == SNAPSHOT:
+                    ply, offset = decode_varint(data, offset)
+                    white_ms, offset = decode_varint(data, offset)
+                    black_ms, offset = decode_varint(data, offset)
+                    fen, offset = _decode_text(data, offset)
+                    self.snapshots.append((ply, fen, white_ms, black_ms))
+                else:
+                    remaining, offset = decode_varint(data, offset)
+                    self.moves.append((decode_move(value >> 1), remaining))
+            except IndexError:
+                break
+            self.end = offset
+        self.snapshot_plies = [snapshot[0] for snapshot in self.snapshots]
+
+    def __len__(self):
+        return len(self.moves)
+
+    def start_player(self):
+        return fen_to_map(self.fen)[1] if self.fen else "white"
+
+    def clocks_at(self, ply):
+        """Restzeiten (Weiß, Schwarz) in ms nach ply Halbzügen"""
+        clocks = {"white": self.white_ms, "black": self.black_ms}
+        player = self.start_player()
+        # Der Ziehende wechselt jeden Halbzug; die letzten beiden Züge genügen
+        for index in range(max(0, ply - 2), ply):
+            mover = player if index % 2 == 0 else ("black" if player == "white" else "white")
+            clocks[mover] = self.moves[index][1]
+        return clocks["white"], clocks["black"]
+
+    def state_at(self, ply):
+        """Stellung nach ply Halbzügen, ab dem letzten Schnappschuss davor
+
+        Die Zugliste der Stellung (state.history) beginnt dann beim Schnappschuss;
+        für eine vollständige Partie full_state() verwenden.
+        """
+        ply = max(0, min(ply, len(self.moves)))
+        position = bisect.bisect_right(self.snapshot_plies, ply) - 1
+        if position >= 0:
+            start, fen = self.snapshots[position][:2]
+            state = _state_from_fen(fen)
+        else:
+            start, state = 0, _state_from_fen(self.fen)
+        for move, _ in self.moves[start:ply]:
+            state.make_move(*move)
+        return state
+
+    def full_state(self):
+        """Stellung nach allen Zügen, mit vollständiger Zugliste ab der Ausgangsstellung"""
+        state = _state_from_fen(self.fen)
+        for move, _ in self.moves:
+            state.make_move(*move)
+        return state
+
+def exists(path):
+    return os.path.exists(path) and os.path.getsize(path) >= len(MAGIC)
@@ -0,0 +1,278 @@
+import time
+from collections import namedtuple
+from zobrist import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from tablebase import MAX_PIECES, WIN, LOSS
+
+# Rang für MVV-LVA (most valuable victim, least valuable attacker)
+MVV_LVA_RANK = {"p": 1, "n": 2, "b": 3, "r": 4, "q": 5, "k": 6}
+
+MATE = 100000
+MAX_PLY = 64
+# Ab hier gilt ein Wert als Matt: aus der Suche (höchstens MAX_PLY Halbzüge) oder aus
+# den Endspieldatenbanken, deren Distanz zum Matt bis 255 Halbzüge ab der Stellung reicht
+MATE_BOUND = MATE - MAX_PLY - 256
+CHECK_INTERVAL = 1024  # alle so viele Knoten die Uhr prüfen
+
+SearchResult = namedtuple("SearchResult", ("move", "score", "depth", "nodes", "elapsed", "nps", "pv"))
+
+class SearchAborted(Exception):
+    pass
+
+def evaluate(state):
+    """Bewertung aus Sicht des Spielers am Zug, inkrementell in GameState.make_move gepflegt"""
+    return state.score if state.player == "white" else -state.score
+
+def time_for_move(remaining, moves_to_go=30):
+    """Zeitbudget für einen Zug aus der Restzeit der Uhr (Sekunden)"""
+    if remaining <= 0:
+        return 0.05
+    # Etwas Reserve für Zeichnen und Ereignisse lassen
+    return max(0.05, min(remaining / moves_to_go, remaining * 0.5 - 0.1))
+
+def _to_tt(score, ply):
+    # Mattwerte werden relativ zur Stellung statt zur Wurzel gespeichert
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def _from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+class Searcher:
+    """Negamax mit Alpha-Beta, iterativer Vertiefung und Ruhesuche auf einem engine.GameState"""
+
+    def __init__(self, tt=None, tt_size_mb=16, book=None, tablebases=None):
+        self.tt = tt if tt is not None else TranspositionTable(tt_size_mb)
+        self.book = book  # book.OpeningBook, wird vor jeder Suche befragt
+        self.tablebases = tablebases  # tablebase.Tablebases für Stellungen mit wenigen Steinen
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {}
+        self.nodes = 0
+        self.node_limit = None
+        self.deadline = None
+        self.should_stop = None
+
+    def search(self, state, max_depth=MAX_PLY, node_limit=None, deadline=None, on_iteration=None, should_stop=None):
+        """Sucht den besten Zug für den Spieler am Zug
+
+        deadline ist ein Zeitpunkt auf time.monotonic(); die Suche bricht spätestens dort,
+        nach node_limit Knoten oder sobald should_stop() wahr liefert ab und gibt das
+        Ergebnis der letzten vollständigen Iteration zurück.
+        """
+        self.nodes = 0
+        self.node_limit = node_limit
+        self.deadline = deadline
+        self.should_stop = should_stop
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        started = time.perf_counter()
+        root_length = len(state.history)
+        result = None
+
+        if self.book is not None:
+            move = self.book.choose(state)
+            if move is not None:
+                result = SearchResult(move, 0, 0, 0, time.perf_counter() - started, 0, [move])
+                if on_iteration:
+                    on_iteration(result)
+                return result
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score, move = self._root(state, depth)
+            except SearchAborted:
+                # Alle noch ausgeführten Züge zurücknehmen
+                while len(state.history) > root_length:
+                    state.unmake_move()
+                break
+            elapsed = time.perf_counter() - started
+            nps = int(self.nodes / elapsed) if elapsed > 0 else 0
+            result = SearchResult(move, score, depth, self.nodes, elapsed, nps, self.principal_variation(state, depth))
+            if on_iteration:
+                on_iteration(result)
+            if move is None or abs(score) >= MATE_BOUND:
+                break
+
+        if result is None:
+            # Nicht einmal Tiefe 1 geschafft: wenigstens irgendeinen Zug liefern
+            moves = self.order_moves(state, state.generate_legal_moves(), 0, None)
+            elapsed = time.perf_counter() - started
+            nps = int(self.nodes / elapsed) if elapsed > 0 else 0
+            move = moves[0] if moves else None
+            result = SearchResult(move, 0, 0, self.nodes, elapsed, nps, [move] if move else [])
+        return result
+
+    def principal_variation(self, state, depth):
+        pv = []
+        made = 0
+        for _ in range(depth):
+            entry = self.tt.probe(state.key)
+            if entry is None or entry[3] is None or entry[3] not in state.generate_legal_moves():
+                break
+            pv.append(entry[3])
+            state.make_move(*entry[3])
+            made += 1
+        for _ in range(made):
+            state.unmake_move()
+        return pv
+
+    def order_moves(self, state, moves, ply, tt_move):
+        board = state.board
+        killers = self.killers[ply]
+        history = self.history
+
+        def priority(move):
+            if move == tt_move:
+                return 1000000
+            start, goal = move[0], move[1]
+            captured = board[goal[0]][goal[1]]
+            if captured != ".":
+                return 100000 + 10 * MVV_LVA_RANK[captured.lower()] - MVV_LVA_RANK[board[start[0]][start[1]].lower()]
+            if len(move) == 3:
+                return 95000 + MVV_LVA_RANK[move[2]]  # Umwandlung, Dame zuerst
+            if move == killers[0] or move == killers[1]:
+                return 90000
+            return history.get(move, 0)
+
+        moves.sort(key=priority, reverse=True)
+        return moves
+
+    def _tick(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchAborted()
+        if self.nodes % CHECK_INTERVAL == 0:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise SearchAborted()
+            if self.should_stop is not None and self.should_stop():
+                raise SearchAborted()
+
+    def _root(self, state, depth):
+        entry = self.tt.probe(state.key)
+        tt_move = entry[3] if entry else None
+        moves = self.order_moves(state, state.generate_legal_moves(), 0, tt_move)
+        if not moves:
+            return (-MATE if state.is_in_check() else 0), None
+
+        alpha, beta = -MATE - 1, MATE + 1
+        best_move = moves[0]
+        for move in moves:
+            state.make_move(*move)
+            score = -self._negamax(state, depth - 1, -beta, -alpha, 1)
+            state.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.tt.store(state.key, depth, _to_tt(alpha, 0), EXACT, best_move)
+        return alpha, best_move
+
+    def _negamax(self, state, depth, alpha, beta, ply):
+        self._tick()
+
+        if state.repetitions() > 1:
+            return 0
+        if self.tablebases is not None and len(state.pieces["white"]) + len(state.pieces["black"]) <= MAX_PIECES:
+            result = self.tablebases.probe(state)
+            if result is not None:
+                # Exakter Wert: Distanz zum Matt in Halbzügen ab dieser Stellung
+                value, distance = result
+                if value == WIN:
+                    return MATE - ply - distance
+                if value == LOSS:
+                    return -MATE + ply + distance
+                return 0
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(state, alpha, beta, ply)
+
+        original_alpha = alpha
+        entry = self.tt.probe(state.key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, entry_score, flag, tt_move = entry
+            if entry_depth >= depth:
+                entry_score = _from_tt(entry_score, ply)
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if flag == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        moves = self.order_moves(state, state.generate_legal_moves(), ply, tt_move)
+        if not moves:
+            # Matt oder Patt
+            return -MATE + ply if state.is_in_check() else 0
+
+        board = state.board
+        best_score = -MATE - 1
+        best_move = None
+        for move in moves:
+            state.make_move(*move)
+            score = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            state.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                # Ruhige Züge, die einen Schnitt erzeugen, merken (Killer- und History-Heuristik)
+                goal = move[1]
+                if board[goal[0]][goal[1]] == ".":
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    self.history[move] = self.history.get(move, 0) + depth * depth
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.tt.store(state.key, depth, _to_tt(best_score, ply), flag, best_move)
+        return best_score
+
+    def _quiescence(self, state, alpha, beta, ply):
+        self._tick()
+        moves = state.generate_legal_moves()
+        if state.is_in_check():
+            # Im Schach gibt es kein "stehen bleiben": alle Abwehrzüge durchsuchen
+            if not moves:
+                return -MATE + ply
+            stand_pat = -MATE + ply
+        else:
+            stand_pat = evaluate(state)
+            if stand_pat >= beta or ply >= MAX_PLY:
+                return stand_pat
+            board = state.board
+            moves = [move for move in moves if board[move[1][0]][move[1][1]] != "." or len(move) == 3]
+        if ply >= MAX_PLY:
+            return evaluate(state)
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        for move in self.order_moves(state, moves, ply, None):
+            state.make_move(*move)
+            score = -self._quiescence(state, -beta, -alpha, ply + 1)
+            state.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+def search(state, max_depth=MAX_PLY, node_limit=None, deadline=None, time_limit=None, tt=None, on_iteration=None,
+           should_stop=None, tablebases=None):
+    """Bequemer Einstieg: einmalige Suche mit neuer Heuristik-Tabelle"""
+    if time_limit is not None:
+        deadline = time.monotonic() + time_limit
+    return Searcher(tt, tablebases=tablebases).search(state, max_depth, node_limit, deadline, on_iteration, should_stop)
@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import math
+import time
+from map import create_map, field_to_index, map_to_fen
+from engine import GameState
+
+# Kopfloser Spielserver: viele Partien gleichzeitig in einem Prozess, ein Zeilenprotokoll
+# über TCP. Jede Anfrage ist eine Zeile, jede Antwort ebenfalls:
+#
+#   NEW [sekunden]          -> OK <partie>
+#   MOVE <partie> <e2e4>    -> OK <partie> <status> <weiß_ms> <schwarz_ms>  (Umwandlung: e7e8q)
+#   STATE <partie>          -> OK <partie> <status> <weiß_ms> <schwarz_ms> <fen>
+#   RESIGN <partie>         -> OK <partie> <status>
+#   CLOSE <partie>          -> OK <partie>
+#   QUIT                    -> Verbindung wird geschlossen
+#
+# Fehler werden mit "ERR <grund>" beantwortet. status ist "white"/"black" (am Zug) oder
+# das Ergebnis: "1-0", "0-1", "1/2-1/2".
+
+DEFAULT_TIME = 600.0
+
+class Game:
+    """Eine Partie: Stellung, Uhren und Zeitpunkt, seit dem der Spieler am Zug nachdenkt
+
+    Die Uhren laufen auf time.monotonic() und werden nur beim Zug belastet, nicht
+    laufend heruntergezählt; die Restzeit des Spielers am Zug wird bei Bedarf berechnet.
+    Vom GameState bleiben nur Brett, Figurenlisten, Rechte und die Schlüssel seit dem
+    letzten unumkehrbaren Zug; die Zugliste wird nicht mitgeführt.
+    """
+
+    __slots__ = ("state", "white_time", "black_time", "turn_started", "result", "plies")
+
+    def __init__(self, seconds=DEFAULT_TIME):
+        self.state = GameState(create_map())
+        self.white_time = seconds
+        self.black_time = seconds
+        self.turn_started = time.monotonic()
+        self.result = None  # "1-0", "0-1" oder "1/2-1/2"
+        self.plies = 0
+
+    def clocks(self, now=None):
+        """Restzeiten (weiß, schwarz) in Sekunden zum Zeitpunkt now"""
+        if self.result is not None:
+            return self.white_time, self.black_time
+        elapsed = (now if now is not None else time.monotonic()) - self.turn_started
+        if self.state.player == "white":
+            return max(0.0, self.white_time - elapsed), self.black_time
+        return self.white_time, max(0.0, self.black_time - elapsed)
+
+    def check_flag(self, now=None):
+        """Beendet die Partie, wenn die Zeit des Spielers am Zug abgelaufen ist"""
+        if self.result is None:
+            white_time, black_time = self.clocks(now)
+            if white_time <= 0 or black_time <= 0:
+                self.white_time, self.black_time = white_time, black_time
+                self.result = "0-1" if white_time <= 0 else "1-0"
+        return self.result
+
+    def fen(self):
+        state = self.state
+        return map_to_fen(state.board, state.player, state.castling, state.en_passant, fullmove=self.plies // 2 + 1)
+
+    def status(self):
+        return self.result or self.state.player
+
+    def move(self, start, goal, promotion=None):
+        """Prüft und führt einen Zug aus; liefert eine Fehlermeldung oder None"""
+        now = time.monotonic()
+        if self.check_flag(now):
+            return "game is over"
+        if not self.state.is_legal_move(start, goal, promotion):
+            return "illegal move"
+        if promotion and not (self.state.board[start[0]][start[1]] in "Pp" and goal[0] in (0, 7)):
+            return "not a promotion"
+        # Die Bedenkzeit wird dem Spieler am Zug einmalig abgezogen
+        elapsed = now - self.turn_started
+        if self.state.player == "white":
+            self.white_time -= elapsed
+        else:
+            self.black_time -= elapsed
+        self.turn_started = now
+        undo = self.state.make_move(start, goal, promotion)
+        self.plies += 1
+        # Züge werden nie zurückgenommen: die Rücknahme-Datensätze braucht niemand. Vor einem
+        # Schlag, Bauernzug oder Verlust eines Rochaderechts kann sich keine Stellung wiederholen,
+        # dann genügt für die Wiederholungen die aktuelle.
+        self.state.history.clear()
+        if undo.captured != "." or undo.figure in "Pp" or undo.castling != self.state.castling:
+            self.state.key_counts = {self.state.key: 1}
+
+        status = self.state.game_status()
+        if status == "checkmate":
+            self.result = "0-1" if self.state.player == "white" else "1-0"
+        elif status in ("stalemate", "repetition"):
+            self.result = "1/2-1/2"
+        return None
+
+class GameServer:
+    """Hält alle Partien im Speicher und beantwortet Protokollzeilen"""
+
+    def __init__(self, max_games=100000):
+        self.games = {}
+        self.next_id = 0
+        self.max_games = max_games
+
+    def handle_line(self, line):
+        """Verarbeitet eine Anfragezeile und liefert die Antwortzeile (ohne Zeilenende)"""
+        parts = line.split()
+        if not parts:
+            return "ERR empty request"
+        command = parts[0].upper()
+        try:
+            if command == "NEW":
+                return self.new_game(float(parts[1]) if len(parts) > 1 else DEFAULT_TIME)
+            if len(parts) < 2:
+                return f"ERR {command} needs a game id"
+            game_id = int(parts[1])
+            game = self.games.get(game_id)
+            if game is None:
+                return f"ERR unknown game {game_id}"
+            if command == "MOVE":
+                if len(parts) != 3 or len(parts[2]) not in (4, 5):
+                    return "ERR expected MOVE <game> <move>"
+                text = parts[2].lower()
+                start, goal = field_to_index(text[:2]), field_to_index(text[2:4])
+                if not all(0 <= value < 8 for value in start + goal):
+                    return "ERR bad square"
+                promotion = text[4:] or None
+                if promotion and promotion not in "qrbn":
+                    return "ERR bad promotion piece"
+                error = game.move(start, goal, promotion)
+                if error:
+                    return f"ERR {error}"
+                return self.report(game_id, game)
+            if command == "STATE":
+                game.check_flag()
+                return f"{self.report(game_id, game)} {game.fen()}"
+            if command == "RESIGN":
+                if game.check_flag() is None:
+                    game.white_time, game.black_time = game.clocks()
+                    game.result = "0-1" if game.state.player == "white" else "1-0"
+                return f"OK {game_id} {game.status()}"
+            if command == "CLOSE":
+                del self.games[game_id]
+                return f"OK {game_id}"
+        except (ValueError, IndexError):
+            return "ERR bad request"
+        return f"ERR unknown command {command}"
+
+    def new_game(self, seconds):
+        if len(self.games) >= self.max_games:
+            return "ERR too many games"
+        if not math.isfinite(seconds) or seconds <= 0:
+            return "ERR time must be positive"
+        self.next_id += 1
+        self.games[self.next_id] = Game(seconds)
+        return f"OK {self.next_id}"
+
+    def report(self, game_id, game):
+        white_time, black_time = game.clocks()
+        return f"OK {game_id} {game.status()} {int(white_time * 1000)} {int(black_time * 1000)}"
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                text = line.decode("ascii", "replace").strip()
+                if text.upper() == "QUIT":
+                    break
+                writer.write((self.handle_line(text) + "\n").encode("ascii"))
+                # Nur warten, wenn der Sendepuffer voll ist; sonst sofort die nächste Zeile lesen
+                if writer.transport.get_write_buffer_size() > 65536:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kopfloser Schachserver für viele gleichzeitige Partien")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-games", type=int, default=100000)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(GameServer(args.max_games).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,277 @@
+import argparse
+import multiprocessing
+import sys
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from map import fen_to_map, index_to_field
+from engine import GameState
+from search import Searcher, MAX_PLY
+from tablebase import Tablebases
+from zobrist import ENTRY_BYTES, SCORE_OFFSET, encode_move, decode_move
+
+# Parallele Suche nach dem Lazy-SMP-Verfahren: N Prozesse durchsuchen dieselbe Stellung
+# und teilen sich nur die Transpositionstabelle. Die Helfer finden dadurch Einträge
+# füreinander, und der Hauptprozess erreicht schneller größere Tiefen. Damit sie nicht
+# alle denselben Baum in derselben Reihenfolge ablaufen, sucht jeder zweite Helfer eine
+# Tiefe weiter, und die Wurzelzüge hinter dem Tabellenzug sind je Helfer verschoben.
+#
+# Die Helfer werden beim ersten Aufruf gestartet und bleiben bis close() bestehen; pro
+# Suche bekommen sie die Stellung über eine eigene Pipe und antworten dort mit ihrer
+# Statistik. Ein abgestürzter Helfer schließt damit nur seine Pipe und wird ersetzt.
+#
+# Die Tabelle liegt in multiprocessing.shared_memory und wird ohne Sperre beschrieben.
+# Jeder Eintrag besteht aus zwei 64-Bit-Worten: Schlüssel XOR Daten und Daten. Wird
+# ein Eintrag gelesen, während ein anderer Prozess ihn schreibt, passt das XOR nicht
+# zum gesuchten Schlüssel und der Eintrag gilt als nicht vorhanden.
+
+class SharedTranspositionTable:
+    """Transpositionstabelle im gemeinsamen Speicher, Schnittstelle wie zobrist.TranspositionTable"""
+
+    def __init__(self, size_mb=16, name=None):
+        self.size_mb = size_mb
+        if name is None:
+            entries = max(2, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+            self.buckets = entries // 2
+            self.memory = shared_memory.SharedMemory(create=True, size=self.buckets * 2 * ENTRY_BYTES)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.buckets = self.memory.size // (2 * ENTRY_BYTES)
+            self.owner = False
+        self.name = self.memory.name
+        # Die Größe des Segments kann auf eine Seitengröße aufgerundet sein
+        self.words = self.memory.buf[:self.buckets * 2 * ENTRY_BYTES].cast("Q")
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.memory.buf[:len(self.words) * 8] = bytes(len(self.words) * 8)
+        self.probes = 0
+        self.hits = 0
+
+    def memory_bytes(self):
+        return len(self.words) * 8
+
+    def store(self, key, depth, score, flag, move=None):
+        words = self.words
+        index = (key % self.buckets) * 4
+        depth = max(0, min(depth, 255))
+        packed = ((score + SCORE_OFFSET) & 0xFFFFFFFF) | depth << 32 | flag << 40 | encode_move(move) << 42
+
+        # Wie TranspositionTable: erster Eintrag tiefenbevorzugt, zweiter immer ersetzen
+        data = words[index + 1]
+        if not data or words[index] ^ data == key or depth >= (data >> 32) & 0xFF:
+            words[index] = key ^ packed
+            words[index + 1] = packed
+            return
+        words[index + 2] = key ^ packed
+        words[index + 3] = packed
+
+    def probe(self, key):
+        """Liefert (depth, score, flag, move) oder None"""
+        self.probes += 1
+        words = self.words
+        index = (key % self.buckets) * 4
+        for offset in (index, index + 2):
+            data = words[offset + 1]
+            if data and words[offset] ^ data == key:
+                self.hits += 1
+                score = (data & 0xFFFFFFFF) - SCORE_OFFSET
+                return (data >> 32) & 0xFF, score, (data >> 40) & 3, decode_move(data >> 42)
+        return None
+
+    def hashfull(self):
+        """Anteil belegter Einträge in Promille, aus den ersten 1000 Einträgen geschätzt"""
+        sample = min(1000, len(self.words) // 2)
+        return sum(1 for i in range(sample) if self.words[2 * i + 1]) * 1000 // sample
+
+    def close(self):
+        self.words.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+class HelperSearcher(Searcher):
+    """Searcher mit versetzter Tiefe und Wurzelreihenfolge für Helfer index > 0"""
+
+    def __init__(self, index, tt, tablebases=None):
+        super().__init__(tt, tablebases=tablebases)
+        self.index = index
+        self.depth_offset = index % 2
+
+    def _root(self, state, depth):
+        return super()._root(state, depth + self.depth_offset)
+
+    def order_moves(self, state, moves, ply, tt_move):
+        moves = super().order_moves(state, moves, ply, tt_move)
+        if ply == 0 and len(moves) > 2:
+            # Den besten Zug vorne lassen, die übrigen je Helfer verschieben
+            shift = self.index % (len(moves) - 1)
+            moves[1:] = moves[1 + shift:] + moves[1:1 + shift]
+        return moves
+
+def _worker_stats(index, searcher, result):
+    tt = searcher.tt
+    return {"worker": index, "nodes": searcher.nodes, "depth": result.depth if result else 0,
+            "probes": tt.probes, "hits": tt.hits, "hit_rate": round(tt.hits / tt.probes, 3) if tt.probes else 0.0}
+
+HELPER_TIMEOUT = 5.0  # s, so lange wird nach dem Stopp auf die Helfer gewartet
+
+def _helper_main(index, table_name, tablebase_dir, stop, connection):
+    table = SharedTranspositionTable(name=table_name)
+    tablebases = Tablebases(tablebase_dir) if tablebase_dir else None
+    try:
+        # Ein Auftrag pro Suche, None beendet den Helfer
+        for search_id, board, player, castling, en_passant, key_counts in iter(connection.recv, None):
+            table.probes = table.hits = 0
+            searcher = HelperSearcher(index, table, tablebases)
+            state = GameState(board, player, castling, en_passant)
+            state.key_counts = key_counts  # Wiederholungen wie im Hauptprozess erkennen
+            result = searcher.search(state, MAX_PLY, should_stop=lambda: stop.value)
+            if result.depth:
+                result = result._replace(depth=result.depth + searcher.depth_offset)
+            connection.send((search_id, _worker_stats(index, searcher, result)))
+    except EOFError:
+        pass  # Hauptprozess beendet
+    finally:
+        table.close()
+
+class ParallelSearcher:
+    """Lazy SMP über workers Prozesse; die Tabelle bleibt zwischen den Suchen erhalten"""
+
+    def __init__(self, workers=None, tt_size_mb=64, tablebase_dir=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.tt = SharedTranspositionTable(tt_size_mb)
+        self.tablebase_dir = tablebase_dir
+        self.tablebases = Tablebases(tablebase_dir) if tablebase_dir else None
+        self.stats = []  # Knoten und Tabellentreffer je Prozess der letzten Suche
+        self.stop = multiprocessing.Value("b", 0, lock=False)
+        self.helpers = {}  # Index -> (Prozess, Pipe)
+        self.search_id = 0
+
+    def _start_helpers(self):
+        """Startet fehlende Helfer (beim ersten Aufruf oder nach einem Absturz)"""
+        for index in range(1, self.workers):
+            if index in self.helpers:
+                process, connection = self.helpers[index]
+                if process.is_alive():
+                    continue
+                connection.close()
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_helper_main, daemon=True,
+                                              args=(index, self.tt.name, self.tablebase_dir, self.stop, child))
+            process.start()
+            child.close()  # sonst merkt der Hauptprozess das Ende des Helfers nicht
+            self.helpers[index] = (process, connection)
+
+    def _collect(self, search_id, pending):
+        """Statistik der Helfer dieser Suche; abgestürzte oder hängende Helfer fehlen darin"""
+        stats = []
+        deadline = time.monotonic() + HELPER_TIMEOUT
+        while pending:
+            ready = wait(list(pending), max(0, deadline - time.monotonic()))
+            if not ready:
+                # Hängt ein Helfer noch in der Suche, wird er bei der nächsten ersetzt
+                for index in pending.values():
+                    self.helpers[index][0].terminate()
+                break
+            for connection in ready:
+                index = pending.pop(connection)
+                try:
+                    answer_id, worker_stats = connection.recv()
+                except (EOFError, OSError):
+                    continue  # abgestürzt
+                if answer_id == search_id:
+                    stats.append(worker_stats)
+                else:
+                    pending[connection] = index  # Antwort einer abgebrochenen früheren Suche
+        return stats
+
+    def search(self, state, max_depth=MAX_PLY, node_limit=None, deadline=None, on_iteration=None):
+        """Wie Searcher.search; Knoten und nps im Ergebnis sind über alle Prozesse summiert
+
+        Der Hauptprozess sucht selbst mit und bestimmt Zug, Tiefe und Abbruch; die Helfer
+        laufen, bis er fertig ist.
+        """
+        self._start_helpers()
+        self.search_id += 1
+        self.stop.value = 0
+        board = [row[:] for row in state.board]
+        pending = {}
+        for index, (process, connection) in self.helpers.items():
+            try:
+                connection.send((self.search_id, board, state.player, state.castling, state.en_passant,
+                                 state.key_counts))
+                pending[connection] = index
+            except OSError:
+                pass  # gerade abgestürzt, wird bei der nächsten Suche ersetzt
+
+        self.tt.probes = self.tt.hits = 0
+        searcher = Searcher(self.tt, tablebases=self.tablebases)
+        started = time.perf_counter()
+        try:
+            result = searcher.search(state, max_depth, node_limit, deadline, on_iteration)
+        finally:
+            self.stop.value = 1
+            helper_stats = self._collect(self.search_id, pending)
+        self.stats = [_worker_stats(0, searcher, result)] + helper_stats
+        self.stats.sort(key=lambda stats: stats["worker"])
+
+        elapsed = time.perf_counter() - started
+        nodes = sum(stats["nodes"] for stats in self.stats)
+        return result._replace(nodes=nodes, elapsed=elapsed, nps=int(nodes / elapsed) if elapsed > 0 else 0)
+
+    def close(self):
+        for process, connection in self.helpers.values():
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for process, connection in self.helpers.values():
+            process.join(HELPER_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        self.helpers = {}
+        self.tt.close()
+
+def _format_move(move):
+    if move is None:
+        return "-"
+    return f"{index_to_field(move[0])}{index_to_field(move[1])}{move[2] if len(move) == 3 else ''}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallele Suche (Lazy SMP) für eine Stellung")
+    parser.add_argument("--fen", help="Stellung (Standard: Startstellung)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Prozesse (Standard: alle Kerne)")
+    parser.add_argument("-t", "--time", type=float, default=10.0, help="Bedenkzeit in Sekunden")
+    parser.add_argument("-d", "--depth", type=int, default=MAX_PLY)
+    parser.add_argument("--hash", type=int, default=64, help="Größe der Tabelle in MB")
+    parser.add_argument("--tablebases", help="Verzeichnis mit Endspieldatenbanken")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        map, player, castling, en_passant = fen_to_map(args.fen)[:4]
+        state = GameState(map, player, castling, en_passant)
+    else:
+        state = GameState()
+
+    def report(result):
+        print(f"depth {result.depth} score {result.score} nodes {result.nodes} "
+              f"pv {' '.join(_format_move(move) for move in result.pv)}", file=sys.stderr)
+
+    searcher = ParallelSearcher(args.workers, args.hash, args.tablebases)
+    try:
+        result = searcher.search(state, args.depth, deadline=time.monotonic() + args.time, on_iteration=report)
+        print(f"bestmove {_format_move(result.move)} depth {result.depth} score {result.score} "
+              f"nodes {result.nodes} nps {result.nps}")
+        for stats in searcher.stats:
+            print(f"worker {stats['worker']:>2}: {stats['nodes']:>10} nodes, depth {stats['depth']:>2}, "
+                  f"tt hits {stats['hits']}/{stats['probes']} ({stats['hit_rate']:.1%})")
+    finally:
+        searcher.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,525 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from map import fen_to_map
+from engine import GameState, KNIGHT_TARGETS, KING_TARGETS, ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS
+
+# Endspieldatenbanken für bis zu vier Steine, erzeugt durch Retroanalyse. Eine Datei
+# pro Materialverteilung ("KQvK", "KRvKP", ...): Kopf, dann Gewinn/Remis/Verlust mit
+# 2 Bit pro Stellung, dann die Distanz zum Matt in Halbzügen mit 1 Byte pro Stellung.
+# Beides gilt aus Sicht des Spielers am Zug. Rochade und en passant gibt es in diesen
+# Stellungen nicht.
+#
+# Index: Königspaar unter Ausnutzung der Brettsymmetrie (ohne Bauern 8-fach, mit
+# Bauern nur Spiegelung an der d/e-Linie), dann je weitere Figur 64 Felder (Bauern 48),
+# zuletzt die Seite am Zug. Felder sind row * 8 + col wie in create_map.
+
+MAX_PIECES = 4
+ORDER = "QRBNP"  # Reihenfolge der Nebenfiguren im Namen und im Index
+UNKNOWN, LOSS, DRAW, WIN = 0, 1, 2, 3
+MAGIC = b"CTB1"
+HEADER = struct.Struct(">4s16sI")  # Kennung, Name, Anzahl Stellungen
+
+def _squares(table):
+    return tuple(tuple(r * 8 + c for r, c in table[(square >> 3, square & 7)]) for square in range(64))
+
+def _rays(table):
+    return tuple(tuple(tuple(r * 8 + c for r, c in ray) for ray in table[(square >> 3, square & 7)])
+                 for square in range(64))
+
+# Sprungziele und Strahlen aus engine, hier mit Feldnummern statt (row, col)
+KNIGHT = _squares(KNIGHT_TARGETS)
+KING = _squares(KING_TARGETS)
+RAYS = {"r": _rays(ROOK_RAYS), "b": _rays(BISHOP_RAYS), "q": _rays(QUEEN_RAYS)}
+
+def _transform(function):
+    return tuple(function(square >> 3, square & 7) for square in range(64))
+
+ALL_TRANSFORMS = (
+    _transform(lambda r, c: r * 8 + c), _transform(lambda r, c: r * 8 + 7 - c),
+    _transform(lambda r, c: (7 - r) * 8 + c), _transform(lambda r, c: (7 - r) * 8 + 7 - c),
+    _transform(lambda r, c: c * 8 + r), _transform(lambda r, c: c * 8 + 7 - r),
+    _transform(lambda r, c: (7 - c) * 8 + r), _transform(lambda r, c: (7 - c) * 8 + 7 - r),
+)
+PAWN_TRANSFORMS = ALL_TRANSFORMS[:2]
+
+def _king_pairs(transforms):
+    # Ein Vertreter (der kleinste) je Symmetrieklasse erlaubter Königspaare
+    pairs = set()
+    for white in range(64):
+        for black in range(64):
+            if white != black and black not in KING[white]:
+                pairs.add(min((t[white], t[black]) for t in transforms))
+    pairs = sorted(pairs)
+    return pairs, {pair: index for index, pair in enumerate(pairs)}
+
+_KING_PAIRS = {False: _king_pairs(ALL_TRANSFORMS), True: _king_pairs(PAWN_TRANSFORMS)}
+
+def signature(pieces):
+    """Name der Materialverteilung für [(figur, feld), ...]"""
+    white = "".join(sorted((f for f, _ in pieces if f.isupper() and f != "K"), key=ORDER.index))
+    black = "".join(sorted((f.upper() for f, _ in pieces if f.islower() and f != "k"), key=ORDER.index))
+    return f"K{white}vK{black}"
+
+def mirror_signature(name):
+    white, black = name.split("v")
+    return f"{black}v{white}"
+
+def canonical_signature(name):
+    # Die stärkere Seite steht vorn, damit jede Materialverteilung genau eine Datei hat
+    white, black = name.split("v")
+    def strength(side):
+        return len(side), tuple(len(ORDER) - ORDER.index(piece) for piece in side[1:])
+    return name if strength(white) >= strength(black) else mirror_signature(name)
+
+def mirror_pieces(pieces):
+    # Farben tauschen und das Brett senkrecht spiegeln
+    return [(figure.swapcase(), (7 - (square >> 3)) * 8 + (square & 7)) for figure, square in pieces]
+
+class Layout:
+    """Indexberechnung für eine Materialverteilung"""
+
+    def __init__(self, name):
+        self.name = name
+        white, black = name.split("v")
+        self.figures = ("K", "k") + tuple(white[1:]) + tuple(black[1:].lower())
+        self.pawns = "P" in white + black
+        self.transforms = PAWN_TRANSFORMS if self.pawns else ALL_TRANSFORMS
+        self.pairs, self.pair_index = _KING_PAIRS[self.pawns]
+        self.sizes = tuple(48 if figure in "Pp" else 64 for figure in self.figures[2:])
+        count = len(self.pairs)
+        for size in self.sizes:
+            count *= size
+        self.count = count * 2
+
+    def canonical(self, squares):
+        best = None
+        for t in self.transforms:
+            if (t[squares[0]], t[squares[1]]) in self.pair_index:
+                candidate = tuple(t[square] for square in squares)
+                if best is None or candidate < best:
+                    best = candidate
+        return best
+
+    def index(self, squares, white_to_move):
+        """Index einer Stellung; squares in der Reihenfolge von self.figures"""
+        squares = self.canonical(squares)
+        index = self.pair_index[(squares[0], squares[1])]
+        for square, size in zip(squares[2:], self.sizes):
+            index = index * size + (square - 8 if size == 48 else square)
+        return index * 2 + (0 if white_to_move else 1)
+
+    def decode(self, index):
+        white_to_move = not index & 1
+        index >>= 1
+        extra = []
+        for size in reversed(self.sizes):
+            index, square = divmod(index, size)
+            extra.append(square + 8 if size == 48 else square)
+        return self.pairs[index] + tuple(reversed(extra)), white_to_move
+
+    def order(self, pieces):
+        """Felder aus [(figur, feld), ...] in der Reihenfolge von self.figures"""
+        remaining = list(pieces)
+        squares = []
+        for figure in self.figures:
+            for i, (other, square) in enumerate(remaining):
+                if other == figure:
+                    squares.append(square)
+                    del remaining[i]
+                    break
+        return squares
+
+class TableFile:
+    """Eine Datenbankdatei, per mmap gelesen"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, name, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a tablebase file")
+        self.layout = Layout(name.rstrip(b"\0").decode("ascii"))
+        if count != self.layout.count:
+            raise ValueError(f"{path}: unexpected size")
+        self.wdl_offset = HEADER.size
+        self.dtm_offset = HEADER.size + (count + 3) // 4
+
+    def probe_index(self, index):
+        wdl = (self.data[self.wdl_offset + (index >> 2)] >> ((index & 3) * 2)) & 3
+        return wdl, self.data[self.dtm_offset + index]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+class Tablebases:
+    """Alle Datenbanken eines Verzeichnisses; Dateien werden beim ersten Zugriff geöffnet"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+
+    def table(self, name):
+        if name not in self.files:
+            path = os.path.join(self.directory, name + ".tb")
+            self.files[name] = TableFile(path) if os.path.exists(path) else None
+        return self.files[name]
+
+    def probe_pieces(self, pieces, white_to_move):
+        """(wdl, dtm) aus Sicht des Spielers am Zug für [(figur, feld), ...] oder None"""
+        if len(pieces) == 2:
+            return DRAW, 0  # nur die Könige
+        name = signature(pieces)
+        table = self.table(name)
+        if table is None:
+            table = self.table(mirror_signature(name))
+            if table is None:
+                return None
+            pieces = mirror_pieces(pieces)
+            white_to_move = not white_to_move
+        layout = table.layout
+        return table.probe_index(layout.index(layout.order(pieces), white_to_move))
+
+    def probe(self, state):
+        """Wie probe_pieces für einen engine.GameState; None ohne passende Datenbank
+
+        Ein gesetztes En-passant-Feld stört nur, wenn dort wirklich geschlagen werden kann;
+        diesen Zug kennen die Datenbanken nicht.
+        """
+        if state.castling or (state.en_passant is not None and state.en_passant_legal()):
+            return None
+        pieces = state.pieces["white"] | state.pieces["black"]
+        if len(pieces) > MAX_PIECES:
+            return None
+        board = state.board
+        return self.probe_pieces([(board[r][c], r * 8 + c) for r, c in pieces], state.player == "white")
+
+    def close(self):
+        for table in self.files.values():
+            if table is not None:
+                table.close()
+        self.files = {}
+
+# Erzeugung
+
+def _attacked(target, figures, squares, by_white):
+    occupied = set(squares)
+    for figure, square in zip(figures, squares):
+        if figure.isupper() != by_white:
+            continue
+        kind = figure.lower()
+        if kind == "k":
+            if target in KING[square]:
+                return True
+        elif kind == "n":
+            if target in KNIGHT[square]:
+                return True
+        elif kind == "p":
+            row, col = square >> 3, square & 7
+            row += -1 if by_white else 1
+            if target >> 3 == row and abs((target & 7) - col) == 1:
+                return True
+        else:
+            for ray in RAYS[kind][square]:
+                for step in ray:
+                    if step == target:
+                        return True
+                    if step in occupied:
+                        break
+    return False
+
+def _targets(figure, square, occupied):
+    """Pseudolegale Zielfelder einer Figur (ohne Bauern)"""
+    kind = figure.lower()
+    if kind == "k":
+        return KING[square]
+    if kind == "n":
+        return KNIGHT[square]
+    targets = []
+    for ray in RAYS[kind][square]:
+        for step in ray:
+            targets.append(step)
+            if step in occupied:
+                break
+    return targets
+
+def _children(figures, squares, white_to_move):
+    """Legale Züge als (figures, squares) der Folgestellung
+
+    Bei Schlag und Umwandlung ändert sich die Materialverteilung; figures ist dann
+    ein neues Tupel.
+    """
+    occupied = {square: i for i, square in enumerate(squares)}
+    king = 0 if white_to_move else 1
+    children = []
+    for i, figure in enumerate(figures):
+        if figure.isupper() != white_to_move:
+            continue
+        square = squares[i]
+        moves = []
+        if figure in "Pp":
+            step = -8 if figure == "P" else 8
+            row = square >> 3
+            if square + step not in occupied:
+                moves.append(square + step)
+                if row == (6 if figure == "P" else 1) and square + 2 * step not in occupied:
+                    moves.append(square + 2 * step)
+            for side in (-1, 1):
+                col = (square & 7) + side
+                target = square + step + side
+                if 0 <= col < 8 and target in occupied and figures[occupied[target]].isupper() != white_to_move:
+                    moves.append(target)
+        else:
+            moves = _targets(figure, square, occupied)
+
+        for target in moves:
+            j = occupied.get(target)
+            if j is not None and (figures[j].isupper() == white_to_move or figures[j] in "Kk"):
+                continue
+            child_figures = list(figures)
+            child_squares = list(squares)
+            child_squares[i] = target
+            if j is not None:
+                del child_figures[j]
+                del child_squares[j]
+            if _attacked(child_squares[king], child_figures, child_squares, not white_to_move):
+                continue
+            if figure in "Pp" and target >> 3 in (0, 7):
+                position = child_squares.index(target)
+                for piece in ORDER[:4]:
+                    promoted = list(child_figures)
+                    promoted[position] = piece if figure == "P" else piece.lower()
+                    children.append((tuple(promoted), child_squares))
+            else:
+                children.append((tuple(child_figures) if j is not None else figures, child_squares))
+    return children
+
+def _parents(figures, squares, white_to_move):
+    """Felder der Vorgängerstellungen ohne Schlag und Umwandlung (Rückzüge der anderen Seite)"""
+    occupied = set(squares)
+    parents = []
+    for i, figure in enumerate(figures):
+        if figure.isupper() == white_to_move:
+            continue
+        square = squares[i]
+        if figure in "Pp":
+            step = 8 if figure == "P" else -8  # rückwärts
+            row = square >> 3
+            sources = []
+            source = square + step
+            if 1 <= source >> 3 <= 6 and source not in occupied:
+                sources.append(source)
+                if row == (4 if figure == "P" else 3) and source + step not in occupied:
+                    sources.append(source + step)
+        else:
+            sources = [target for target in _targets(figure, square, occupied) if target not in occupied]
+            if figure in "Kk":
+                # Könige stehen nie nebeneinander
+                other = KING[squares[1 - i]]
+                sources = [source for source in sources if source not in other]
+        for source in sources:
+            parent = list(squares)
+            parent[i] = source
+            parents.append(parent)
+    return parents
+
+def dependencies(name):
+    """Materialverteilungen, die durch Schlag oder Umwandlung erreicht werden"""
+    white, black = name.split("v")
+    result = set()
+    for side, other, swap in ((white, black, False), (black, white, True)):
+        for i in range(1, len(side)):
+            reduced = side[:i] + side[i + 1:]
+            if len(reduced) + len(other) > 2:
+                result.add(canonical_signature(f"{other}v{reduced}" if swap else f"{reduced}v{other}"))
+            if side[i] == "P":
+                for piece in ORDER[:4]:
+                    promoted = "K" + "".join(sorted(side[1:i] + piece + side[i + 1:], key=ORDER.index))
+                    result.add(canonical_signature(f"{other}v{promoted}" if swap else f"{promoted}v{other}"))
+    return result
+
+def generate_table(name, directory):
+    """Erzeugt eine Datenbank; die Datenbanken aus dependencies(name) müssen schon existieren"""
+    layout = Layout(name)
+    figures = layout.figures
+    count = layout.count
+    tablebases = Tablebases(directory)
+
+    valid = bytearray(count)
+    wdl = bytearray(count)
+    dtm = bytearray(count)
+    remaining = bytearray(count)  # Züge innerhalb der Tabelle, die noch nicht widerlegt sind
+    escape = bytearray(count)     # Schlag/Umwandlung führt zu 1: Remis, 2: Gewinn
+    converted_loss = bytearray(count)  # längster Verlust über Schlag/Umwandlung
+    buckets = [[]]
+
+    def push(distance, index, value):
+        while len(buckets) <= distance:
+            buckets.append([])
+        buckets[distance].append((index, value))
+
+    # 1. Alle Stellungen bewerten, die ohne Retroanalyse feststehen
+    for index in range(count):
+        squares, white_to_move = layout.decode(index)
+        if len(set(squares)) != len(squares) or layout.canonical(squares) != squares:
+            continue
+        king = squares[1] if white_to_move else squares[0]
+        if _attacked(king, figures, squares, white_to_move):
+            continue  # Spieler, der nicht am Zug ist, steht im Schach
+        valid[index] = 1
+
+        children = set()
+        best_win = None
+        worst_loss = 0
+        draw = False
+        moves = _children(figures, squares, white_to_move)
+        for child_figures, child_squares in moves:
+            if child_figures is figures:
+                children.add(layout.index(child_squares, not white_to_move))
+                continue
+            result = tablebases.probe_pieces(list(zip(child_figures, child_squares)), not white_to_move)
+            if result is None:
+                raise FileNotFoundError(f"missing tablebase for {signature(list(zip(child_figures, child_squares)))}")
+            value, distance = result
+            if value == LOSS:
+                best_win = distance + 1 if best_win is None else min(best_win, distance + 1)
+            elif value == WIN:
+                worst_loss = max(worst_loss, distance + 1)
+            else:
+                draw = True
+
+        if not moves:
+            own_king = squares[0] if white_to_move else squares[1]
+            if _attacked(own_king, figures, squares, not white_to_move):
+                push(0, index, LOSS)  # matt
+            else:
+                wdl[index] = DRAW  # patt
+            continue
+        if best_win is not None:
+            push(best_win, index, WIN)
+        remaining[index] = len(children)
+        escape[index] = 2 if best_win is not None else draw
+        converted_loss[index] = min(worst_loss, 255)
+        if not children and best_win is None:
+            if draw:
+                wdl[index] = DRAW
+            else:
+                push(worst_loss, index, LOSS)
+
+    # 2. Retroanalyse nach Distanz: Vorgänger eines Verlusts gewinnen, Vorgänger,
+    # deren Züge alle verlieren, verlieren selbst
+    distance = 0
+    while distance < len(buckets):
+        for index, value in buckets[distance]:
+            if wdl[index]:
+                continue
+            wdl[index] = value
+            dtm[index] = min(distance, 255)
+            squares, white_to_move = layout.decode(index)
+            parents = set()
+            for parent in _parents(figures, squares, white_to_move):
+                parent_index = layout.index(parent, not white_to_move)
+                if valid[parent_index] and not wdl[parent_index]:
+                    parents.add(parent_index)
+            for parent_index in parents:
+                if value == LOSS:
+                    push(distance + 1, parent_index, WIN)
+                    continue
+                remaining[parent_index] -= 1
+                if remaining[parent_index] == 0 and escape[parent_index] != 2:
+                    if escape[parent_index]:
+                        wdl[parent_index] = DRAW
+                    else:
+                        push(max(distance + 1, converted_loss[parent_index]), parent_index, LOSS)
+        buckets[distance] = None
+        distance += 1
+
+    for index in range(count):
+        if valid[index] and not wdl[index]:
+            wdl[index] = DRAW
+
+    tablebases.close()
+    write_table(os.path.join(directory, name + ".tb"), name, wdl, dtm)
+    wins = sum(1 for value in wdl if value == WIN)
+    return name, sum(valid), wins
+
+def write_table(path, name, wdl, dtm):
+    packed = bytearray((len(wdl) + 3) // 4)
+    for index, value in enumerate(wdl):
+        if value:
+            packed[index >> 2] |= value << ((index & 3) * 2)
+    # Erst unter anderem Namen schreiben, damit parallele Leser nie halbe Dateien sehen
+    partial = path + ".part"
+    with open(partial, "wb") as file:
+        file.write(HEADER.pack(MAGIC, name.encode("ascii"), len(wdl)))
+        file.write(packed)
+        file.write(dtm)
+    os.replace(partial, path)
+
+def generation_levels(names):
+    """Alle benötigten Datenbanken in Stufen; jede Stufe hängt nur von früheren ab"""
+    needed = {}
+    pending = [canonical_signature(name) for name in names]
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed[name] = dependencies(name)
+            pending.extend(needed[name])
+    levels = []
+    done = set()
+    while len(done) < len(needed):
+        level = sorted(name for name, deps in needed.items() if name not in done and deps <= done)
+        levels.append(level)
+        done.update(level)
+    return levels
+
+def generate(names, directory, workers=None):
+    """Erzeugt die Datenbanken samt Abhängigkeiten; je Stufe parallel, eine Verteilung pro Prozess"""
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for level in generation_levels(names):
+            todo = [name for name in level if not os.path.exists(os.path.join(directory, name + ".tb"))]
+            results.extend(executor.map(generate_table, todo, [directory] * len(todo)))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Endspieldatenbanken erzeugen und abfragen")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("generate", help="Datenbanken samt Abhängigkeiten erzeugen")
+    build.add_argument("names", nargs="+", help='Materialverteilungen wie "KQvK" oder "KRvKP"')
+    build.add_argument("-d", "--directory", default="tablebases")
+    build.add_argument("-j", "--workers", type=int, default=None)
+    probe = commands.add_parser("probe", help="Stellung nachschlagen")
+    probe.add_argument("fen")
+    probe.add_argument("-d", "--directory", default="tablebases")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        for name in args.names:
+            if sum(len(side) for side in name.split("v")) > MAX_PIECES or not name.startswith("K") or "vK" not in name:
+                parser.error(f"unsupported material: {name}")
+        for name, positions, wins in generate(args.names, args.directory, args.workers):
+            print(f"{name}: {positions} positions, {wins} wins for the side to move", file=sys.stderr)
+        return 0
+
+    map, player, castling, en_passant = fen_to_map(args.fen)[:4]
+    tablebases = Tablebases(args.directory)
+    result = tablebases.probe(GameState(map, player, castling, en_passant))
+    tablebases.close()
+    if result is None:
+        print("not in the tablebases")
+        return 1
+    value, distance = result
+    if value == UNKNOWN:
+        print("illegal position")
+        return 1
+    print({WIN: "win", DRAW: "draw", LOSS: "loss"}[value] + (f" in {distance} plies" if value != DRAW else ""))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,28 @@
+import io
+from batch import read_pgn_games, replay_pgn_chunk
+
+FEN_GAME = """[Event "Endspiel"]
+[SetUp "1"]
+[FEN "4k3/8/4K3/8/8/8/8/7R w - - 0 1"]
+[Result "1-0"]
+
+1. Rh8# 1-0
+
+[Event "Grundstellung"]
+[Result "*"]
+
+1. e4 e5 2. Nf3 *
+"""
+
+def test_pgn_game_with_fen_header():
+    chunk = list(read_pgn_games(io.StringIO(FEN_GAME)))
+    assert chunk[0][1] == {"SetUp": "1", "FEN": "4k3/8/4K3/8/8/8/8/7R w - - 0 1"}
+    results = replay_pgn_chunk(chunk)
+    assert results[0] == {"game": 0, "valid": True, "plies": 1, "winner": "white", "captured": "",
+                          "status": "checkmate"}
+    assert results[1]["valid"] and results[1]["plies"] == 3
+
+def test_pgn_game_without_fen_header_starts_from_initial_position():
+    # Rh8 wäre aus der Grundstellung unmöglich
+    results = replay_pgn_chunk([(0, {}, ["Rh8"])])
+    assert not results[0]["valid"]
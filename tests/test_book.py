@@ -0,0 +1,23 @@
+import io
+from book import OpeningBook, collect_moves, write_book
+from engine import GameState
+from map import fen_to_map
+import pgn
+
+def test_book_finds_transpositions_and_fen(tmp_path):
+    games = pgn.read_games(io.StringIO('[Result "*"]\n\n1. e4 e5 2. Nf3 Nc6 *\n'))
+    path = str(tmp_path / "buch.bin")
+    assert write_book(collect_moves(games), path) == 4
+    book = OpeningBook(path)
+    try:
+        # Dieselbe Stellung über 1. Nf3 e5 2. e4, Schwarz am Zug
+        state = GameState()
+        for move in (((7, 6), (5, 5)), ((1, 4), (3, 4)), ((6, 4), (4, 4))):
+            state.make_move(*move)
+        assert book.choose(state) == ((0, 1), (2, 2))
+
+        board, player, castling, en_passant = fen_to_map(
+            "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2")[:4]
+        assert book.entries(GameState(board, player, castling, en_passant).key) == [(((0, 1), (2, 2)), 1)]
+    finally:
+        book.close()
@@ -0,0 +1,17 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import gui_chess
+
+def test_threefold_repetition_ends_game_as_draw(tmp_path):
+    game = gui_chess.ChessGUI(record_path=str(tmp_path / "partie.cgr"))
+    try:
+        shuffle = [((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))]
+        for move in shuffle * 2:
+            assert not game.game_over
+            game.execute_move(*move)
+        assert game.game_over and game.draw == "repetition" and game.winner is None
+    finally:
+        if game.record:
+            game.record.close()
@@ -0,0 +1,37 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import gui_chess
+import perft
+from profiling import profiler
+
+def test_counts_gui_move(tmp_path):
+    game = gui_chess.ChessGUI(record_path=str(tmp_path / "partie.cgr"))
+    profiler.reset()
+    profiler.enable(game)
+    try:
+        # e2 anklicken, dann e4
+        game.handle_click(game.square_to_pos((6, 4)))
+        game.handle_click(game.square_to_pos((4, 4)))
+        assert game.state.player == "black"
+        calls = profiler.report()["calls"]
+        assert calls["GameState.generate_legal_moves"] > 0
+        assert calls["GameState.make_move"] == 1
+    finally:
+        profiler.disable()
+        if game.record:
+            game.record.close()
+
+def test_patches_from_imports():
+    # perft hat is_valid_move o. Ä. per "from engine import" übernommen
+    names = [name for name in ("is_valid_move", "make_move", "generate_piece_moves") if hasattr(perft, name)]
+    originals = {name: getattr(perft, name) for name in names}
+    profiler.enable()
+    try:
+        for name in names:
+            assert getattr(perft, name) is not originals[name]
+    finally:
+        profiler.disable()
+    for name in names:
+        assert getattr(perft, name) is originals[name]
@@ -0,0 +1,23 @@
+from server import GameServer
+
+def test_state_stays_compact_and_repetition_is_a_draw():
+    server = GameServer()
+    assert server.handle_line("NEW 60") == "OK 1"
+    game = server.games[1]
+    for move in ("e2e4", "e7e5"):
+        assert server.handle_line(f"MOVE 1 {move}").startswith("OK 1")
+    # Nach dem Bauernzug zählt nur noch die aktuelle Stellung
+    assert game.state.history == [] and len(game.state.key_counts) == 1
+
+    shuffle = ["g1f3", "g8f6", "f3g1", "f6g8"]
+    replies = [server.handle_line(f"MOVE 1 {move}") for move in shuffle * 2]
+    assert replies[-1].startswith("OK 1 1/2-1/2")
+    assert len(game.state.key_counts) == 4
+    assert server.handle_line("STATE 1").endswith("rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 6")
+
+def test_rejects_bad_times_and_promotion_suffix():
+    server = GameServer()
+    for seconds in ("nan", "inf", "0", "-1"):
+        assert server.handle_line(f"NEW {seconds}").startswith("ERR")
+    server.handle_line("NEW 60")
+    assert server.handle_line("MOVE 1 e2e4q") == "ERR not a promotion"
@@ -0,0 +1,71 @@
+import random
+from engine import GameState, validate_moves, is_valid_move, generate_piece_moves
+
+def _boards(count, seed=5):
+    rng = random.Random(seed)
+    state = GameState()
+    boards = []
+    for _ in range(count):
+        moves = state.generate_legal_moves()
+        if not moves:
+            break
+        state.make_move(*rng.choice(moves))
+        boards.append([row[:] for row in state.board])
+    return boards
+
+def _loop(positions, moves):
+    results = []
+    for board, (start, goal) in zip(positions, moves):
+        if 0 <= start[0] < 8 and 0 <= start[1] < 8 and 0 <= goal[0] < 8 and 0 <= goal[1] < 8:
+            figure = board[start[0]][start[1]]
+            results.append(int(figure != "." and is_valid_move(board, start, goal, figure)))
+        else:
+            results.append(0)
+    return results
+
+def _dense_batch(boards):
+    # Alle Züge jeder Figur plus ein zufälliges Ziel pro Figur
+    rng = random.Random(1)
+    positions, moves = [], []
+    for board in boards:
+        for r in range(8):
+            for c in range(8):
+                if board[r][c] != ".":
+                    for goal in list(generate_piece_moves(board, (r, c))) + [(rng.randrange(8), rng.randrange(8))]:
+                        positions.append(board)
+                        moves.append(((r, c), goal))
+    return positions, moves
+
+def test_fresh_board_objects():
+    # Neue Objekte aus einem Generator dürfen sich keine Ergebnisse über wiederverwendete ids teilen
+    boards = _boards(40)
+    rng = random.Random(2)
+    moves = [((rng.randrange(8), rng.randrange(8)), (rng.randrange(8), rng.randrange(8))) for _ in range(400)]
+    moves += [((6, 4), (4, 4))] * 400
+    fresh = lambda: ([row[:] for row in boards[i % len(boards)]] for i in range(len(moves)))
+    assert list(validate_moves(fresh(), moves)) == _loop(list(fresh()), moves)
+
+def test_repeated_boards_match_loop():
+    positions, moves = _dense_batch(_boards(30))
+    assert list(validate_moves(positions, moves)) == _loop(positions, moves)
+
+def test_off_board_squares():
+    board = _boards(1)[0]
+    moves = [((8, 0), (0, 0)), ((-1, 0), (0, 0)), ((6, 0), (-2, 0)), ((7, 1), (5, 8))] * 4
+    assert list(validate_moves([board] * len(moves), moves)) == [0] * len(moves)
+
+def test_game_states():
+    state = GameState()
+    moves = [((6, 4), (4, 4)), ((6, 4), (3, 4)), ((7, 6), (5, 5)), ((0, 1), (2, 2))]
+    assert list(validate_moves([state] * 4, moves)) == [1, 0, 1, 0]
+
+def test_mixed_boards_and_game_states():
+    boards = _boards(10)
+    positions, moves = _dense_batch(boards[:3])
+    single = [row[:] for row in boards[5]]
+    state = GameState()
+    positions += [single, state, state]
+    moves += [((6, 0), (5, 0)), ((6, 4), (4, 4)), ((6, 4), (3, 4))]
+    results = list(validate_moves(positions, moves))
+    assert results[:-2] == _loop(positions[:-2], moves[:-2])
+    assert results[-2:] == [1, 0]
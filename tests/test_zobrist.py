@@ -0,0 +1,35 @@
+import random
+from engine import GameState
+from map import fen_to_map
+from zobrist import hash_map
+
+def _play(moves):
+    state = GameState()
+    for move in moves:
+        state.make_move(*move)
+    return state
+
+def test_en_passant_only_hashed_when_capturable():
+    # 1. e4 e5 2. Nf3 Nc6 und 1. Nf3 e5 2. e4 Nc6: nach e4 kann niemand en passant schlagen
+    a = _play([((6, 4), (4, 4)), ((1, 4), (3, 4)), ((7, 6), (5, 5)), ((0, 1), (2, 2))])
+    b = _play([((7, 6), (5, 5)), ((1, 4), (3, 4)), ((6, 4), (4, 4)), ((0, 1), (2, 2))])
+    assert a.key == b.key
+
+    board, player, castling, en_passant = fen_to_map("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")[:4]
+    with_square = GameState([row[:] for row in board], player, castling, en_passant)
+    without = GameState(board, player, castling, None)
+    assert with_square.key != without.key
+
+def test_incremental_key_matches_full_hash():
+    rng = random.Random(3)
+    for _ in range(50):
+        state = GameState()
+        for _ in range(60):
+            moves = state.generate_legal_moves()
+            if not moves:
+                break
+            state.make_move(*rng.choice(moves))
+            assert state.key == hash_map(state.board, state.player, state.castling, state.en_passant)
+        while state.history:
+            state.unmake_move()
+        assert state.key == GameState().key
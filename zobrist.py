@@ -0,0 +1,134 @@
+from array import array
+import random
+
+# Zobrist-Schlüssel: feste Zufallszahlen pro (Figur, Feld), Seite am Zug, Rochaderecht
+# und En-passant-Linie. Der Startwert ist fest, damit Schlüssel über Prozesse und
+# Programmläufe hinweg gleich bleiben (Eröffnungsbuch, Positionsindex).
+_random = random.Random(0x5C4E55)
+
+PIECE_KEYS = {figure: tuple(tuple(_random.getrandbits(64) for _ in range(8)) for _ in range(8))
+              for figure in "PNBRQKpnbrqk"}
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+CASTLING_KEYS = {right: _random.getrandbits(64) for right in "KQkq"}
+EN_PASSANT_KEYS = tuple(_random.getrandbits(64) for _ in range(8))
+
+def castling_key(castling):
+    key = 0
+    for right in castling:
+        key ^= CASTLING_KEYS[right]
+    return key
+
+def en_passant_file(map, player, en_passant):
+    """Linie des En-passant-Felds, wenn ein Bauer von player daneben steht, sonst None
+
+    Nur dann geht das Feld in den Schlüssel ein; sonst wären 1. e4 und 1. e3 … 2. e4
+    verschiedene Stellungen.
+    """
+    if en_passant is None:
+        return None
+    row, col = en_passant
+    pawn, pawn_row = ("P", row + 1) if player == "white" else ("p", row - 1)
+    board_row = map[pawn_row]
+    if (col > 0 and board_row[col - 1] == pawn) or (col < 7 and board_row[col + 1] == pawn):
+        return col
+    return None
+
+def hash_map(map, player="white", castling="", en_passant=None):
+    """Berechnet den Zobrist-Schlüssel einer Stellung vollständig"""
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            figure = map[row][col]
+            if figure != ".":
+                key ^= PIECE_KEYS[figure][row][col]
+    if player == "black":
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= castling_key(castling)
+    file = en_passant_file(map, player, en_passant)
+    if file is not None:
+        key ^= EN_PASSANT_KEYS[file]
+    return key
+
+# Art des gespeicherten Werts; 0 markiert einen leeren Eintrag
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3
+
+ENTRY_BYTES = 16  # 8 Byte Schlüssel + 8 Byte gepackte Daten
+SCORE_OFFSET = 1 << 31
+
+PROMOTION_CODES = (None, "q", "r", "b", "n")
+
+def encode_move(move):
+    if move is None:
+        return 0
+    (s_r, s_c), (g_r, g_c) = move[0], move[1]
+    # Bit 12 markiert "Zug vorhanden", damit a8-a8 nicht mit "kein Zug" verwechselt wird,
+    # die Bits 13-15 die Umwandlungsfigur
+    promotion = PROMOTION_CODES.index(move[2]) if len(move) == 3 else 0
+    return (s_r * 8 + s_c) | (g_r * 8 + g_c) << 6 | 1 << 12 | promotion << 13
+
+def decode_move(code):
+    if not code:
+        return None
+    start, goal, promotion = code & 63, (code >> 6) & 63, (code >> 13) & 7
+    if promotion:
+        return divmod(start, 8), divmod(goal, 8), PROMOTION_CODES[promotion]
+    return divmod(start, 8), divmod(goal, 8)
+
+class TranspositionTable:
+    """Transpositionstabelle fester Größe mit Zwei-Eintrags-Buckets
+
+    Der erste Eintrag eines Buckets wird nur durch eine gleich tiefe oder tiefere
+    Suche ersetzt, der zweite immer. Der Speicher wird beim Anlegen vollständig
+    reserviert und wächst danach nicht mehr.
+    """
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        entries = max(2, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.buckets = entries // 2
+        self.keys = array("Q", bytes(8 * self.buckets * 2))
+        self.data = array("Q", bytes(8 * self.buckets * 2))
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        for i in range(len(self.data)):
+            self.keys[i] = 0
+            self.data[i] = 0
+        self.probes = 0
+        self.hits = 0
+
+    def memory_bytes(self):
+        return len(self.keys) * self.keys.itemsize + len(self.data) * self.data.itemsize
+
+    def store(self, key, depth, score, flag, move=None):
+        slot = (key % self.buckets) * 2
+        depth = max(0, min(depth, 255))
+        packed = ((score + SCORE_OFFSET) & 0xFFFFFFFF) | depth << 32 | flag << 40 | encode_move(move) << 42
+
+        # Tiefenbevorzugter Eintrag: ersetzen bei gleicher Stellung, leerem Platz oder tieferer Suche
+        data = self.data[slot]
+        if self.keys[slot] == key or not data or depth >= (data >> 32) & 0xFF:
+            self.keys[slot] = key
+            self.data[slot] = packed
+            return
+        # Sonst den Immer-ersetzen-Eintrag überschreiben
+        self.keys[slot + 1] = key
+        self.data[slot + 1] = packed
+
+    def probe(self, key):
+        """Liefert (depth, score, flag, move) oder None"""
+        self.probes += 1
+        slot = (key % self.buckets) * 2
+        for index in (slot, slot + 1):
+            data = self.data[index]
+            if data and self.keys[index] == key:
+                self.hits += 1
+                score = (data & 0xFFFFFFFF) - SCORE_OFFSET
+                return (data >> 32) & 0xFF, score, (data >> 40) & 3, decode_move(data >> 42)
+        return None
+
+    def hashfull(self):
+        """Anteil belegter Einträge in Promille, aus den ersten 1000 Einträgen geschätzt"""
+        sample = min(1000, len(self.data))
+        return sum(1 for i in range(sample) if self.data[i]) * 1000 // sample